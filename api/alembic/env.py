@@ -5,6 +5,9 @@ from sqlalchemy import pool
 from weather_notifier.settings import DBAuth
 from weather_notifier.db import mapper_registry
 from weather_notifier.subscriptions import models  # noqa
+from weather_notifier.leases import models as lease_models  # noqa
+from weather_notifier.locations import models as location_models  # noqa
+from weather_notifier.alert_states import models as alert_state_models  # noqa
 from alembic import context
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,61 @@
+"""track subscription changes
+
+Revision ID: b7d4e1f09a2c
+Revises: 64e113ab3dbb
+Create Date: 2026-10-18 10:12:41.503127
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7d4e1f09a2c"
+down_revision = "64e113ab3dbb"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "subscriptions", sa.Column("updated_at", sa.DateTime(), nullable=True)
+    )
+    subscriptions = sa.table("subscriptions", sa.column("updated_at", sa.DateTime()))
+    op.execute(
+        subscriptions.update().values(
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+    )
+    with op.batch_alter_table("subscriptions") as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+    op.create_index(
+        op.f("ix_subscriptions_updated_at"),
+        "subscriptions",
+        ["updated_at"],
+        unique=False,
+    )
+    op.create_table(
+        "subscription_tombstones",
+        sa.Column("subscription_uuid", sa.VARCHAR(length=36), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("subscription_uuid"),
+    )
+    op.create_index(
+        op.f("ix_subscription_tombstones_deleted_at"),
+        "subscription_tombstones",
+        ["deleted_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_subscription_tombstones_deleted_at"),
+        table_name="subscription_tombstones",
+    )
+    op.drop_table("subscription_tombstones")
+    op.drop_index(op.f("ix_subscriptions_updated_at"), table_name="subscriptions")
+    with op.batch_alter_table("subscriptions") as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,118 @@
+"""normalize subscription conditions
+
+Revision ID: c3e8a4d61f05
+Revises: 5a1c9e3f7b20
+Create Date: 2026-10-18 14:05:19.220417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3e8a4d61f05"
+down_revision = "5a1c9e3f7b20"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+subscriptions = sa.table(
+    "subscriptions", sa.column("id", sa.Integer()), sa.column("conditions", sa.JSON())
+)
+conditions = sa.table(
+    "conditions",
+    sa.column("id", sa.Integer()),
+    sa.column("subscription_id", sa.Integer()),
+    sa.column("condition", sa.VARCHAR(length=20)),
+    sa.column("op", sa.VARCHAR(length=2)),
+    sa.column("threshold", sa.Float()),
+)
+
+
+def upgrade():
+    op.create_table(
+        "conditions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("subscription_id", sa.Integer(), nullable=False),
+        sa.Column("condition", sa.VARCHAR(length=20), nullable=False),
+        sa.Column("op", sa.VARCHAR(length=2), nullable=False),
+        sa.Column("threshold", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["subscription_id"], ["subscriptions.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_conditions_condition_op_threshold",
+        "conditions",
+        ["condition", "op", "threshold"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_conditions_subscription_id_condition",
+        "conditions",
+        ["subscription_id", "condition"],
+        unique=False,
+    )
+
+    connection = op.get_bind()
+    result = connection.execute(
+        sa.select(subscriptions.c.id, subscriptions.c.conditions).order_by(
+            subscriptions.c.id
+        )
+    )
+    for rows in result.partitions(BATCH_SIZE):
+        condition_rows = [
+            {
+                "subscription_id": subscription_id,
+                "condition": condition["condition"],
+                "op": condition["op"],
+                "threshold": condition["threshold"],
+            }
+            for subscription_id, subscription_conditions in rows
+            for condition in subscription_conditions or []
+        ]
+        if condition_rows:
+            connection.execute(conditions.insert(), condition_rows)
+
+    with op.batch_alter_table("subscriptions") as batch_op:
+        batch_op.drop_column("conditions")
+
+
+def downgrade():
+    with op.batch_alter_table("subscriptions") as batch_op:
+        batch_op.add_column(sa.Column("conditions", sa.JSON(), nullable=True))
+
+    connection = op.get_bind()
+    connection.execute(subscriptions.update().values(conditions=[]))
+    grouped: dict[int, list[dict]] = {}
+    result = connection.execute(
+        sa.select(
+            conditions.c.subscription_id,
+            conditions.c.condition,
+            conditions.c.op,
+            conditions.c.threshold,
+        ).order_by(conditions.c.id)
+    )
+    for subscription_id, condition, op_, threshold in result:
+        grouped.setdefault(subscription_id, []).append(
+            {"condition": condition, "op": op_, "threshold": threshold}
+        )
+    update = (
+        subscriptions.update()
+        .where(subscriptions.c.id == sa.bindparam("b_id"))
+        .values(conditions=sa.bindparam("conditions"))
+    )
+    if grouped:
+        connection.execute(
+            update,
+            [
+                {"b_id": subscription_id, "conditions": subscription_conditions}
+                for subscription_id, subscription_conditions in grouped.items()
+            ],
+        )
+
+    op.drop_index("ix_conditions_subscription_id_condition", table_name="conditions")
+    op.drop_index("ix_conditions_condition_op_threshold", table_name="conditions")
+    op.drop_table("conditions")
@@ -0,0 +1,121 @@
+"""add locations
+
+Subscriptions written before the API validated them can have a NULL city or country code.
+They are treated as an empty city or country code, so they keep their rows and point at a
+location with an empty city or country code before `location_id` becomes NOT NULL
+
+Revision ID: d9f2b6a0c4e1
+Revises: c3e8a4d61f05
+Create Date: 2026-10-18 15:21:47.608113
+
+"""
+from typing import Optional
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d9f2b6a0c4e1"
+down_revision = "c3e8a4d61f05"
+branch_labels = None
+depends_on = None
+
+subscriptions = sa.table(
+    "subscriptions",
+    sa.column("city", sa.VARCHAR(length=100)),
+    sa.column("country_code", sa.VARCHAR(length=2)),
+    sa.column("location_id", sa.Integer()),
+)
+locations = sa.table(
+    "locations",
+    sa.column("id", sa.Integer()),
+    sa.column("city", sa.VARCHAR(length=100)),
+    sa.column("country_code", sa.VARCHAR(length=2)),
+)
+
+
+def normalize_location(
+    city: Optional[str], country_code: Optional[str]
+) -> tuple[str, str]:
+    city, country_code = city or "", country_code or ""
+    return " ".join(city.split()).lower(), country_code.strip().upper()
+
+
+def upgrade():
+    op.create_table(
+        "locations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("city", sa.VARCHAR(length=100), nullable=False),
+        sa.Column("country_code", sa.VARCHAR(length=2), nullable=False),
+        sa.Column("owm_city_id", sa.Integer(), nullable=True),
+        sa.Column("lat", sa.Float(), nullable=True),
+        sa.Column("lon", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("city", "country_code"),
+        sa.UniqueConstraint("owm_city_id"),
+    )
+    op.add_column(
+        "subscriptions", sa.Column("location_id", sa.Integer(), nullable=True)
+    )
+
+    connection = op.get_bind()
+    spellings = connection.execute(
+        sa.select(subscriptions.c.city, subscriptions.c.country_code).distinct()
+    ).all()
+    canonical = sorted({normalize_location(*spelling) for spelling in spellings})
+    if canonical:
+        connection.execute(
+            locations.insert(),
+            [
+                {"city": city, "country_code": country_code}
+                for city, country_code in canonical
+            ],
+        )
+        ids = {
+            (city, country_code): id_
+            for id_, city, country_code in connection.execute(sa.select(locations))
+        }
+        # Compared through coalesce, as NULL never equals a bound value
+        connection.execute(
+            subscriptions.update()
+            .where(sa.func.coalesce(subscriptions.c.city, "") == sa.bindparam("b_city"))
+            .where(
+                sa.func.coalesce(subscriptions.c.country_code, "")
+                == sa.bindparam("b_country_code")
+            )
+            .values(location_id=sa.bindparam("location_id")),
+            [
+                {
+                    "b_city": city or "",
+                    "b_country_code": country_code or "",
+                    "location_id": ids[normalize_location(city, country_code)],
+                }
+                for city, country_code in spellings
+            ],
+        )
+
+    with op.batch_alter_table("subscriptions") as batch_op:
+        batch_op.alter_column("location_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key(
+            "fk_subscriptions_location_id_locations",
+            "locations",
+            ["location_id"],
+            ["id"],
+        )
+    op.create_index(
+        op.f("ix_subscriptions_location_id"),
+        "subscriptions",
+        ["location_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_subscriptions_location_id"), table_name="subscriptions")
+    with op.batch_alter_table("subscriptions") as batch_op:
+        batch_op.drop_constraint(
+            "fk_subscriptions_location_id_locations", type_="foreignkey"
+        )
+        batch_op.drop_column("location_id")
+    op.drop_table("locations")
@@ -0,0 +1,43 @@
+"""allow locations to share an OpenWeatherMap city id
+
+Revision ID: f6c1d9a3e7b2
+Revises: e4a7c2d85b13
+Create Date: 2026-10-18 17:12:44.208316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f6c1d9a3e7b2"
+down_revision = "e4a7c2d85b13"
+branch_labels = None
+depends_on = None
+
+# Names the unnamed unique constraint when SQLite recreates the table
+NAMING_CONVENTION = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+
+def upgrade():
+    # Different spellings of a city, such as "kobenhavn" and "copenhagen", resolve to the same
+    # city id, so the city id can't be unique
+    inspector = sa.inspect(op.get_bind())
+    for constraint in inspector.get_unique_constraints("locations"):
+        if constraint["column_names"] != ["owm_city_id"]:
+            continue
+        with op.batch_alter_table(
+            "locations", naming_convention=NAMING_CONVENTION
+        ) as batch_op:
+            batch_op.drop_constraint(
+                constraint["name"] or "uq_locations_owm_city_id", type_="unique"
+            )
+    op.create_index(
+        op.f("ix_locations_owm_city_id"), "locations", ["owm_city_id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_locations_owm_city_id"), table_name="locations")
+    with op.batch_alter_table("locations") as batch_op:
+        batch_op.create_unique_constraint("uq_locations_owm_city_id", ["owm_city_id"])
@@ -0,0 +1,85 @@
+"""
+Benchmark the latency of `GET /subscription/{uuid}`, comparing creating a new engine for every
+request with the engine shared by the app
+
+Run with `python benchmarks/bench_get_subscription.py [--db-url DB_URL]`. Defaults to a
+temporary SQLite database - use a Postgres URL to include the cost of opening connections
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from weather_notifier.app import create_app
+from weather_notifier.db import create_db_engine, get_engine, mapper_registry
+from weather_notifier.settings import DBAuth, get_settings
+from weather_notifier.subscriptions.models import Subscription
+
+
+def engine_per_request(settings: DBAuth = Depends(get_settings)) -> Engine:
+    return create_engine(settings.db_url.get_secret_value(), future=True)
+
+
+def setup_database(settings: DBAuth) -> str:
+    engine = create_db_engine(settings)
+    mapper_registry.metadata.create_all(engine)
+    subscription_uuid = str(uuid.uuid4())
+    subscription = Subscription(
+        subscription_uuid=subscription_uuid,
+        email="bench@test.com",
+        country_code="DK",
+        city="Copenhagen",
+        conditions=[{"op": "gt", "threshold": 20, "condition": "temp"}],
+    )
+    with Session(engine) as session, session.begin():
+        session.add(subscription)
+    engine.dispose()
+    return subscription_uuid
+
+
+def measure(settings: DBAuth, subscription_uuid: str, n: int, override=None) -> list:
+    app = create_app()
+    app.dependency_overrides[get_settings] = lambda: settings
+    if override is not None:
+        app.dependency_overrides[get_engine] = override
+
+    latencies = []
+    with TestClient(app) as client:
+        for _ in range(n):
+            start = time.perf_counter()
+            client.get(f"/subscription/{subscription_uuid}").raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(db_url: str, n: int) -> None:
+    settings = DBAuth(db_url=db_url)
+    subscription_uuid = setup_database(settings)
+
+    for name, override in [
+        ("engine per request", engine_per_request),
+        ("shared engine", None),
+    ]:
+        latencies = sorted(measure(settings, subscription_uuid, n, override))
+        print(
+            f"{name:<20} "
+            f"mean {statistics.mean(latencies) * 1000:7.2f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-url", help="SQLAlchemy URL of the database to benchmark")
+    parser.add_argument("-n", type=int, default=500, help="Number of requests")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run(args.db_url or f"sqlite:///{tmp}/bench.db", args.n)
@@ -0,0 +1,27 @@
+import sqlalchemy as sa
+
+from weather_notifier.db import mapper_registry
+
+
+@mapper_registry.mapped
+class AlertState:
+    """
+    Whether a condition of a subscription was last notified as triggered, and when. Shared by
+    notifier replicas, so a location notified by another replica than last cycle isn't
+    notified again
+    """
+
+    __tablename__ = "alert_states"
+
+    subscription_key: str = sa.Column(sa.VARCHAR(400), primary_key=True)
+    condition: str = sa.Column(sa.VARCHAR(200), primary_key=True)
+    active: bool = sa.Column(sa.Boolean, nullable=False)
+    notified_at: float = sa.Column(sa.Float, nullable=False)
+
+    def __init__(
+        self, subscription_key: str, condition: str, active: bool, notified_at: float
+    ):
+        self.subscription_key = subscription_key
+        self.condition = condition
+        self.active = active
+        self.notified_at = notified_at
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from weather_notifier.alert_states import schemas, services
+from weather_notifier.db import get_session
+
+router = APIRouter(tags=["Alert states"])
+
+
+@router.post("/alert-states/search", response_model=schemas.AlertStateListSchema)
+def search_alert_states(
+    search: schemas.AlertStateSearchSchema, session: Session = Depends(get_session)
+):
+    """Get the alert states of the conditions of some subscriptions"""
+    return {"states": services.get_alert_states(session, search.subscription_keys)}
+
+
+@router.put(
+    "/alert-states",
+    response_class=Response,
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+def update_alert_states(
+    update: schemas.AlertStateUpdateSchema, session: Session = Depends(get_session)
+):
+    """Record the alert states subscribers were notified of, and delete expired states"""
+    services.update_alert_states(session, update.record, update.delete)
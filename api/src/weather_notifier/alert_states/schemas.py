@@ -0,0 +1,37 @@
+from pydantic import BaseModel, Field
+
+
+class AlertStateKeySchema(BaseModel):
+    """Identifies a condition of a subscription"""
+
+    subscription_key: str = Field(..., min_length=1, max_length=400)
+    condition: str = Field(..., min_length=1, max_length=200)
+
+
+class AlertStateSchema(AlertStateKeySchema):
+    """Whether a condition was last notified as triggered, and when, in unix seconds"""
+
+    active: bool
+    notified_at: float
+
+    class Config:
+        orm_mode = True
+
+
+class AlertStateSearchSchema(BaseModel):
+    """The subscriptions to get the alert states of"""
+
+    subscription_keys: list[str] = Field(..., max_items=100_000)
+
+
+class AlertStateListSchema(BaseModel):
+    """The alert states of the searched subscriptions"""
+
+    states: list[AlertStateSchema]
+
+
+class AlertStateUpdateSchema(BaseModel):
+    """The alert states to record and the alert states to delete"""
+
+    record: list[AlertStateSchema] = []
+    delete: list[AlertStateKeySchema] = []
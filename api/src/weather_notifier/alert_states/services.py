@@ -0,0 +1,84 @@
+from typing import Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from weather_notifier.alert_states.models import AlertState
+from weather_notifier.alert_states.schemas import (
+    AlertStateKeySchema,
+    AlertStateSchema,
+)
+from weather_notifier.locations.services import INSERT_DIALECTS
+from weather_notifier.subscriptions.bulk_services import chunked
+
+# The number of keys per query, below the bound parameter limits of the databases
+KEYS_PER_QUERY = 500
+
+
+def get_alert_states(
+    session: Session, subscription_keys: Iterable[str]
+) -> list[AlertState]:
+    """
+    Get the alert states of the conditions of some subscriptions
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    subscription_keys
+        The keys of the subscriptions
+
+    Returns
+    -------
+    list of AlertStates
+    """
+    return [
+        state
+        for keys in chunked(sorted(set(subscription_keys)), KEYS_PER_QUERY)
+        for state in session.execute(
+            sa.select(AlertState).where(AlertState.subscription_key.in_(keys))
+        ).scalars()
+    ]
+
+
+def update_alert_states(
+    session: Session,
+    record: list[AlertStateSchema],
+    delete: list[AlertStateKeySchema],
+) -> None:
+    """
+    Record the alert states the subscribers were notified of, replacing their previous
+    states, and delete the states which are no longer needed
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    record
+        The states to record
+    delete
+        The conditions whose states to delete
+    """
+    table = AlertState.__table__
+    if record:
+        insert = INSERT_DIALECTS[session.get_bind().dialect.name](table)
+        session.execute(
+            insert.on_conflict_do_update(
+                index_elements=[table.c.subscription_key, table.c.condition],
+                set_={
+                    "active": insert.excluded.active,
+                    "notified_at": insert.excluded.notified_at,
+                },
+            ),
+            [state.dict() for state in record],
+        )
+    for keys in chunked(delete, KEYS_PER_QUERY):
+        session.execute(
+            sa.delete(AlertState)
+            .where(
+                sa.tuple_(table.c.subscription_key, table.c.condition).in_(
+                    [(key.subscription_key, key.condition) for key in keys]
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
@@ -1,10 +1,19 @@
+from typing import Optional
+
 import sqlalchemy as sa
 from fastapi import FastAPI, Depends
 from fastapi.responses import RedirectResponse
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 
-from weather_notifier.db import get_engine
+from weather_notifier.alert_states.routes import router as alert_states_router
+from weather_notifier.db import dispose_engine, get_engine
+from weather_notifier.leases.routes import router as leases_router
+from weather_notifier.locations.routes import router as locations_router
+from weather_notifier.settings import DBAuth
+from weather_notifier.subscriptions.async_routes import (
+    router as async_subscriptions_router,
+)
 from weather_notifier.subscriptions.routes import router as subscriptions_router
 
 
@@ -29,8 +38,26 @@ def add_default_routes(app: FastAPI) -> FastAPI:
     return app
 
 
-def create_app() -> FastAPI:
+def create_app(settings: Optional[DBAuth] = None) -> FastAPI:
+    """
+    Create the app. If `db_async` is set in the settings, the subscription routes use the
+    asyncio database layer instead of running in the threadpool. The notification run,
+    location and alert state routes always run in the threadpool
+    """
+    settings = DBAuth() if settings is None else settings
+
     app = FastAPI(title="Weather Notifier", version="0.1.0")
-    app.include_router(subscriptions_router)
+    if settings.db_async:
+        app.include_router(async_subscriptions_router)
+    else:
+        app.include_router(subscriptions_router)
+    app.include_router(leases_router)
+    app.include_router(locations_router)
+    app.include_router(alert_states_router)
     add_default_routes(app)
+
+    async def shutdown() -> None:
+        await dispose_engine(app)
+
+    app.add_event_handler("shutdown", shutdown)
     return app
@@ -1,20 +1,141 @@
-from typing import Generator
+import threading
+from typing import Any, AsyncGenerator, Generator
 
-from fastapi import Depends
+from fastapi import Depends, FastAPI, Request
 from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import registry, Session
 
 from weather_notifier.settings import DBAuth, get_settings
 
 mapper_registry = registry()
 
+_engine_lock = threading.Lock()
 
-def get_engine(settings: DBAuth = Depends(get_settings)) -> Engine:
-    return create_engine(settings.db_url.get_secret_value(), future=True)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def engine_options(settings: DBAuth, url: URL) -> dict[str, Any]:
+    """Returns the connection pool options for an engine connecting to `url`"""
+    options: dict[str, Any] = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+    # SQLite uses a pool which doesn't accept sizing options. FastAPI can open a session in one
+    # threadpool thread and commit it in another, so SQLite's same-thread check is disabled
+    if url.get_backend_name() == "sqlite":
+        options.update(connect_args={"check_same_thread": False})
+    else:
+        options.update(
+            pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow
+        )
+    return options
+
+
+def create_db_engine(settings: DBAuth) -> Engine:
+    """
+    Create an engine with its connection pool configured from the settings
+
+    Parameters
+    ----------
+    settings
+        The database settings
+
+    Returns
+    -------
+    Engine
+    """
+    url = make_url(settings.db_url.get_secret_value())
+    return create_engine(url, future=True, **engine_options(settings, url))
+
+
+def async_db_url(db_url: str) -> URL:
+    """
+    Returns the URL using the asyncio driver of the database. URLs which already specify
+    a driver are returned unchanged
+
+    Parameters
+    ----------
+    db_url
+        A SQLAlchemy connection string
+
+    Returns
+    -------
+    URL
+    """
+    url = make_url(db_url)
+    if url.drivername in ASYNC_DRIVERS:
+        return url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    if url.drivername == "postgresql+psycopg2":
+        return url.set(drivername=ASYNC_DRIVERS["postgresql"])
+    return url
+
+
+def create_async_db_engine(settings: DBAuth) -> AsyncEngine:
+    """
+    Create an asyncio engine with its connection pool configured from the settings
+
+    Parameters
+    ----------
+    settings
+        The database settings
+
+    Returns
+    -------
+    AsyncEngine
+    """
+    url = async_db_url(settings.db_url.get_secret_value())
+    return create_async_engine(url, **engine_options(settings, url))
+
+
+def get_engine(request: Request, settings: DBAuth = Depends(get_settings)) -> Engine:
+    """
+    Get the engine of the app. The engine is created on first use and then shared by all
+    requests, so connections are pooled between requests
+    """
+    if (engine := getattr(request.app.state, "engine", None)) is None:
+        with _engine_lock:
+            if (engine := getattr(request.app.state, "engine", None)) is None:
+                engine = request.app.state.engine = create_db_engine(settings)
+    return engine
+
+
+def get_async_engine(
+    request: Request, settings: DBAuth = Depends(get_settings)
+) -> AsyncEngine:
+    """
+    Get the asyncio engine of the app. The engine is created on first use and then shared
+    by all requests, so connections are pooled between requests
+    """
+    if (engine := getattr(request.app.state, "async_engine", None)) is None:
+        with _engine_lock:
+            if (engine := getattr(request.app.state, "async_engine", None)) is None:
+                engine = create_async_db_engine(settings)
+                request.app.state.async_engine = engine
+    return engine
+
+
+async def dispose_engine(app: FastAPI) -> None:
+    """Close all pooled connections of the app's engines"""
+    if (engine := getattr(app.state, "engine", None)) is not None:
+        engine.dispose()
+        app.state.engine = None
+    if (async_engine := getattr(app.state, "async_engine", None)) is not None:
+        await async_engine.dispose()
+        app.state.async_engine = None
 
 
 def get_session(engine: Engine = Depends(get_engine)) -> Generator[Session, None, None]:
     with Session(engine) as session:
         with session.begin():
             yield session
+
+
+async def get_async_session(
+    engine: AsyncEngine = Depends(get_async_engine),
+) -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        async with session.begin():
+            yield session
@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Optional
+
+import sqlalchemy as sa
+
+from weather_notifier.db import mapper_registry
+
+
+@mapper_registry.mapped
+class NotificationRun:
+    """A notifier cycle, whose locations are split between notifier replicas through leases"""
+
+    __tablename__ = "notification_runs"
+
+    run_id: str = sa.Column(sa.VARCHAR(64), primary_key=True)
+    created_at: datetime = sa.Column(sa.DateTime, nullable=False, index=True)
+
+    def __init__(self, run_id: str, created_at: datetime):
+        self.run_id = run_id
+        self.created_at = created_at
+
+
+@mapper_registry.mapped
+class LocationLease:
+    """
+    A location to notify in a run. A replica claims the lease until `lease_expires_at`, after
+    which another replica can claim it if it hasn't been completed
+    """
+
+    __tablename__ = "location_leases"
+    __table_args__ = (sa.UniqueConstraint("run_id", "city", "country_code"),)
+
+    id: int = sa.Column(sa.Integer, primary_key=True)
+    run_id: str = sa.Column(
+        sa.VARCHAR(64), sa.ForeignKey("notification_runs.run_id"), nullable=False
+    )
+    city: str = sa.Column(sa.VARCHAR(100), nullable=False)
+    country_code: str = sa.Column(sa.VARCHAR(2), nullable=False)
+    leased_by: Optional[str] = sa.Column(sa.VARCHAR(100))
+    lease_expires_at: Optional[datetime] = sa.Column(sa.DateTime)
+    completed_at: Optional[datetime] = sa.Column(sa.DateTime)
+
+    def __init__(self, run_id: str, city: str, country_code: str):
+        self.run_id = run_id
+        self.city = city
+        self.country_code = country_code
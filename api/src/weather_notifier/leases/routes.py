@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from weather_notifier.db import get_session
+from weather_notifier.leases import schemas, services
+
+router = APIRouter(tags=["Notification runs"])
+
+
+@router.post(
+    "/notification-runs/{run_id}/claim", response_model=schemas.LeaseBatchSchema
+)
+def claim_locations(
+    run_id: str, claim: schemas.ClaimSchema, session: Session = Depends(get_session)
+):
+    """
+    Claim a batch of locations to notify in a run. The run is created by the first claim.
+    An empty batch means every location in the run is either completed or leased
+    """
+    leases = services.claim_leases(
+        session,
+        run_id,
+        worker_id=claim.worker_id,
+        batch_size=claim.batch_size,
+        lease_seconds=claim.lease_seconds,
+    )
+    return {
+        "leases": [
+            {
+                "lease_id": lease.id,
+                "city": lease.city,
+                "country_code": lease.country_code,
+            }
+            for lease in leases
+        ]
+    }
+
+
+@router.post(
+    "/notification-runs/{run_id}/complete",
+    response_class=Response,
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+def complete_locations(
+    run_id: str,
+    complete: schemas.CompleteSchema,
+    session: Session = Depends(get_session),
+):
+    """Mark claimed locations as notified"""
+    services.complete_leases(session, run_id, complete.worker_id, complete.lease_ids)
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+
+
+class ClaimSchema(BaseModel):
+    """A request from a notifier replica to claim a batch of locations"""
+
+    worker_id: str = Field(..., min_length=1, max_length=100)
+    batch_size: int = Field(100, ge=1, le=10_000)
+    lease_seconds: int = Field(300, ge=1)
+
+
+class LeaseSchema(BaseModel):
+    """A claimed location"""
+
+    lease_id: int
+    city: str
+    country_code: str
+
+
+class LeaseBatchSchema(BaseModel):
+    """The claimed leases. Empty when every location in the run is leased or completed"""
+
+    leases: list[LeaseSchema]
+
+
+class CompleteSchema(BaseModel):
+    """The leases a notifier replica has finished notifying"""
+
+    worker_id: str = Field(..., min_length=1, max_length=100)
+    lease_ids: list[int]
@@ -0,0 +1,180 @@
+from datetime import timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from weather_notifier.leases.models import LocationLease, NotificationRun
+from weather_notifier.locations.models import Location
+from weather_notifier.subscriptions.models import Subscription, utcnow
+
+# Runs older than this are deleted when a new run is created
+RUN_RETENTION = timedelta(days=1)
+
+
+def create_run(session: Session, run_id: str) -> None:
+    """
+    Create a run with one lease per subscribed location, unless it already exists. Safe to
+    call from several replicas at the same time, as only the first one creates the run
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    run_id
+        The id of the run, shared by all replicas running the same cycle
+    """
+    if session.get(NotificationRun, run_id) is not None:
+        return
+
+    now = utcnow()
+    locations = session.execute(
+        sa.select(Location.city, Location.country_code)
+        .where(sa.exists().where(Subscription.location_id == Location.id))
+        .order_by(Location.id)
+    ).all()
+    try:
+        with session.begin_nested():
+            session.add(NotificationRun(run_id, created_at=now))
+            session.flush()
+            session.add_all(
+                LocationLease(run_id, city, country_code)
+                for city, country_code in locations
+            )
+    except IntegrityError:
+        # Another replica created the run first
+        return
+
+    expired_runs = sa.select(NotificationRun.run_id).where(
+        NotificationRun.created_at < now - RUN_RETENTION
+    )
+    session.execute(
+        sa.delete(LocationLease)
+        .where(LocationLease.run_id.in_(expired_runs))
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        sa.delete(NotificationRun)
+        .where(NotificationRun.created_at < now - RUN_RETENTION)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim_leases(
+    session: Session,
+    run_id: str,
+    worker_id: str,
+    batch_size: int = 100,
+    lease_seconds: int = 300,
+) -> list[LocationLease]:
+    """
+    Claim a batch of locations in a run which are neither completed nor leased by another
+    replica. Creates the run if it doesn't exist yet.
+
+    On databases which support it, the leases are selected with `FOR UPDATE SKIP LOCKED`, so
+    concurrent replicas claim different batches without waiting for each other. The update
+    re-checks that each lease is still free, so databases without row locks, such as SQLite,
+    never hand out a lease twice either
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    run_id
+        The id of the run to claim locations in
+    worker_id
+        The id of the claiming replica
+    batch_size
+        The maximum number of locations to claim
+    lease_seconds
+        The number of seconds the replica has to complete the locations before they can be
+        claimed by another replica
+
+    Returns
+    -------
+    list of LocationLeases
+        The claimed leases. Empty if no locations are left to claim
+    """
+    create_run(session, run_id)
+
+    now = utcnow()
+    is_free = sa.and_(
+        LocationLease.run_id == run_id,
+        LocationLease.completed_at.is_(None),
+        sa.or_(
+            LocationLease.lease_expires_at.is_(None),
+            LocationLease.lease_expires_at < now,
+        ),
+    )
+    candidates = (
+        session.execute(
+            sa.select(LocationLease.id)
+            .where(is_free)
+            .order_by(LocationLease.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        .scalars()
+        .all()
+    )
+    if not candidates:
+        return []
+
+    expires_at = now + timedelta(seconds=lease_seconds)
+    session.execute(
+        sa.update(LocationLease)
+        .where(LocationLease.id.in_(candidates), is_free)
+        .values(leased_by=worker_id, lease_expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    return (
+        session.execute(
+            sa.select(LocationLease)
+            .where(
+                LocationLease.id.in_(candidates),
+                LocationLease.leased_by == worker_id,
+                LocationLease.lease_expires_at == expires_at,
+            )
+            .order_by(LocationLease.id)
+            .execution_options(populate_existing=True)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def complete_leases(
+    session: Session, run_id: str, worker_id: str, lease_ids: list[int]
+) -> int:
+    """
+    Mark leases as completed. Leases which have since been claimed by another replica are
+    left alone
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    run_id
+        The id of the run the leases belong to
+    worker_id
+        The id of the replica which claimed the leases
+    lease_ids
+        The ids of the leases to complete
+
+    Returns
+    -------
+    int
+        The number of leases completed
+    """
+    result = session.execute(
+        sa.update(LocationLease)
+        .where(
+            LocationLease.run_id == run_id,
+            LocationLease.id.in_(lease_ids),
+            LocationLease.leased_by == worker_id,
+            LocationLease.completed_at.is_(None),
+        )
+        .values(completed_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,38 @@
+from typing import Optional
+
+import sqlalchemy as sa
+
+from weather_notifier.db import mapper_registry
+
+
+@mapper_registry.mapped
+class Location:
+    """
+    A location subscribed to. The city and country code are stored in their canonical form,
+    so differently cased or spaced spellings of a location share a row. Differently named
+    spellings of a city, such as "kobenhavn" and "copenhagen", share its city id
+    """
+
+    __tablename__ = "locations"
+    __table_args__ = (sa.UniqueConstraint("city", "country_code"),)
+
+    id: int = sa.Column(sa.Integer, primary_key=True)
+    city: str = sa.Column(sa.VARCHAR(100), nullable=False)
+    country_code: str = sa.Column(sa.VARCHAR(2), nullable=False)
+    owm_city_id: Optional[int] = sa.Column(sa.Integer, nullable=True, index=True)
+    lat: Optional[float] = sa.Column(sa.Float, nullable=True)
+    lon: Optional[float] = sa.Column(sa.Float, nullable=True)
+
+    def __init__(
+        self,
+        city: str,
+        country_code: str,
+        owm_city_id: Optional[int] = None,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+    ):
+        self.city = city
+        self.country_code = country_code
+        self.owm_city_id = owm_city_id
+        self.lat = lat
+        self.lon = lon
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from weather_notifier.db import get_session
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.locations import schemas, services
+
+router = APIRouter(tags=["Location"])
+
+
+@router.get("/locations", response_model=list[schemas.LocationSchema])
+def get_locations(session: Session = Depends(get_session)):
+    """Get all locations"""
+    return services.get_all_locations(session)
+
+
+@router.put("/locations/{location_id}", response_model=schemas.LocationSchema)
+def update_location(
+    location_id: int,
+    update: schemas.LocationUpdateSchema,
+    session: Session = Depends(get_session),
+):
+    """Set the OpenWeatherMap city id and coordinates of a location"""
+    try:
+        return services.update_location(session, location_id, update)
+    except EntityNotFoundException as e:
+        raise HTTPException(status_code=e.code, detail=str(e))
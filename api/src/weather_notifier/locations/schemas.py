@@ -0,0 +1,25 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class LocationSchema(BaseModel):
+    """A canonical location, with its OpenWeatherMap city id and coordinates if known"""
+
+    id: int
+    city: str
+    country_code: str
+    owm_city_id: Optional[int]
+    lat: Optional[float]
+    lon: Optional[float]
+
+    class Config:
+        orm_mode = True
+
+
+class LocationUpdateSchema(BaseModel):
+    """The OpenWeatherMap city id and coordinates of a location"""
+
+    owm_city_id: Optional[int]
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
@@ -0,0 +1,120 @@
+from typing import Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.locations.models import Location
+from weather_notifier.locations.schemas import LocationUpdateSchema
+
+LocationKey = tuple[str, str]
+
+# Dialects supporting INSERT ... ON CONFLICT DO NOTHING
+INSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def normalize_location(city: str, country_code: str) -> LocationKey:
+    """
+    Normalize a location the same way the notifier does, so differently cased or spaced
+    spellings of a location are stored as the same location
+    """
+    return " ".join(city.split()).lower(), country_code.strip().upper()
+
+
+def ensure_locations(
+    connection: Connection, locations: Iterable[LocationKey]
+) -> dict[LocationKey, int]:
+    """
+    Get the ids of locations, creating the locations which don't exist yet. Safe to call
+    concurrently, as inserting a location created by another transaction is a no-op
+
+    Parameters
+    ----------
+    connection
+        The connection of an open transaction
+    locations
+        The city and country code of each location, in any spelling
+
+    Returns
+    -------
+    dict of canonical location to id
+    """
+    keys = {normalize_location(city, country_code) for city, country_code in locations}
+    if not keys:
+        return {}
+
+    location_table = Location.__table__
+    select = sa.select(
+        location_table.c.city, location_table.c.country_code, location_table.c.id
+    ).where(sa.tuple_(location_table.c.city, location_table.c.country_code).in_(keys))
+
+    ids = {
+        (city, country_code): id_
+        for city, country_code, id_ in connection.execute(select)
+    }
+    if missing := keys - ids.keys():
+        insert = INSERT_DIALECTS[connection.dialect.name](location_table)
+        connection.execute(
+            insert.on_conflict_do_nothing(),
+            [
+                {"city": city, "country_code": country_code}
+                for city, country_code in missing
+            ],
+        )
+        ids.update(
+            ((city, country_code), id_)
+            for city, country_code, id_ in connection.execute(select)
+        )
+    return ids
+
+
+def get_all_locations(session: Session) -> list[Location]:
+    """
+    Get all locations from the database
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+
+    Returns
+    -------
+    list of Locations
+    """
+    return session.execute(sa.select(Location).order_by(Location.id)).scalars().all()
+
+
+def update_location(
+    session: Session, location_id: int, update: LocationUpdateSchema
+) -> Location:
+    """
+    Set the OpenWeatherMap city id and coordinates of a location
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    location_id
+        The id of the location
+    update
+        The new city id and coordinates
+
+    Raises
+    ------
+    EntityNotFoundException
+        Raised if the location doesn't exist
+
+    Returns
+    -------
+    Location
+        The updated location
+    """
+    if (location := session.get(Location, location_id)) is None:
+        raise EntityNotFoundException(f"Location: {location_id}")
+    for key, value in update.dict().items():
+        setattr(location, key, value)
+    # Flush, so a failing update fails the request instead of the commit after the response
+    session.flush()
+    return location
@@ -3,6 +3,11 @@ from pydantic import BaseSettings, SecretStr
 
 class DBAuth(BaseSettings):
     db_url: SecretStr
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 3600
+    db_async: bool = False
 
     class Config:
         env_file = ".env"
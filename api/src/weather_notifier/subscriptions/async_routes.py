@@ -0,0 +1,213 @@
+"""
+The subscription routes using the asyncio database layer. Used instead of
+`weather_notifier.subscriptions.routes` when `db_async` is set
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from weather_notifier.db import get_async_session
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.subscriptions import async_services, bulk_services, schemas
+from weather_notifier.subscriptions.routes import read_rows
+
+router = APIRouter(tags=["Subscription"])
+
+
+@router.get("/subscriptions", response_model=list[schemas.SubscriptionOutSchema])
+async def get_subscriptions(session: AsyncSession = Depends(get_async_session)):
+    """Get all subscriptions"""
+    return await async_services.get_all_subscriptions(session)
+
+
+@router.get("/subscriptions/page", response_model=schemas.SubscriptionPageSchema)
+async def get_subscriptions_page(
+    cursor: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Get a page of subscriptions. Pass the returned `next_cursor` as `cursor` to get the next
+    page. A `next_cursor` of null means there are no more pages
+    """
+    subscriptions, next_cursor = await async_services.get_subscriptions_page(
+        session, cursor=cursor, limit=limit
+    )
+    return {"subscriptions": subscriptions, "next_cursor": next_cursor}
+
+
+@router.get("/subscriptions/stream", response_class=StreamingResponse)
+async def stream_subscriptions(session: AsyncSession = Depends(get_async_session)):
+    """
+    Stream all subscriptions as newline-delimited JSON, one subscription per line
+    """
+    lines = (
+        schemas.SubscriptionOutSchema.parse_obj(subscription).json() + "\n"
+        async for subscription in async_services.stream_subscriptions(session)
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.get(
+    "/subscriptions/by-condition", response_model=list[schemas.SubscriptionOutSchema]
+)
+async def get_subscriptions_by_condition(
+    condition: schemas.ConditionEnum,
+    op: Optional[schemas.OpEnum] = None,
+    value: Optional[float] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Get the subscriptions with a condition on `condition`, optionally only the conditions
+    using `op`. If `value` is given, only subscriptions with a condition triggered by that
+    value are returned
+    """
+    return await async_services.get_subscriptions_by_condition(
+        session, condition, op=op, value=value
+    )
+
+
+@router.get(
+    "/subscriptions/by-location",
+    response_model=list[schemas.LocationSubscriptionsSchema],
+)
+async def get_subscriptions_by_location(
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Get all subscriptions grouped by location, so the weather of each location only needs
+    to be fetched once
+    """
+    return [
+        {"location": location, "subscriptions": subscriptions}
+        for location, subscriptions in await async_services.get_subscriptions_by_location(
+            session
+        )
+    ]
+
+
+@router.get("/subscriptions/changes", response_model=schemas.SubscriptionChangesSchema)
+async def get_subscription_changes(
+    since: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Get the subscriptions created, updated or deleted since `since`. Pass the returned
+    `next_token` as `since` to get the following changes. Without `since`, a snapshot of all
+    subscriptions is returned as updated, one page at a time: pass the returned `next_cursor`
+    as `cursor` to get the next page, until it's null. The `next_token` of the first page of
+    the snapshot is the one to follow it with
+    """
+    changes = await async_services.get_subscription_changes(
+        session, since=since, cursor=cursor, limit=limit
+    )
+    updated, deleted, next_token, next_cursor = changes
+    return {
+        "updated": updated,
+        "deleted": deleted,
+        "next_token": next_token,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.post("/subscriptions/bulk", response_model=schemas.BulkResultSchema)
+async def bulk_create_subscriptions(
+    rows: list = Depends(read_rows), session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Create many subscriptions. Send a JSON array of subscriptions, or one subscription per
+    line as `application/x-ndjson`. Invalid rows are reported in `errors` by their index
+    without affecting the other rows
+    """
+    return await session.run_sync(bulk_services.bulk_create_subscriptions, rows)
+
+
+@router.put("/subscriptions/bulk", response_model=schemas.BulkResultSchema)
+async def bulk_upsert_subscriptions(
+    rows: list = Depends(read_rows), session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Create or replace many subscriptions by their `subscription_uuid`. Send a JSON array of
+    subscriptions, or one subscription per line as `application/x-ndjson`
+    """
+    return await session.run_sync(bulk_services.bulk_upsert_subscriptions, rows)
+
+
+@router.post("/subscriptions/bulk/delete", response_model=schemas.BulkResultSchema)
+async def bulk_delete_subscriptions(
+    rows: list = Depends(read_rows), session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Delete many subscriptions. Send a JSON array of subscription uuids, or one uuid per line
+    as `application/x-ndjson`. Unknown uuids are reported in `errors`
+    """
+    return await session.run_sync(bulk_services.bulk_delete_subscriptions, rows)
+
+
+@router.get(
+    "/subscription/{subscription_uuid}", response_model=schemas.SubscriptionOutSchema
+)
+async def get_subscription_for_id(
+    subscription_uuid: str, session: AsyncSession = Depends(get_async_session)
+):
+    """Get a given subscription"""
+    if (
+        subscription := await async_services.get_subscription_by_uuid(
+            session, subscription_uuid
+        )
+    ) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Subscription Not found"
+        )
+    return subscription
+
+
+@router.post(
+    "/subscriptions",
+    response_model=schemas.SubscriptionOutSchema,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_new_subscription(
+    subscription: schemas.SubscriptionInSchema,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Create a new subscription"""
+    return await async_services.create_subscription(session, subscription)
+
+
+@router.put(
+    "/subscription/{subscription_uuid}",
+    response_model=schemas.SubscriptionOutSchema,
+    status_code=status.HTTP_200_OK,
+)
+async def update_subscription(
+    subscription_uuid: str,
+    update_data: schemas.SubscriptionInSchema,
+    session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        return await async_services.update_subscription_by_uuid(
+            session, subscription_uuid, update_data
+        )
+    except EntityNotFoundException as e:
+        raise HTTPException(status_code=e.code, detail=str(e))
+
+
+@router.delete(
+    "/subscription/{subscription_uuid}",
+    response_class=Response,
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def delete_subscription(
+    subscription_uuid: str, session: AsyncSession = Depends(get_async_session)
+):
+    """Delete an existing subscription"""
+    try:
+        await async_services.delete_subscription_by_uuid(session, subscription_uuid)
+    except EntityNotFoundException as e:
+        raise HTTPException(status_code=e.code, detail=str(e))
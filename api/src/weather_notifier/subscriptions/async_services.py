@@ -0,0 +1,287 @@
+"""
+Asyncio versions of the functions in `weather_notifier.subscriptions.services`, for use with
+an AsyncSession
+"""
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.locations.models import Location
+from weather_notifier.subscriptions import schemas
+from weather_notifier.subscriptions.models import (
+    Subscription,
+    SubscriptionTombstone,
+    to_utc,
+    utcnow,
+)
+from weather_notifier.subscriptions.schemas import (
+    ConditionEnum,
+    OpEnum,
+    SubscriptionInSchema,
+)
+from weather_notifier.subscriptions.services import (
+    CHANGES_OVERLAP,
+    conditions_by_subscription_sql,
+    group_by_location,
+    group_conditions,
+    stream_subscriptions_sql,
+    subscription_dicts,
+    subscriptions_by_location_sql,
+    triggered_by_sql,
+)
+
+
+async def get_all_subscriptions(session: AsyncSession) -> list[Subscription]:
+    """
+    Get all subscriptions from the database
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+
+    Returns
+    -------
+    list of Subscriptions
+
+    """
+    sql = sa.select(Subscription)
+
+    return (await session.execute(sql)).scalars().all()
+
+
+async def get_subscriptions_page(
+    session: AsyncSession, cursor: Optional[int] = None, limit: int = 1000
+) -> tuple[list[Subscription], Optional[int]]:
+    """
+    Get a page of subscriptions ordered by id, using keyset pagination
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+    cursor
+        The cursor returned with the previous page. If None, returns the first page
+    limit
+        The maximum number of subscriptions in the page
+
+    Returns
+    -------
+    list of Subscriptions and the next cursor
+        The next cursor is None if this is the last page
+
+    """
+    sql = sa.select(Subscription).order_by(Subscription.id).limit(limit + 1)
+
+    if cursor is not None:
+        sql = sql.where(Subscription.id > cursor)
+
+    subscriptions = (await session.execute(sql)).scalars().all()
+
+    if len(subscriptions) > limit:
+        subscriptions = subscriptions[:limit]
+        return subscriptions, subscriptions[-1].id
+    return subscriptions, None
+
+
+async def get_subscriptions_by_location(
+    session: AsyncSession,
+) -> list[tuple[Location, list[Subscription]]]:
+    """
+    Get all subscriptions grouped by location, in a single query using the index on the
+    location of subscriptions
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+
+    Returns
+    -------
+    list of Location and list of Subscriptions pairs
+    """
+    result = await session.execute(subscriptions_by_location_sql())
+    return group_by_location(result.all())
+
+
+async def stream_subscriptions(
+    session: AsyncSession, batch_size: int = 1000
+) -> AsyncIterator[dict]:
+    """
+    Stream all subscriptions from the database using a server-side cursor, buffering at most
+    `batch_size` rows at a time
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+    batch_size
+        The maximum number of rows to buffer from the cursor
+
+    Returns
+    -------
+    async iterator of dicts
+        An iterator over every subscription as a dictionary
+
+    """
+    sql = stream_subscriptions_sql().execution_options(max_row_buffer=batch_size)
+
+    result = await session.stream(sql)
+
+    async for rows in result.mappings().partitions(batch_size):
+        conditions_sql = conditions_by_subscription_sql(row["id"] for row in rows)
+        conditions = group_conditions(await session.execute(conditions_sql))
+        for subscription in subscription_dicts(rows, conditions):
+            yield subscription
+
+
+async def get_subscriptions_by_condition(
+    session: AsyncSession,
+    condition: ConditionEnum,
+    op: Optional[OpEnum] = None,
+    value: Optional[float] = None,
+) -> list[Subscription]:
+    """
+    Get the subscriptions with a condition on a weather condition, optionally only those
+    triggered by a value
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+    condition
+        The weather condition
+    op
+        Only get subscriptions with a condition using this comparison
+    value
+        Only get subscriptions with a condition triggered by this value
+
+    Returns
+    -------
+    list of Subscriptions
+    """
+    sql = triggered_by_sql(condition, op, value)
+    return (await session.execute(sql)).scalars().all()
+
+
+async def get_subscription_changes(
+    session: AsyncSession,
+    since: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 1000,
+) -> tuple[list[Subscription], list[str], datetime, Optional[int]]:
+    """
+    Get the changes to subscriptions since a token. Without a token, a page of all
+    subscriptions is returned as updated
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+    since
+        The token returned with the previous changes
+    cursor
+        The cursor returned with the previous page of the snapshot. Only used without `since`
+    limit
+        The maximum number of subscriptions in a page of the snapshot
+
+    Returns
+    -------
+    list of updated Subscriptions, list of deleted subscription uuids, the next token and the
+    next cursor
+        The next cursor is None unless there are more pages of the snapshot
+    """
+    next_token = utcnow()
+    if since is None:
+        subscriptions, next_cursor = await get_subscriptions_page(
+            session, cursor=cursor, limit=limit
+        )
+        return subscriptions, [], next_token, next_cursor
+
+    since = to_utc(since) - CHANGES_OVERLAP
+    updated_sql = (
+        sa.select(Subscription)
+        .where(Subscription.updated_at >= since)
+        .order_by(Subscription.id)
+    )
+    deleted_sql = sa.select(SubscriptionTombstone.subscription_uuid).where(
+        SubscriptionTombstone.deleted_at >= since
+    )
+
+    updated = (await session.execute(updated_sql)).scalars().all()
+    deleted = (await session.execute(deleted_sql)).scalars().all()
+    return updated, deleted, next_token, None
+
+
+async def get_subscription_by_uuid(
+    session: AsyncSession, subscription_uuid: str
+) -> Optional[Subscription]:
+    """
+    Get a given subscription by uuid from the database. Returns None if the subscription doesn't
+    exist
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+    subscription_uuid
+        The UUID of the subscription
+
+    Returns
+    -------
+    Subscription or None
+    """
+    sql = sa.select(Subscription).filter_by(subscription_uuid=subscription_uuid)
+
+    return (await session.execute(sql)).scalar_one_or_none()
+
+
+async def create_subscription(
+    session: AsyncSession, subscription: SubscriptionInSchema
+) -> Subscription:
+    """
+    Create a new subscription
+
+    Parameters
+    ----------
+    session
+        An open asyncio session to the database
+    subscription
+        A Pydantic schema representing a new subscription
+
+    Returns
+    -------
+    The saved Subscription
+    """
+
+    new_subscription = Subscription.from_dict(subscription.dict())
+    session.add(new_subscription)
+    return new_subscription
+
+
+async def delete_subscription_by_uuid(
+    session: AsyncSession, subscription_uuid: str
+) -> None:
+    if not (subscription := await get_subscription_by_uuid(session, subscription_uuid)):
+        raise EntityNotFoundException(f"Subscription: {subscription_uuid}")
+    await session.delete(subscription)
+    await session.merge(SubscriptionTombstone(subscription_uuid, deleted_at=utcnow()))
+
+
+async def update_subscription_by_uuid(
+    session: AsyncSession,
+    subscription_uuid: str,
+    subscription: schemas.SubscriptionInSchema,
+) -> Optional[Subscription]:
+    if not (
+        existing_subscription := await get_subscription_by_uuid(
+            session, subscription_uuid
+        )
+    ):
+        raise EntityNotFoundException(f"Subscription: {subscription_uuid}")
+    existing_subscription = existing_subscription.update_from_dict(subscription.dict())
+    session.add(existing_subscription)
+    return existing_subscription
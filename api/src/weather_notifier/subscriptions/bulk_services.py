@@ -0,0 +1,432 @@
+"""
+Services for writing many subscriptions at once. Rows are validated one at a time and written
+in chunks of one statement each, so a rejected row is reported without aborting the batch
+"""
+import json
+import uuid
+from typing import Any, Callable, Iterator, NamedTuple, Optional, Sequence, TypeVar
+
+import sqlalchemy as sa
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from weather_notifier.locations.services import ensure_locations, normalize_location
+from weather_notifier.subscriptions.models import (
+    Subscription,
+    SubscriptionCondition,
+    SubscriptionTombstone,
+    utcnow,
+)
+from weather_notifier.subscriptions.schemas import (
+    BulkResultSchema,
+    BulkRowErrorSchema,
+    BulkRowResultSchema,
+    SubscriptionInSchema,
+    SubscriptionOutSchema,
+)
+
+BULK_CHUNK_SIZE = 1000
+
+T = TypeVar("T")
+Schema = TypeVar("Schema", bound=BaseModel)
+
+subscriptions = Subscription.__table__
+conditions = SubscriptionCondition.__table__
+
+
+class MalformedRow(NamedTuple):
+    """A line of a newline-delimited JSON request which isn't valid JSON"""
+
+    line: int
+
+    @property
+    def detail(self) -> str:
+        return f"Line {self.line} is not valid JSON"
+
+
+def parse_rows(body: bytes, content_type: str = "application/json") -> list[Any]:
+    """
+    Parse the rows of a bulk request, either a JSON array or newline-delimited JSON with one
+    row per line. A line which isn't valid JSON is returned as a `MalformedRow`, so it's
+    reported as an error of its row without rejecting the other rows
+
+    Parameters
+    ----------
+    body
+        The body of the request
+    content_type
+        The content type of the body. "application/x-ndjson" is parsed as newline-delimited
+        JSON, anything else as a JSON array
+
+    Raises
+    ------
+    ValueError
+        Raised if a JSON array body isn't valid JSON or isn't a JSON array
+
+    Returns
+    -------
+    list
+        The rows of the request
+    """
+    if content_type.split(";")[0].strip() == "application/x-ndjson":
+        rows = []
+        for number, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(MalformedRow(number))
+        return rows
+
+    rows = json.loads(body)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of rows")
+    return rows
+
+
+def chunked(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    """Split a sequence into chunks of at most `size` items"""
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+def malformed_row_error(index: int, row: Any) -> Optional[BulkRowErrorSchema]:
+    """The error of a row which couldn't be parsed, or None if the row was parsed"""
+    if isinstance(row, MalformedRow):
+        return BulkRowErrorSchema(index=index, detail=row.detail)
+    return None
+
+
+def validate_rows(
+    rows: Sequence[Any], schema: type[Schema]
+) -> tuple[list[tuple[int, Schema]], list[BulkRowErrorSchema]]:
+    """
+    Validate each row against a schema
+
+    Parameters
+    ----------
+    rows
+        The rows of the request
+    schema
+        The schema every row should match
+
+    Returns
+    -------
+    list of index and parsed row pairs, and list of errors
+    """
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        if error := malformed_row_error(index, row):
+            errors.append(error)
+            continue
+        try:
+            valid.append((index, schema.parse_obj(row)))
+        except ValidationError as e:
+            errors.append(BulkRowErrorSchema(index=index, detail=e.errors()))
+    return valid, errors
+
+
+def write_chunk(
+    session: Session,
+    chunk: Sequence[tuple[int, dict]],
+    write: Callable[[list[dict]], None],
+) -> list[BulkRowErrorSchema]:
+    """
+    Write a chunk of rows in one statement. If the database rejects the chunk, each row is
+    written on its own to find the rejected rows
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    chunk
+        Pairs of row index and the values to write
+    write
+        Writes a list of values to the database
+
+    Returns
+    -------
+    list of errors
+        The rows rejected by the database
+    """
+    try:
+        with session.begin_nested():
+            write([values for _, values in chunk])
+        return []
+    except DBAPIError:
+        pass
+
+    errors = []
+    for index, values in chunk:
+        try:
+            with session.begin_nested():
+                write([values])
+        except DBAPIError as e:
+            errors.append(BulkRowErrorSchema(index=index, detail=str(e.orig)))
+    return errors
+
+
+def subscription_rows(session: Session, values: list[dict]) -> list[dict]:
+    """The column values of subscriptions, pointing at the locations of their cities"""
+    location_ids = ensure_locations(
+        session.connection(), [(row["city"], row["country_code"]) for row in values]
+    )
+    return [
+        {
+            **{k: v for k, v in row.items() if k != "conditions"},
+            "location_id": location_ids[
+                normalize_location(row["city"], row["country_code"])
+            ],
+        }
+        for row in values
+    ]
+
+
+def insert_subscriptions(session: Session, values: list[dict]) -> None:
+    """Insert subscriptions with their conditions"""
+    session.execute(sa.insert(subscriptions), subscription_rows(session, values))
+    replace_conditions(session, values)
+
+
+def replace_conditions(session: Session, values: list[dict]) -> None:
+    """Replace the conditions of subscriptions with the conditions of `values`"""
+    ids = dict(
+        session.execute(
+            sa.select(Subscription.subscription_uuid, Subscription.id).where(
+                Subscription.subscription_uuid.in_(
+                    [row["subscription_uuid"] for row in values]
+                )
+            )
+        ).all()
+    )
+    session.execute(
+        sa.delete(conditions).where(conditions.c.subscription_id.in_(ids.values()))
+    )
+    condition_rows = [
+        {**condition, "subscription_id": ids[row["subscription_uuid"]]}
+        for row in values
+        for condition in row["conditions"]
+    ]
+    if condition_rows:
+        session.execute(sa.insert(conditions), condition_rows)
+
+
+def collect_result(
+    chunk: Sequence[tuple[int, dict]], errors: list[BulkRowErrorSchema]
+) -> list[BulkRowResultSchema]:
+    """The results of the rows of a chunk which weren't rejected"""
+    failed = {error.index for error in errors}
+    return [
+        BulkRowResultSchema(index=index, subscription_uuid=values["subscription_uuid"])
+        for index, values in chunk
+        if index not in failed
+    ]
+
+
+def bulk_create_subscriptions(
+    session: Session, rows: Sequence[Any], chunk_size: int = BULK_CHUNK_SIZE
+) -> BulkResultSchema:
+    """
+    Create many subscriptions, inserting `chunk_size` rows per statement
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    rows
+        The new subscriptions, each matching `SubscriptionInSchema`
+    chunk_size
+        The number of rows to insert per statement
+
+    Returns
+    -------
+    BulkResultSchema
+        The uuids of the created subscriptions and the rejected rows
+    """
+    valid, result_errors = validate_rows(rows, SubscriptionInSchema)
+    result = BulkResultSchema(errors=result_errors)
+
+    for chunk in chunked(valid, chunk_size):
+        values = [
+            (index, {**row.dict(), "subscription_uuid": str(uuid.uuid4())})
+            for index, row in chunk
+        ]
+        errors = write_chunk(
+            session, values, lambda rows: insert_subscriptions(session, rows)
+        )
+        result.succeeded.extend(collect_result(values, errors))
+        result.errors.extend(errors)
+
+    result.errors.sort(key=lambda error: error.index)
+    return result
+
+
+def bulk_upsert_subscriptions(
+    session: Session, rows: Sequence[Any], chunk_size: int = BULK_CHUNK_SIZE
+) -> BulkResultSchema:
+    """
+    Create or replace many subscriptions by uuid, writing `chunk_size` rows per statement
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    rows
+        The subscriptions, each matching `SubscriptionOutSchema`. A uuid can only appear once
+    chunk_size
+        The number of rows to write per statement
+
+    Returns
+    -------
+    BulkResultSchema
+        The uuids of the written subscriptions and the rejected rows
+    """
+    valid, result_errors = validate_rows(rows, SubscriptionOutSchema)
+    result = BulkResultSchema(errors=result_errors)
+
+    unique, seen = [], set()
+    for index, row in valid:
+        if row.subscription_uuid in seen:
+            result.errors.append(
+                BulkRowErrorSchema(index=index, detail="Duplicate subscription_uuid")
+            )
+        else:
+            seen.add(row.subscription_uuid)
+            unique.append((index, row.dict()))
+
+    update = (
+        sa.update(subscriptions)
+        .where(subscriptions.c.subscription_uuid == sa.bindparam("b_uuid"))
+        .values(
+            email=sa.bindparam("email"),
+            city=sa.bindparam("city"),
+            country_code=sa.bindparam("country_code"),
+            location_id=sa.bindparam("location_id"),
+        )
+    )
+
+    for chunk in chunked(unique, chunk_size):
+        existing = set(
+            session.execute(
+                sa.select(Subscription.subscription_uuid).where(
+                    Subscription.subscription_uuid.in_(
+                        [values["subscription_uuid"] for _, values in chunk]
+                    )
+                )
+            ).scalars()
+        )
+
+        def upsert(values: list[dict]) -> None:
+            inserts = [v for v in values if v["subscription_uuid"] not in existing]
+            updates = [
+                {**v, "b_uuid": v["subscription_uuid"]}
+                for v in values
+                if v["subscription_uuid"] in existing
+            ]
+            if inserts:
+                insert_subscriptions(session, inserts)
+                session.execute(
+                    sa.delete(SubscriptionTombstone).where(
+                        SubscriptionTombstone.subscription_uuid.in_(
+                            [v["subscription_uuid"] for v in inserts]
+                        )
+                    )
+                )
+            if updates:
+                session.execute(update, subscription_rows(session, updates))
+                replace_conditions(session, updates)
+
+        errors = write_chunk(session, chunk, upsert)
+        result.succeeded.extend(collect_result(chunk, errors))
+        result.errors.extend(errors)
+
+    result.errors.sort(key=lambda error: error.index)
+    return result
+
+
+def bulk_delete_subscriptions(
+    session: Session, rows: Sequence[Any], chunk_size: int = BULK_CHUNK_SIZE
+) -> BulkResultSchema:
+    """
+    Delete many subscriptions by uuid, deleting `chunk_size` rows per statement
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    rows
+        The uuids of the subscriptions to delete
+    chunk_size
+        The number of rows to delete per statement
+
+    Returns
+    -------
+    BulkResultSchema
+        The uuids of the deleted subscriptions, and the uuids which weren't found
+    """
+    result = BulkResultSchema()
+    uuids = []
+    for index, row in enumerate(rows):
+        if error := malformed_row_error(index, row):
+            result.errors.append(error)
+        elif isinstance(row, str):
+            uuids.append((index, row))
+        else:
+            result.errors.append(
+                BulkRowErrorSchema(index=index, detail="Must be a subscription uuid")
+            )
+
+    for chunk in chunked(uuids, chunk_size):
+        requested = [subscription_uuid for _, subscription_uuid in chunk]
+        ids = dict(
+            session.execute(
+                sa.select(Subscription.subscription_uuid, Subscription.id).where(
+                    Subscription.subscription_uuid.in_(requested)
+                )
+            ).all()
+        )
+        existing = set(ids)
+        if existing:
+            # Deleted explicitly, as SQLite doesn't enforce the cascade by default
+            session.execute(
+                sa.delete(conditions).where(
+                    conditions.c.subscription_id.in_(ids.values())
+                )
+            )
+            session.execute(
+                sa.delete(subscriptions).where(subscriptions.c.id.in_(ids.values()))
+            )
+            session.execute(
+                sa.delete(SubscriptionTombstone).where(
+                    SubscriptionTombstone.subscription_uuid.in_(existing)
+                )
+            )
+            deleted_at = utcnow()
+            session.execute(
+                sa.insert(SubscriptionTombstone.__table__),
+                [
+                    {"subscription_uuid": subscription_uuid, "deleted_at": deleted_at}
+                    for subscription_uuid in existing
+                ],
+            )
+
+        for index, subscription_uuid in chunk:
+            if subscription_uuid in existing:
+                result.succeeded.append(
+                    BulkRowResultSchema(
+                        index=index, subscription_uuid=subscription_uuid
+                    )
+                )
+            else:
+                result.errors.append(
+                    BulkRowErrorSchema(
+                        index=index,
+                        detail=f"Subscription: {subscription_uuid} not found",
+                    )
+                )
+
+    result.errors.sort(key=lambda error: error.index)
+    return result
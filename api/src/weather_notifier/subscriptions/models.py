@@ -1,8 +1,62 @@
 import uuid
+from datetime import datetime, timezone
 
 import sqlalchemy as sa
+from sqlalchemy.orm import relationship
 
 from weather_notifier.db import mapper_registry
+from weather_notifier.locations.services import ensure_locations
+
+
+def utcnow() -> datetime:
+    """The current time as a naive UTC datetime, as stored in the database"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(value: datetime) -> datetime:
+    """Convert a datetime to naive UTC. Naive datetimes are assumed to be UTC already"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@mapper_registry.mapped
+class SubscriptionCondition:
+    """An alert condition of a subscription, with one row per condition"""
+
+    __tablename__ = "conditions"
+    __table_args__ = (
+        sa.Index(
+            "ix_conditions_condition_op_threshold", "condition", "op", "threshold"
+        ),
+        sa.Index(
+            "ix_conditions_subscription_id_condition", "subscription_id", "condition"
+        ),
+    )
+
+    id: int = sa.Column(sa.Integer, primary_key=True)
+    subscription_id: int = sa.Column(
+        sa.Integer,
+        sa.ForeignKey("subscriptions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    condition: str = sa.Column(sa.VARCHAR(20), nullable=False)
+    op: str = sa.Column(sa.VARCHAR(2), nullable=False)
+    threshold: float = sa.Column(sa.Float, nullable=False)
+
+    def __init__(self, condition: str, op: str, threshold: float):
+        self.condition = condition
+        self.op = op
+        self.threshold = threshold
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SubscriptionCondition":
+        return cls(
+            condition=data["condition"], op=data["op"], threshold=data["threshold"]
+        )
+
+    def to_dict(self) -> dict:
+        return {"condition": self.condition, "op": self.op, "threshold": self.threshold}
 
 
 @mapper_registry.mapped
@@ -14,7 +68,20 @@ class Subscription:
     country_code: str = sa.Column(sa.VARCHAR(2))
     city: str = sa.Column(sa.VARCHAR(100))
     email: str = sa.Column(sa.VARCHAR(250))
-    conditions: list[dict] = sa.Column(sa.JSON())
+    # Set from the city and country code when the subscription is flushed
+    location_id: int = sa.Column(
+        sa.Integer, sa.ForeignKey("locations.id"), nullable=False, index=True
+    )
+    updated_at: datetime = sa.Column(
+        sa.DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True
+    )
+    # Loaded with one extra query per result rather than lazily, so it works with AsyncSession
+    conditions: list[SubscriptionCondition] = relationship(
+        SubscriptionCondition,
+        lazy="selectin",
+        cascade="all, delete-orphan",
+        order_by=SubscriptionCondition.id,
+    )
 
     def __init__(
         self,
@@ -28,7 +95,7 @@ class Subscription:
         self.country_code = country_code
         self.city = city
         self.email = email
-        self.conditions = conditions
+        self.set_conditions(conditions)
 
     @classmethod
     def from_dict(cls, data: dict) -> "Subscription":
@@ -40,8 +107,44 @@ class Subscription:
             conditions=data["conditions"],
         )
 
+    def set_conditions(self, conditions: list[dict]) -> None:
+        """Replace the conditions of the subscription"""
+        self.conditions = [SubscriptionCondition.from_dict(c) for c in conditions]
+        # The subscription row isn't otherwise updated when only its conditions change
+        self.updated_at = utcnow()
+
     def update_from_dict(self, data: dict) -> "Subscription":
         for key, val in data.items():
-            if hasattr(self, key):
+            if key == "conditions":
+                self.set_conditions(val)
+            elif hasattr(self, key):
                 setattr(self, key, val)
         return self
+
+
+@sa.event.listens_for(Subscription, "before_insert")
+@sa.event.listens_for(Subscription, "before_update")
+def set_location_id(mapper, connection: sa.engine.Connection, target: Subscription):
+    """Point the subscription at the location of its city and country code"""
+    state = sa.inspect(target)
+    if (
+        target.location_id is None
+        or state.attrs.city.history.has_changes()
+        or state.attrs.country_code.history.has_changes()
+    ):
+        location = (target.city, target.country_code)
+        target.location_id = ensure_locations(connection, [location]).popitem()[1]
+
+
+@mapper_registry.mapped
+class SubscriptionTombstone:
+    """Records when a subscription was deleted, so the deletion shows up in the change feed"""
+
+    __tablename__ = "subscription_tombstones"
+
+    subscription_uuid: str = sa.Column(sa.VARCHAR(36), primary_key=True)
+    deleted_at: datetime = sa.Column(sa.DateTime, nullable=False, index=True)
+
+    def __init__(self, subscription_uuid: str, deleted_at: datetime):
+        self.subscription_uuid = subscription_uuid
+        self.deleted_at = deleted_at
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from fastapi.responses import Response
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 
 from weather_notifier.db import get_session
 from weather_notifier.exceptions import EntityNotFoundException
-from weather_notifier.subscriptions import schemas, services
+from weather_notifier.subscriptions import bulk_services, schemas, services
 
 router = APIRouter(tags=["Subscription"])
 
@@ -15,6 +19,145 @@ def get_subscriptions(session: Session = Depends(get_session)):
     return services.get_all_subscriptions(session)
 
 
+@router.get("/subscriptions/page", response_model=schemas.SubscriptionPageSchema)
+def get_subscriptions_page(
+    cursor: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    session: Session = Depends(get_session),
+):
+    """
+    Get a page of subscriptions. Pass the returned `next_cursor` as `cursor` to get the next
+    page. A `next_cursor` of null means there are no more pages
+    """
+    subscriptions, next_cursor = services.get_subscriptions_page(
+        session, cursor=cursor, limit=limit
+    )
+    return {"subscriptions": subscriptions, "next_cursor": next_cursor}
+
+
+@router.get("/subscriptions/stream", response_class=StreamingResponse)
+def stream_subscriptions(session: Session = Depends(get_session)):
+    """
+    Stream all subscriptions as newline-delimited JSON, one subscription per line
+    """
+    lines = (
+        schemas.SubscriptionOutSchema.parse_obj(subscription).json() + "\n"
+        for subscription in services.stream_subscriptions(session)
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.get(
+    "/subscriptions/by-condition", response_model=list[schemas.SubscriptionOutSchema]
+)
+def get_subscriptions_by_condition(
+    condition: schemas.ConditionEnum,
+    op: Optional[schemas.OpEnum] = None,
+    value: Optional[float] = None,
+    session: Session = Depends(get_session),
+):
+    """
+    Get the subscriptions with a condition on `condition`, optionally only the conditions
+    using `op`. If `value` is given, only subscriptions with a condition triggered by that
+    value are returned
+    """
+    return services.get_subscriptions_by_condition(
+        session, condition, op=op, value=value
+    )
+
+
+@router.get(
+    "/subscriptions/by-location",
+    response_model=list[schemas.LocationSubscriptionsSchema],
+)
+def get_subscriptions_by_location(session: Session = Depends(get_session)):
+    """
+    Get all subscriptions grouped by location, so the weather of each location only needs
+    to be fetched once
+    """
+    return [
+        {"location": location, "subscriptions": subscriptions}
+        for location, subscriptions in services.get_subscriptions_by_location(session)
+    ]
+
+
+@router.get("/subscriptions/changes", response_model=schemas.SubscriptionChangesSchema)
+def get_subscription_changes(
+    since: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10_000),
+    session: Session = Depends(get_session),
+):
+    """
+    Get the subscriptions created, updated or deleted since `since`. Pass the returned
+    `next_token` as `since` to get the following changes. Without `since`, a snapshot of all
+    subscriptions is returned as updated, one page at a time: pass the returned `next_cursor`
+    as `cursor` to get the next page, until it's null. The `next_token` of the first page of
+    the snapshot is the one to follow it with
+    """
+    updated, deleted, next_token, next_cursor = services.get_subscription_changes(
+        session, since=since, cursor=cursor, limit=limit
+    )
+    return {
+        "updated": updated,
+        "deleted": deleted,
+        "next_token": next_token,
+        "next_cursor": next_cursor,
+    }
+
+
+async def read_rows(request: Request) -> list:
+    """Read the rows of a bulk request, sent as a JSON array or as newline-delimited JSON"""
+    try:
+        return bulk_services.parse_rows(
+            await request.body(), request.headers.get("content-type", "")
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+
+
+@router.post("/subscriptions/bulk", response_model=schemas.BulkResultSchema)
+async def bulk_create_subscriptions(
+    rows: list = Depends(read_rows), session: Session = Depends(get_session)
+):
+    """
+    Create many subscriptions. Send a JSON array of subscriptions, or one subscription per
+    line as `application/x-ndjson`. Invalid rows are reported in `errors` by their index
+    without affecting the other rows
+    """
+    return await run_in_threadpool(
+        bulk_services.bulk_create_subscriptions, session, rows
+    )
+
+
+@router.put("/subscriptions/bulk", response_model=schemas.BulkResultSchema)
+async def bulk_upsert_subscriptions(
+    rows: list = Depends(read_rows), session: Session = Depends(get_session)
+):
+    """
+    Create or replace many subscriptions by their `subscription_uuid`. Send a JSON array of
+    subscriptions, or one subscription per line as `application/x-ndjson`
+    """
+    return await run_in_threadpool(
+        bulk_services.bulk_upsert_subscriptions, session, rows
+    )
+
+
+@router.post("/subscriptions/bulk/delete", response_model=schemas.BulkResultSchema)
+async def bulk_delete_subscriptions(
+    rows: list = Depends(read_rows), session: Session = Depends(get_session)
+):
+    """
+    Delete many subscriptions. Send a JSON array of subscription uuids, or one uuid per line
+    as `application/x-ndjson`. Unknown uuids are reported in `errors`
+    """
+    return await run_in_threadpool(
+        bulk_services.bulk_delete_subscriptions, session, rows
+    )
+
+
 @router.get(
     "/subscription/{subscription_uuid}", response_model=schemas.SubscriptionOutSchema
 )
@@ -70,5 +213,7 @@ def delete_subscription(
     subscription_uuid: str, session: Session = Depends(get_session)
 ):
     """Delete an existing subscription"""
-
-    return services.delete_subscription_by_uuid(session, subscription_uuid)
+    try:
+        services.delete_subscription_by_uuid(session, subscription_uuid)
+    except EntityNotFoundException as e:
+        raise HTTPException(status_code=e.code, detail=str(e))
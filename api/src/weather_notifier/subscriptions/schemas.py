@@ -1,8 +1,12 @@
 import uuid
+from datetime import datetime
 from enum import Enum
+from typing import Any, Optional
 
 from pydantic import BaseModel, EmailStr, validator
 
+from weather_notifier.locations.schemas import LocationSchema
+
 
 class ConditionEnum(str, Enum):
     temp = "temp"
@@ -25,6 +29,10 @@ class ConditionSchema(BaseModel):
     op: OpEnum
     threshold: float
 
+    class Config:
+        orm_mode = True
+        use_enum_values = True
+
 
 class SubscriptionInSchema(BaseModel):
     email: EmailStr
@@ -49,3 +57,54 @@ class SubscriptionOutSchema(SubscriptionInSchema):
 
     class Config:
         orm_mode = True
+
+
+class LocationSubscriptionsSchema(BaseModel):
+    """A location and the subscriptions to it"""
+
+    location: LocationSchema
+    subscriptions: list[SubscriptionOutSchema]
+
+
+class SubscriptionPageSchema(BaseModel):
+    """A page of subscriptions and the cursor to pass to get the next page"""
+
+    subscriptions: list[SubscriptionOutSchema]
+    next_cursor: Optional[int]
+
+
+class SubscriptionChangesSchema(BaseModel):
+    """
+    The subscriptions created or updated and the uuids of the subscriptions deleted since a
+    token. Pass the returned `next_token` as `since` to get the following changes, and the
+    returned `next_cursor` as `cursor` to get the next page of a snapshot
+    """
+
+    updated: list[SubscriptionOutSchema]
+    deleted: list[str]
+    next_token: datetime
+    next_cursor: Optional[int] = None
+
+
+class BulkRowResultSchema(BaseModel):
+    """A row of a bulk request which was written"""
+
+    index: int
+    subscription_uuid: str
+
+
+class BulkRowErrorSchema(BaseModel):
+    """A row of a bulk request which was rejected, and why"""
+
+    index: int
+    detail: Any
+
+
+class BulkResultSchema(BaseModel):
+    """
+    The outcome of a bulk request. Rows are identified by their index in the request. A
+    rejected row doesn't stop the other rows from being written
+    """
+
+    succeeded: list[BulkRowResultSchema] = []
+    errors: list[BulkRowErrorSchema] = []
@@ -1,12 +1,29 @@
-from typing import Optional
+import itertools
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
 
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
 from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.locations.models import Location
 from weather_notifier.subscriptions import schemas
-from weather_notifier.subscriptions.models import Subscription
-from weather_notifier.subscriptions.schemas import SubscriptionInSchema
+from weather_notifier.subscriptions.models import (
+    Subscription,
+    SubscriptionCondition,
+    SubscriptionTombstone,
+    to_utc,
+    utcnow,
+)
+from weather_notifier.subscriptions.schemas import (
+    ConditionEnum,
+    OpEnum,
+    SubscriptionInSchema,
+)
+
+# Changes are returned again for this long after the token was issued, so changes committed by
+# transactions which were still running at the time aren't missed
+CHANGES_OVERLAP = timedelta(seconds=30)
 
 
 def get_all_subscriptions(session: Session) -> list[Subscription]:
@@ -28,6 +45,277 @@ def get_all_subscriptions(session: Session) -> list[Subscription]:
     return session.execute(sql).scalars().all()
 
 
+def get_subscriptions_page(
+    session: Session, cursor: Optional[int] = None, limit: int = 1000
+) -> tuple[list[Subscription], Optional[int]]:
+    """
+    Get a page of subscriptions ordered by id. Uses keyset pagination, so fetching a page
+    is equally fast no matter how far into the table it is
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    cursor
+        The cursor returned with the previous page. If None, returns the first page
+    limit
+        The maximum number of subscriptions in the page
+
+    Returns
+    -------
+    list of Subscriptions and the next cursor
+        The next cursor is None if this is the last page
+
+    """
+    sql = sa.select(Subscription).order_by(Subscription.id).limit(limit + 1)
+
+    if cursor is not None:
+        sql = sql.where(Subscription.id > cursor)
+
+    subscriptions = session.execute(sql).scalars().all()
+
+    if len(subscriptions) > limit:
+        subscriptions = subscriptions[:limit]
+        return subscriptions, subscriptions[-1].id
+    return subscriptions, None
+
+
+def subscriptions_by_location_sql() -> sa.sql.Select:
+    """The query selecting every subscription with its location, ordered by location"""
+    return (
+        sa.select(Location, Subscription)
+        .join(Subscription, Subscription.location_id == Location.id)
+        .order_by(Subscription.location_id, Subscription.id)
+    )
+
+
+def group_by_location(
+    rows: Iterable[tuple[Location, Subscription]]
+) -> list[tuple[Location, list[Subscription]]]:
+    """Group the rows returned by `subscriptions_by_location_sql` by location"""
+    return [
+        (location, [subscription for _, subscription in group])
+        for location, group in itertools.groupby(rows, key=lambda row: row[0])
+    ]
+
+
+def get_subscriptions_by_location(
+    session: Session,
+) -> list[tuple[Location, list[Subscription]]]:
+    """
+    Get all subscriptions grouped by location, in a single query using the index on the
+    location of subscriptions
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+
+    Returns
+    -------
+    list of Location and list of Subscriptions pairs
+    """
+    return group_by_location(session.execute(subscriptions_by_location_sql()).all())
+
+
+def stream_subscriptions(session: Session, batch_size: int = 1000) -> Iterator[dict]:
+    """
+    Stream all subscriptions from the database using a server-side cursor, fetching
+    `batch_size` rows at a time. Rows are returned as plain dictionaries rather than ORM
+    objects, so they aren't kept in the session and memory use stays constant
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    batch_size
+        The number of rows to fetch from the cursor at a time
+
+    Returns
+    -------
+    iterator of dicts
+        An iterator over every subscription as a dictionary
+
+    """
+    result = session.execute(
+        stream_subscriptions_sql(), execution_options={"stream_results": True}
+    )
+
+    for rows in result.yield_per(batch_size).mappings().partitions():
+        conditions_sql = conditions_by_subscription_sql(row["id"] for row in rows)
+        conditions = group_conditions(session.execute(conditions_sql))
+        yield from subscription_dicts(rows, conditions)
+
+
+def stream_subscriptions_sql() -> sa.sql.Select:
+    """The query selecting the columns of every subscription, ordered by id"""
+    return sa.select(
+        Subscription.id,
+        Subscription.subscription_uuid,
+        Subscription.email,
+        Subscription.city,
+        Subscription.country_code,
+    ).order_by(Subscription.id)
+
+
+def conditions_by_subscription_sql(subscription_ids: Iterable[int]) -> sa.sql.Select:
+    """The query selecting the conditions of the given subscriptions"""
+    return (
+        sa.select(
+            SubscriptionCondition.subscription_id,
+            SubscriptionCondition.condition,
+            SubscriptionCondition.op,
+            SubscriptionCondition.threshold,
+        )
+        .where(SubscriptionCondition.subscription_id.in_(list(subscription_ids)))
+        .order_by(SubscriptionCondition.id)
+    )
+
+
+def group_conditions(rows: Iterable[sa.engine.Row]) -> dict[int, list[dict]]:
+    """Group the rows returned by `conditions_by_subscription_sql` by subscription id"""
+    conditions: dict[int, list[dict]] = {}
+    for subscription_id, condition, op, threshold in rows:
+        conditions.setdefault(subscription_id, []).append(
+            {"condition": condition, "op": op, "threshold": threshold}
+        )
+    return conditions
+
+
+def subscription_dicts(
+    rows: Iterable[sa.engine.RowMapping], conditions: dict[int, list[dict]]
+) -> Iterator[dict]:
+    """Combine the rows of `stream_subscriptions_sql` with their conditions"""
+    for row in rows:
+        subscription = dict(row)
+        subscription["conditions"] = conditions.get(subscription.pop("id"), [])
+        yield subscription
+
+
+def triggered_by_sql(
+    condition: ConditionEnum, op: Optional[OpEnum] = None, value: Optional[float] = None
+) -> sa.sql.Select:
+    """
+    The query selecting the subscriptions with a condition on a weather condition. Filters on
+    the composite index of condition, op and threshold
+
+    Parameters
+    ----------
+    condition
+        The weather condition
+    op
+        Only select conditions using this comparison
+    value
+        Only select conditions triggered by this value of the weather condition
+    """
+    triggered = {
+        OpEnum.gt: lambda threshold: threshold < value,
+        OpEnum.gte: lambda threshold: threshold <= value,
+        OpEnum.lt: lambda threshold: threshold > value,
+        OpEnum.lte: lambda threshold: threshold >= value,
+        OpEnum.eq: lambda threshold: threshold == value,
+    }
+    ops = [OpEnum(op)] if op is not None else list(OpEnum)
+
+    clauses = []
+    for op_ in ops:
+        clause = sa.and_(
+            SubscriptionCondition.condition == ConditionEnum(condition).value,
+            SubscriptionCondition.op == op_.value,
+        )
+        if value is not None:
+            clause = sa.and_(clause, triggered[op_](SubscriptionCondition.threshold))
+        clauses.append(clause)
+
+    matching = sa.select(SubscriptionCondition.subscription_id).where(sa.or_(*clauses))
+    return (
+        sa.select(Subscription)
+        .where(Subscription.id.in_(matching))
+        .order_by(Subscription.id)
+    )
+
+
+def get_subscriptions_by_condition(
+    session: Session,
+    condition: ConditionEnum,
+    op: Optional[OpEnum] = None,
+    value: Optional[float] = None,
+) -> list[Subscription]:
+    """
+    Get the subscriptions with a condition on a weather condition, optionally only those
+    triggered by a value
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    condition
+        The weather condition
+    op
+        Only get subscriptions with a condition using this comparison
+    value
+        Only get subscriptions with a condition triggered by this value
+
+    Returns
+    -------
+    list of Subscriptions
+    """
+    return session.execute(triggered_by_sql(condition, op, value)).scalars().all()
+
+
+def get_subscription_changes(
+    session: Session,
+    since: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 1000,
+) -> tuple[list[Subscription], list[str], datetime, Optional[int]]:
+    """
+    Get the changes to subscriptions since a token. Without a token, a page of all
+    subscriptions is returned as updated, so the initial snapshot is fetched page by page
+    using the same keyset pagination as `get_subscriptions_page`. As changes within
+    `CHANGES_OVERLAP` of the token are returned again, the same change can be returned more
+    than once
+
+    Parameters
+    ----------
+    session
+        An open session to the database
+    since
+        The token returned with the previous changes
+    cursor
+        The cursor returned with the previous page of the snapshot. Only used without `since`
+    limit
+        The maximum number of subscriptions in a page of the snapshot
+
+    Returns
+    -------
+    list of updated Subscriptions, list of deleted subscription uuids, the next token and the
+    next cursor
+        The next cursor is None unless there are more pages of the snapshot. The token to
+        follow a snapshot with is the one returned with its first page
+    """
+    next_token = utcnow()
+    if since is None:
+        subscriptions, next_cursor = get_subscriptions_page(
+            session, cursor=cursor, limit=limit
+        )
+        return subscriptions, [], next_token, next_cursor
+
+    since = to_utc(since) - CHANGES_OVERLAP
+    updated_sql = (
+        sa.select(Subscription)
+        .where(Subscription.updated_at >= since)
+        .order_by(Subscription.id)
+    )
+    deleted_sql = sa.select(SubscriptionTombstone.subscription_uuid).where(
+        SubscriptionTombstone.deleted_at >= since
+    )
+
+    updated = session.execute(updated_sql).scalars().all()
+    deleted = session.execute(deleted_sql).scalars().all()
+    return updated, deleted, next_token, None
+
+
 def get_subscription_by_uuid(
     session: Session, subscription_uuid: str
 ) -> Optional[Subscription]:
@@ -75,8 +363,10 @@ def create_subscription(
 
 
 def delete_subscription_by_uuid(session: Session, subscription_uuid: str) -> None:
-    subscription = get_subscription_by_uuid(session, subscription_uuid)
+    if not (subscription := get_subscription_by_uuid(session, subscription_uuid)):
+        raise EntityNotFoundException(f"Subscription: {subscription_uuid}")
     session.delete(subscription)
+    session.merge(SubscriptionTombstone(subscription_uuid, deleted_at=utcnow()))
 
 
 def update_subscription_by_uuid(
@@ -13,7 +13,7 @@ def settings() -> DBAuth:
 
 @pytest.fixture(scope="session")
 def app(settings: DBAuth) -> FastAPI:
-    app = create_app()
+    app = create_app(settings)
     app.dependency_overrides[get_settings] = lambda: settings
     return app
 
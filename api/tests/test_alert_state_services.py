@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from weather_notifier.alert_states import services
+from weather_notifier.alert_states.models import AlertState
+from weather_notifier.alert_states.schemas import AlertStateKeySchema, AlertStateSchema
+from weather_notifier.db import mapper_registry
+
+
+@pytest.fixture()
+def engine(tmp_path: Path) -> Engine:
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'alerts.db'}", future=True)
+    mapper_registry.metadata.create_all(engine)
+    return engine
+
+
+def state(key: str, condition: str, active: bool, notified_at: float):
+    return AlertStateSchema(
+        subscription_key=key,
+        condition=condition,
+        active=active,
+        notified_at=notified_at,
+    )
+
+
+def test_update_replaces_and_deletes_alert_states(engine: Engine):
+    with Session(engine) as session, session.begin():
+        services.update_alert_states(
+            session,
+            [
+                state("sub-1", "temp gt 25.0", True, 10),
+                state("sub-2", "wind", True, 10),
+            ],
+            [],
+        )
+    with Session(engine) as session, session.begin():
+        services.update_alert_states(
+            session,
+            [state("sub-1", "temp gt 25.0", False, 20)],
+            [AlertStateKeySchema(subscription_key="sub-2", condition="wind")],
+        )
+
+    with Session(engine) as session:
+        states = services.get_alert_states(session, ["sub-1", "sub-2", "sub-3"])
+        assert [
+            (s.subscription_key, s.condition, s.active, s.notified_at) for s in states
+        ] == [("sub-1", "temp gt 25.0", False, 20)]
+
+
+def test_search_and_update_routes(client: TestClient, mocker):
+    get_alert_states = mocker.patch.object(
+        services,
+        "get_alert_states",
+        return_value=[AlertState("sub-1", "temp gt 25.0", True, 10.0)],
+    )
+    update_alert_states = mocker.patch.object(services, "update_alert_states")
+
+    found = client.post("/alert-states/search", json={"subscription_keys": ["sub-1"]})
+    updated = client.put(
+        "/alert-states",
+        json={"delete": [{"subscription_key": "sub-1", "condition": "temp gt 25.0"}]},
+    )
+
+    assert found.json() == {
+        "states": [
+            {
+                "subscription_key": "sub-1",
+                "condition": "temp gt 25.0",
+                "active": True,
+                "notified_at": 10.0,
+            }
+        ]
+    }
+    get_alert_states.assert_called_once_with(mocker.ANY, ["sub-1"])
+    assert updated.status_code == status.HTTP_204_NO_CONTENT
+    update_alert_states.assert_called_once_with(
+        mocker.ANY,
+        [],
+        [AlertStateKeySchema(subscription_key="sub-1", condition="temp gt 25.0")],
+    )
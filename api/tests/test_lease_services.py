@@ -0,0 +1,154 @@
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, TypeVar
+
+import pytest
+import sqlalchemy as sa
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from weather_notifier.db import mapper_registry
+from weather_notifier.leases import services
+from weather_notifier.leases.models import LocationLease, NotificationRun
+from weather_notifier.subscriptions.models import Subscription, utcnow
+
+T = TypeVar("T")
+
+
+@pytest.fixture()
+def engine(tmp_path: Path) -> Engine:
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'leases.db'}", future=True)
+    mapper_registry.metadata.create_all(engine)
+    with Session(engine) as session, session.begin():
+        session.add_all(
+            Subscription(
+                subscription_uuid=str(i),
+                email="test@test.com",
+                city=city,
+                country_code=country_code,
+                conditions=[],
+            )
+            for i, (city, country_code) in enumerate(
+                [
+                    ("Copenhagen", "DK"),
+                    ("copenhagen ", "dk"),
+                    ("London", "GB"),
+                    ("Paris", "FR"),
+                ]
+            )
+        )
+    return engine
+
+
+@pytest.fixture()
+def in_session(engine: Engine) -> Callable[[Callable[[Session], T]], T]:
+    def run(func: Callable[[Session], T]) -> T:
+        with Session(engine, expire_on_commit=False) as session, session.begin():
+            return func(session)
+
+    return run
+
+
+def claim(session: Session, worker_id: str, batch_size: int = 2, **kwargs):
+    return services.claim_leases(
+        session, "run-1", worker_id, batch_size=batch_size, **kwargs
+    )
+
+
+def test_claim_creates_one_lease_per_normalized_location(in_session):
+    leases = in_session(lambda session: claim(session, "worker-1", batch_size=10))
+
+    assert [(lease.city, lease.country_code) for lease in leases] == [
+        ("copenhagen", "DK"),
+        ("london", "GB"),
+        ("paris", "FR"),
+    ]
+    assert all(lease.leased_by == "worker-1" for lease in leases)
+
+
+def test_replicas_claim_disjoint_batches(in_session):
+    first = in_session(lambda session: claim(session, "worker-1"))
+    second = in_session(lambda session: claim(session, "worker-2"))
+    third = in_session(lambda session: claim(session, "worker-3"))
+
+    assert len(first) == 2
+    assert len(second) == 1
+    assert third == []
+    assert {lease.id for lease in first}.isdisjoint(lease.id for lease in second)
+
+
+def test_expired_leases_can_be_reclaimed_unless_completed(in_session):
+    expired = in_session(lambda session: claim(session, "worker-1", lease_seconds=1))
+    completed, reclaimable = expired
+
+    assert (
+        in_session(
+            lambda session: services.complete_leases(
+                session, "run-1", "worker-1", [completed.id]
+            )
+        )
+        == 1
+    )
+    in_session(
+        lambda session: session.execute(
+            sa.update(LocationLease).values(
+                lease_expires_at=utcnow() - timedelta(seconds=1)
+            )
+        )
+    )
+
+    reclaimed = in_session(lambda session: claim(session, "worker-2", batch_size=10))
+
+    assert [lease.id for lease in reclaimed] == [reclaimable.id, reclaimable.id + 1]
+    assert (
+        in_session(
+            lambda session: services.complete_leases(
+                session, "run-1", "worker-1", [reclaimable.id]
+            )
+        )
+        == 0
+    )
+
+
+def test_creating_a_run_deletes_expired_runs(in_session):
+    in_session(lambda session: claim(session, "worker-1"))
+    in_session(
+        lambda session: session.execute(
+            sa.update(NotificationRun).values(
+                created_at=utcnow() - services.RUN_RETENTION * 2
+            )
+        )
+    )
+
+    in_session(lambda session: services.create_run(session, "run-2"))
+
+    run_ids = in_session(
+        lambda session: session.execute(sa.select(LocationLease.run_id)).scalars().all()
+    )
+    assert set(run_ids) == {"run-2"}
+
+
+def test_claim_and_complete_routes(client: TestClient, mocker):
+    lease = LocationLease("run-1", "london", "GB")
+    lease.id = 7
+    claim_leases = mocker.patch.object(services, "claim_leases", return_value=[lease])
+    complete_leases = mocker.patch.object(services, "complete_leases", return_value=1)
+
+    claimed = client.post(
+        "/notification-runs/run-1/claim", json={"worker_id": "worker-1"}
+    )
+    completed = client.post(
+        "/notification-runs/run-1/complete",
+        json={"worker_id": "worker-1", "lease_ids": [7]},
+    )
+
+    assert claimed.json() == {
+        "leases": [{"lease_id": 7, "city": "london", "country_code": "GB"}]
+    }
+    claim_leases.assert_called_once_with(
+        mocker.ANY, "run-1", worker_id="worker-1", batch_size=100, lease_seconds=300
+    )
+    assert completed.status_code == status.HTTP_204_NO_CONTENT
+    complete_leases.assert_called_once_with(mocker.ANY, "run-1", "worker-1", [7])
@@ -0,0 +1,125 @@
+from pathlib import Path
+from typing import Generator
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from weather_notifier.db import mapper_registry
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.locations import services
+from weather_notifier.locations.models import Location
+from weather_notifier.locations.schemas import LocationUpdateSchema
+from weather_notifier.subscriptions import services as subscription_services
+from weather_notifier.subscriptions.models import Subscription
+
+
+@pytest.fixture()
+def engine(tmp_path: Path) -> Engine:
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'locations.db'}", future=True)
+    mapper_registry.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture()
+def session(engine: Engine) -> Generator[Session, None, None]:
+    with Session(engine) as session, session.begin():
+        yield session
+
+
+def new_subscription(city: str, country_code: str) -> Subscription:
+    return Subscription(
+        subscription_uuid=f"{city}/{country_code}",
+        email="test@test.com",
+        city=city,
+        country_code=country_code,
+        conditions=[],
+    )
+
+
+def test_ensure_locations_creates_each_canonical_location_once(session: Session):
+    first = services.ensure_locations(
+        session.connection(), [("Copenhagen", "DK"), (" copenhagen", "dk")]
+    )
+    second = services.ensure_locations(
+        session.connection(), [("COPENHAGEN", "DK"), ("London", "GB")]
+    )
+
+    assert list(first) == [("copenhagen", "DK")]
+    assert second[("copenhagen", "DK")] == first[("copenhagen", "DK")]
+    assert len(services.get_all_locations(session)) == 2
+
+
+def test_subscriptions_point_at_the_location_of_their_city(session: Session):
+    session.add_all(
+        [new_subscription("Copenhagen", "DK"), new_subscription("copenhagen ", "dk")]
+    )
+    session.flush()
+
+    first, second = session.execute(sa.select(Subscription)).scalars()
+    assert first.location_id == second.location_id
+
+    first.city = "London"
+    first.country_code = "GB"
+    session.flush()
+
+    assert session.get(Location, first.location_id).city == "london"
+
+
+def test_get_subscriptions_by_location_groups_subscriptions(session: Session):
+    session.add_all(
+        [
+            new_subscription("Copenhagen", "DK"),
+            new_subscription("London", "GB"),
+            new_subscription("copenhagen ", "dk"),
+        ]
+    )
+    session.flush()
+
+    grouped = subscription_services.get_subscriptions_by_location(session)
+
+    assert [
+        (location.city, [sub.subscription_uuid for sub in subscriptions])
+        for location, subscriptions in grouped
+    ] == [
+        ("copenhagen", ["Copenhagen/DK", "copenhagen /dk"]),
+        ("london", ["London/GB"]),
+    ]
+
+
+def test_update_location_sets_city_id_and_coordinates(session: Session):
+    location_id = services.ensure_locations(session.connection(), [("Paris", "FR")])[
+        ("paris", "FR")
+    ]
+
+    location = services.update_location(
+        session,
+        location_id,
+        LocationUpdateSchema(owm_city_id=2988507, lat=48.85, lon=2.35),
+    )
+
+    assert (location.owm_city_id, location.lat, location.lon) == (2988507, 48.85, 2.35)
+
+
+def test_differently_named_locations_can_share_a_city_id(session: Session):
+    ids = services.ensure_locations(
+        session.connection(), [("Kobenhavn", "DK"), ("Copenhagen", "DK")]
+    )
+
+    for location_id in ids.values():
+        services.update_location(
+            session, location_id, LocationUpdateSchema(owm_city_id=2618425)
+        )
+
+    assert [
+        location.owm_city_id for location in services.get_all_locations(session)
+    ] == [
+        2618425,
+        2618425,
+    ]
+
+
+def test_update_missing_location_raises(session: Session):
+    with pytest.raises(EntityNotFoundException):
+        services.update_location(session, 1, LocationUpdateSchema())
@@ -0,0 +1,156 @@
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
+
+import pytest
+import sqlalchemy as sa
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from weather_notifier.app import create_app
+from weather_notifier.db import create_async_db_engine, mapper_registry
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.settings import DBAuth, get_settings
+from weather_notifier.subscriptions import async_services, schemas
+
+T = TypeVar("T")
+
+
+@pytest.fixture()
+def async_settings(tmp_path: Path) -> DBAuth:
+    db_url = f"sqlite:///{tmp_path / 'subscriptions.db'}"
+    mapper_registry.metadata.create_all(sa.create_engine(db_url))
+    return DBAuth(db_url=db_url, db_async=True)
+
+
+@pytest.fixture()
+def run_in_session(
+    async_settings: DBAuth,
+) -> Callable[[Callable[[AsyncSession], Awaitable[T]]], T]:
+    def run(func: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        async def in_session() -> T:
+            engine = create_async_db_engine(async_settings)
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                async with session.begin():
+                    result = await func(session)
+            await engine.dispose()
+            return result
+
+        return asyncio.run(in_session())
+
+    return run
+
+
+@pytest.fixture()
+def subscription_in() -> schemas.SubscriptionInSchema:
+    return schemas.SubscriptionInSchema.parse_obj(
+        {
+            "email": "test@test.com",
+            "city": "Copenhagen",
+            "country_code": "DK",
+            "conditions": [{"condition": "temp", "op": "gt", "threshold": 0}],
+        }
+    )
+
+
+def test_create_and_get_subscription_by_uuid(run_in_session, subscription_in):
+    created = run_in_session(
+        lambda session: async_services.create_subscription(session, subscription_in)
+    )
+
+    result = run_in_session(
+        lambda session: async_services.get_subscription_by_uuid(
+            session, created.subscription_uuid
+        )
+    )
+
+    assert result.email == subscription_in.email
+
+
+def test_get_subscriptions_page_walks_all_pages(run_in_session, subscription_in):
+    async def create_and_page(session: AsyncSession):
+        for _ in range(3):
+            await async_services.create_subscription(session, subscription_in)
+        await session.flush()
+        first, cursor = await async_services.get_subscriptions_page(session, limit=2)
+        second, cursor = await async_services.get_subscriptions_page(
+            session, cursor=cursor, limit=2
+        )
+        return len(first), len(second), cursor
+
+    assert run_in_session(create_and_page) == (2, 1, None)
+
+
+def test_stream_subscriptions_yields_dicts(run_in_session, subscription_in):
+    async def create_and_stream(session: AsyncSession):
+        created = await async_services.create_subscription(session, subscription_in)
+        await session.flush()
+        streamed = [row async for row in async_services.stream_subscriptions(session)]
+        return created, streamed
+
+    created, streamed = run_in_session(create_and_stream)
+
+    assert [row["subscription_uuid"] for row in streamed] == [created.subscription_uuid]
+    assert streamed[0]["conditions"] == [
+        condition.dict() for condition in subscription_in.conditions
+    ]
+
+
+def test_get_subscription_changes_returns_deletions(run_in_session, subscription_in):
+    created = run_in_session(
+        lambda session: async_services.create_subscription(session, subscription_in)
+    )
+    _, _, token, _ = run_in_session(async_services.get_subscription_changes)
+
+    run_in_session(
+        lambda session: async_services.delete_subscription_by_uuid(
+            session, created.subscription_uuid
+        )
+    )
+    updated, deleted, _, _ = run_in_session(
+        lambda session: async_services.get_subscription_changes(session, since=token)
+    )
+
+    assert updated == []
+    assert deleted == [created.subscription_uuid]
+
+
+def test_update_subscription_with_incorrect_ids_raises(run_in_session, subscription_in):
+    with pytest.raises(EntityNotFoundException):
+        run_in_session(
+            lambda session: async_services.update_subscription_by_uuid(
+                session, "clearly-wrong-uuid", subscription_in
+            )
+        )
+
+
+def test_delete_subscription_with_incorrect_uuid_raises(run_in_session):
+    with pytest.raises(EntityNotFoundException):
+        run_in_session(
+            lambda session: async_services.delete_subscription_by_uuid(
+                session, "clearly-wrong-uuid"
+            )
+        )
+
+
+def test_async_app_creates_and_returns_subscription(
+    async_settings: DBAuth, subscription_in: schemas.SubscriptionInSchema
+):
+    app = create_app(async_settings)
+    app.dependency_overrides[get_settings] = lambda: async_settings
+
+    with TestClient(app) as client:
+        created = client.post("/subscriptions", json=subscription_in.dict())
+        response = client.get(f"/subscription/{created.json()['subscription_uuid']}")
+        deleted = client.delete(f"/subscription/{created.json()['subscription_uuid']}")
+        missing = client.get(f"/subscription/{created.json()['subscription_uuid']}")
+        deleted_again = client.delete(
+            f"/subscription/{created.json()['subscription_uuid']}"
+        )
+
+    assert created.status_code == status.HTTP_201_CREATED
+    assert response.json() == created.json()
+    assert deleted.status_code == status.HTTP_204_NO_CONTENT
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+    assert deleted_again.status_code == status.HTTP_404_NOT_FOUND
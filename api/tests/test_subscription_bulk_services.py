@@ -0,0 +1,162 @@
+from typing import Generator, Optional
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from weather_notifier.db import mapper_registry
+from weather_notifier.settings import DBAuth
+from weather_notifier.subscriptions import bulk_services
+from weather_notifier.subscriptions.models import (
+    Subscription,
+    SubscriptionTombstone,
+    utcnow,
+)
+
+
+@pytest.fixture(scope="module")
+def engine(settings: DBAuth) -> Generator[Engine, None, None]:
+    engine = sa.create_engine(settings.db_url.get_secret_value(), future=True)
+    mapper_registry.metadata.create_all(engine)
+    yield engine
+    mapper_registry.metadata.drop_all(engine)
+
+
+@pytest.fixture()
+def session(engine: Engine) -> Generator[Session, None, None]:
+    with Session(engine) as session:
+        with session.begin():
+            yield session
+            session.rollback()
+
+
+def get_subscription(
+    session: Session, subscription_uuid: str
+) -> Optional[Subscription]:
+    return session.execute(
+        sa.select(Subscription).where(
+            Subscription.subscription_uuid == subscription_uuid
+        )
+    ).scalar_one_or_none()
+
+
+def row(city: str = "Copenhagen", **kwargs) -> dict:
+    return {
+        "email": "test@test.com",
+        "city": city,
+        "country_code": "DK",
+        "conditions": [{"condition": "temp", "op": "lt", "threshold": 0}],
+        **kwargs,
+    }
+
+
+def test_parse_rows_reads_ndjson():
+    body = b'{"a": 1}\n\n{"a": 2}\n'
+    assert bulk_services.parse_rows(body, "application/x-ndjson") == [
+        {"a": 1},
+        {"a": 2},
+    ]
+
+
+def test_malformed_ndjson_line_is_reported_with_its_line_number(session: Session):
+    body = b'{"a": 1}\n\n{"a": \n"not-a-uuid"\n'
+    rows = bulk_services.parse_rows(body, "application/x-ndjson")
+
+    result = bulk_services.bulk_delete_subscriptions(session, rows)
+
+    assert rows[1] == bulk_services.MalformedRow(3)
+    assert [(error.index, error.detail) for error in result.errors] == [
+        (0, "Must be a subscription uuid"),
+        (1, "Line 3 is not valid JSON"),
+        (2, "Subscription: not-a-uuid not found"),
+    ]
+
+
+def test_parse_rows_rejects_non_array():
+    with pytest.raises(ValueError):
+        bulk_services.parse_rows(b'{"a": 1}', "application/json")
+
+
+def test_bulk_create_reports_invalid_rows_and_inserts_the_rest(session: Session):
+    rows = [row("Copenhagen"), {"email": "x"}, row("Aarhus")]
+
+    result = bulk_services.bulk_create_subscriptions(session, rows, chunk_size=2)
+
+    assert [r.index for r in result.succeeded] == [0, 2]
+    assert [e.index for e in result.errors] == [1]
+    cities = session.execute(sa.select(Subscription.city)).scalars().all()
+    assert sorted(cities) == ["Aarhus", "Copenhagen"]
+
+
+def test_bulk_upsert_inserts_and_updates(session: Session):
+    session.add(
+        Subscription(
+            subscription_uuid="4301583f-05a3-4b55-bf32-048975dfedff",
+            **row("Copenhagen")
+        )
+    )
+    session.add(
+        SubscriptionTombstone(
+            "dded2381-fb90-41dc-8f10-115cd1ee95dc", deleted_at=utcnow()
+        )
+    )
+    session.flush()
+
+    result = bulk_services.bulk_upsert_subscriptions(
+        session,
+        [
+            row("Aarhus", subscription_uuid="4301583f-05a3-4b55-bf32-048975dfedff"),
+            row("Odense", subscription_uuid="dded2381-fb90-41dc-8f10-115cd1ee95dc"),
+            row("Vejle", subscription_uuid="dded2381-fb90-41dc-8f10-115cd1ee95dc"),
+        ],
+    )
+
+    assert [r.subscription_uuid for r in result.succeeded] == [
+        "4301583f-05a3-4b55-bf32-048975dfedff",
+        "dded2381-fb90-41dc-8f10-115cd1ee95dc",
+    ]
+    assert [e.index for e in result.errors] == [2]
+    session.expire_all()
+    assert (
+        get_subscription(session, "4301583f-05a3-4b55-bf32-048975dfedff").city
+        == "Aarhus"
+    )
+    assert (
+        get_subscription(session, "dded2381-fb90-41dc-8f10-115cd1ee95dc").city
+        == "Odense"
+    )
+    assert (
+        session.get(SubscriptionTombstone, "dded2381-fb90-41dc-8f10-115cd1ee95dc")
+        is None
+    )
+
+
+def test_bulk_delete_tombstones_deleted_and_reports_missing(session: Session):
+    session.add(Subscription(subscription_uuid="a", **row()))
+    session.flush()
+
+    result = bulk_services.bulk_delete_subscriptions(session, ["a", "missing", 1])
+
+    assert [r.subscription_uuid for r in result.succeeded] == ["a"]
+    assert [e.index for e in result.errors] == [1, 2]
+    session.expire_all()
+    assert get_subscription(session, "a") is None
+    assert session.get(SubscriptionTombstone, "a") is not None
+
+
+def test_rows_rejected_by_the_database_do_not_fail_the_chunk(session: Session):
+    session.add(Subscription(subscription_uuid="a", **row()))
+    session.flush()
+
+    errors = bulk_services.write_chunk(
+        session,
+        [
+            (0, row("Aarhus", subscription_uuid="a")),
+            (1, row("Odense", subscription_uuid="c")),
+        ],
+        lambda values: bulk_services.insert_subscriptions(session, values),
+    )
+
+    assert [e.index for e in errors] == [0]
+    assert get_subscription(session, "c").city == "Odense"
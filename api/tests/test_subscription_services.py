@@ -1,4 +1,5 @@
 import decimal
+from datetime import timedelta
 from typing import Callable, Generator
 
 import pytest
@@ -90,14 +91,7 @@ def subscription_update_schema(
             "email": "my@new-email.com",
             "city": subscription_db.city,
             "country_code": subscription_db.country_code,
-            "conditions": [
-                {
-                    "condition": obj["condition"],
-                    "op": obj["op"],
-                    "threshold": obj["threshold"],
-                }
-                for obj in subscription_db.conditions
-            ],
+            "conditions": [obj.to_dict() for obj in subscription_db.conditions],
         }
     )
 
@@ -137,6 +131,11 @@ def test_delete_subscription_removes_correct_subscription(
     assert result is None
 
 
+def test_delete_subscription_with_incorrect_uuid_raises(session: Session):
+    with pytest.raises(EntityNotFoundException):
+        services.delete_subscription_by_uuid(session, "clearly-wrong-uuid")
+
+
 def test_update_subscription_updates_data_correctly(
     session: Session,
     subscription_db: models.Subscription,
@@ -189,3 +188,165 @@ def test_create_new_subscription_creates_new_subscription_correctly(
 
     assert result.email == new_sub.email
     assert result.subscription_uuid == new_sub.subscription_uuid
+
+
+def test_get_subscriptions_page_walks_all_pages(
+    session: Session, subscription_data_factory: Callable[[], dict]
+):
+    created = [
+        services.create_subscription(
+            session,
+            schemas.SubscriptionInSchema.parse_obj(subscription_data_factory()),
+        )
+        for _ in range(5)
+    ]
+    session.flush()
+
+    first_page, cursor = services.get_subscriptions_page(session, limit=2)
+    second_page, cursor = services.get_subscriptions_page(
+        session, cursor=cursor, limit=2
+    )
+    last_page, cursor = services.get_subscriptions_page(session, cursor=cursor, limit=2)
+
+    assert first_page + second_page + last_page == created
+    assert len(last_page) == 1
+    assert cursor is None
+
+
+def test_get_subscriptions_page_when_empty_returns_no_cursor(session: Session):
+    assert services.get_subscriptions_page(session) == ([], None)
+
+
+def test_stream_subscriptions_yields_all_subscriptions_as_dicts(
+    session: Session, subscription_db: models.Subscription
+):
+    result = list(services.stream_subscriptions(session, batch_size=1))
+
+    assert result == [
+        {
+            "subscription_uuid": subscription_db.subscription_uuid,
+            "email": subscription_db.email,
+            "city": subscription_db.city,
+            "country_code": subscription_db.country_code,
+            "conditions": [obj.to_dict() for obj in subscription_db.conditions],
+        }
+    ]
+
+
+def test_get_subscription_changes_without_token_returns_all_subscriptions(
+    session: Session, subscription_db: models.Subscription
+):
+    updated, deleted, next_token, next_cursor = services.get_subscription_changes(
+        session
+    )
+
+    assert updated == [subscription_db]
+    assert deleted == []
+    assert next_token is not None
+    assert next_cursor is None
+
+
+def test_get_subscription_changes_without_token_pages_snapshot(
+    session: Session, subscription_data_factory: Callable[[], dict]
+):
+    created = [
+        services.create_subscription(
+            session,
+            schemas.SubscriptionInSchema.parse_obj(subscription_data_factory()),
+        )
+        for _ in range(3)
+    ]
+    session.flush()
+
+    first, _, _, cursor = services.get_subscription_changes(session, limit=2)
+    second, _, _, last_cursor = services.get_subscription_changes(
+        session, cursor=cursor, limit=2
+    )
+
+    assert first + second == created
+    assert last_cursor is None
+
+
+def test_get_subscription_changes_returns_updates_and_deletions_since_token(
+    session: Session, subscription_data_factory: Callable[[], dict]
+):
+    unchanged, updated, deleted = [
+        services.create_subscription(
+            session,
+            schemas.SubscriptionInSchema.parse_obj(subscription_data_factory()),
+        )
+        for _ in range(3)
+    ]
+    session.flush()
+    an_hour_ago = models.utcnow() - timedelta(hours=1)
+    for sub in (unchanged, updated, deleted):
+        sub.updated_at = an_hour_ago
+    session.flush()
+
+    since = an_hour_ago + timedelta(minutes=10)
+    updated.email = "my@new-email.com"
+    services.delete_subscription_by_uuid(session, deleted.subscription_uuid)
+    session.flush()
+
+    changes, deletions, next_token, _ = services.get_subscription_changes(
+        session, since=since
+    )
+
+    assert changes == [updated]
+    assert deletions == [deleted.subscription_uuid]
+    assert next_token > since
+
+
+def test_updating_only_conditions_marks_subscription_changed(
+    session: Session, subscription_db: models.Subscription
+):
+    session.flush()
+    an_hour_ago = models.utcnow() - timedelta(hours=1)
+    subscription_db.updated_at = an_hour_ago
+    session.flush()
+
+    subscription_db.update_from_dict(
+        {"conditions": [{"condition": "humidity", "op": "gt", "threshold": 80}]}
+    )
+    session.flush()
+
+    assert subscription_db.updated_at > an_hour_ago
+    assert [c.to_dict() for c in subscription_db.conditions] == [
+        {"condition": "humidity", "op": "gt", "threshold": 80}
+    ]
+
+
+@pytest.mark.parametrize(
+    "op, value, expected",
+    [
+        (None, None, ["cold", "hot"]),
+        (schemas.OpEnum.gt, None, ["hot"]),
+        (None, 30.0, ["hot"]),
+        (None, -5.0, ["cold"]),
+        (None, 10.0, []),
+    ],
+)
+def test_get_subscriptions_by_condition(
+    session: Session,
+    subscription_data_factory: Callable[[], dict],
+    op: schemas.OpEnum,
+    value: float,
+    expected: list[str],
+):
+    for city, condition_op, threshold in [("cold", "lt", 0), ("hot", "gt", 25)]:
+        data = subscription_data_factory()
+        data["city"] = city
+        data["conditions"] = [
+            {"condition": "temp", "op": condition_op, "threshold": threshold},
+            {"condition": "humidity", "op": "gt", "threshold": 0},
+        ]
+        services.create_subscription(
+            session, schemas.SubscriptionInSchema.parse_obj(data)
+        )
+    session.flush()
+
+    result = services.get_subscriptions_by_condition(
+        session, schemas.ConditionEnum.temp, op=op, value=value
+    )
+
+    assert [sub.city for sub in result] == expected
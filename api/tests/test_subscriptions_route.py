@@ -1,3 +1,5 @@
+import json
+from datetime import datetime
 from unittest.mock import MagicMock, ANY
 
 import pytest
@@ -6,9 +8,12 @@ from fastapi.testclient import TestClient
 from pytest_mock import MockerFixture
 from requests import Response
 
+from weather_notifier.exceptions import EntityNotFoundException
+from weather_notifier.locations.models import Location
 from weather_notifier.subscriptions import models
 from weather_notifier.subscriptions import schemas
 from weather_notifier.subscriptions import services
+from weather_notifier.subscriptions import bulk_services
 
 
 @pytest.fixture(scope="session")
@@ -200,7 +205,9 @@ class TestDeleteMissingSubscription:
     @pytest.fixture(scope="class")
     def mock_service(self, class_mocker: MockerFixture) -> MagicMock:
         return class_mocker.patch.object(
-            services, "delete_subscription_by_uuid", return_value=None
+            services,
+            "delete_subscription_by_uuid",
+            side_effect=EntityNotFoundException("Subscription: missing-uuid"),
         )
 
     @pytest.fixture(scope="class")
@@ -212,11 +219,8 @@ class TestDeleteMissingSubscription:
     ) -> Response:
         return client.delete(f"/subscription/{subscription.subscription_uuid}")
 
-    def test_returns_204_no_content(self, response: Response):
-        assert response.status_code == status.HTTP_204_NO_CONTENT
-
-    def test_returns_no_body(self, response: Response):
-        assert response.text == ""
+    def test_returns_404_not_found(self, response: Response):
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
     def test_service_called_with_session_and_uuid(
         self,
@@ -275,3 +279,233 @@ class TestUpdateSubscription:
             updated_data["subscription_uuid"],
             schemas.SubscriptionInSchema.parse_obj(updated_data),
         )
+
+
+class TestGetSubscriptionsPage:
+    @pytest.fixture(scope="class")
+    def mock_service(
+        self, class_mocker: MockerFixture, subscription: models.Subscription
+    ) -> MagicMock:
+        return class_mocker.patch.object(
+            services, "get_subscriptions_page", return_value=([subscription], 42)
+        )
+
+    @pytest.fixture(scope="class")
+    def response(self, client: TestClient, mock_service: MagicMock) -> Response:
+        return client.get("/subscriptions/page", params={"cursor": 10, "limit": 1})
+
+    def test_has_correct_statuscode(self, response: Response):
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_returns_page_and_next_cursor(self, response: Response, out_data: dict):
+        assert response.json() == {"subscriptions": [out_data], "next_cursor": 42}
+
+    def test_calls_service_with_cursor_and_limit(
+        self, response: Response, mock_service: MagicMock
+    ):
+        mock_service.assert_called_once_with(ANY, cursor=10, limit=1)
+
+
+def test_get_subscriptions_page_rejects_invalid_limit(client: TestClient):
+    response = client.get("/subscriptions/page", params={"limit": 0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestStreamSubscriptions:
+    @pytest.fixture(scope="class")
+    def mock_service(self, class_mocker: MockerFixture, out_data: dict) -> MagicMock:
+        return class_mocker.patch.object(
+            services, "stream_subscriptions", return_value=iter([out_data, out_data])
+        )
+
+    @pytest.fixture(scope="class")
+    def response(self, client: TestClient, mock_service: MagicMock) -> Response:
+        return client.get("/subscriptions/stream")
+
+    def test_has_correct_statuscode(self, response: Response):
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_has_ndjson_content_type(self, response: Response):
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+    def test_returns_one_subscription_per_line(
+        self, response: Response, out_data: dict
+    ):
+        lines = response.text.splitlines()
+        assert [json.loads(line) for line in lines] == [out_data, out_data]
+
+
+class TestGetSubscriptionChanges:
+    @pytest.fixture(scope="class")
+    def mock_service(
+        self, class_mocker: MockerFixture, subscription: models.Subscription
+    ) -> MagicMock:
+        return class_mocker.patch.object(
+            services,
+            "get_subscription_changes",
+            return_value=(
+                [subscription],
+                ["4301583f-05a3-4b55-bf32-048975dfedff"],
+                datetime(2022, 5, 1, 12, 30),
+                None,
+            ),
+        )
+
+    @pytest.fixture(scope="class")
+    def response(self, client: TestClient, mock_service: MagicMock) -> Response:
+        return client.get(
+            "/subscriptions/changes", params={"since": "2022-05-01T12:00:00"}
+        )
+
+    def test_has_correct_statuscode(self, response: Response):
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_returns_changes_and_next_token(self, response: Response, out_data: dict):
+        assert response.json() == {
+            "updated": [out_data],
+            "deleted": ["4301583f-05a3-4b55-bf32-048975dfedff"],
+            "next_token": "2022-05-01T12:30:00",
+            "next_cursor": None,
+        }
+
+    def test_calls_service_with_since(
+        self, response: Response, mock_service: MagicMock
+    ):
+        mock_service.assert_called_once_with(
+            ANY, since=datetime(2022, 5, 1, 12), cursor=None, limit=1000
+        )
+
+
+def test_get_subscription_changes_passes_snapshot_cursor(
+    client: TestClient, mocker: MockerFixture
+):
+    mock_service = mocker.patch.object(
+        services,
+        "get_subscription_changes",
+        return_value=([], [], datetime(2022, 5, 1, 12, 30), 200),
+    )
+
+    response = client.get("/subscriptions/changes", params={"cursor": 100, "limit": 2})
+
+    assert response.json()["next_cursor"] == 200
+    mock_service.assert_called_once_with(ANY, since=None, cursor=100, limit=2)
+
+
+class TestBulkCreateSubscriptionsNdjson:
+    @pytest.fixture(scope="class")
+    def mock_service(self, class_mocker: MockerFixture, out_data: dict) -> MagicMock:
+        return class_mocker.patch.object(
+            bulk_services,
+            "bulk_create_subscriptions",
+            return_value=schemas.BulkResultSchema(
+                succeeded=[
+                    {"index": 0, "subscription_uuid": out_data["subscription_uuid"]}
+                ],
+                errors=[{"index": 1, "detail": "Invalid"}],
+            ),
+        )
+
+    @pytest.fixture(scope="class")
+    def response(
+        self, client: TestClient, mock_service: MagicMock, data: dict
+    ) -> Response:
+        body = json.dumps(data) + "\n" + json.dumps({"email": "x"}) + "\n"
+        return client.post(
+            "/subscriptions/bulk",
+            data=body,
+            headers={"content-type": "application/x-ndjson"},
+        )
+
+    def test_has_correct_statuscode(self, response: Response):
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_returns_result(self, response: Response, out_data: dict):
+        assert response.json() == {
+            "succeeded": [
+                {"index": 0, "subscription_uuid": out_data["subscription_uuid"]}
+            ],
+            "errors": [{"index": 1, "detail": "Invalid"}],
+        }
+
+    def test_calls_service_with_one_row_per_line(
+        self, response: Response, mock_service: MagicMock, data: dict
+    ):
+        mock_service.assert_called_once_with(ANY, [data, {"email": "x"}])
+
+
+class TestBulkDeleteSubscriptionsMalformed:
+    @pytest.fixture(scope="class")
+    def response(self, client: TestClient) -> Response:
+        return client.post("/subscriptions/bulk/delete", json={"uuid": "x"})
+
+    def test_returns_422(self, response: Response):
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestGetSubscriptionsByCondition:
+    @pytest.fixture(scope="class")
+    def mock_service(
+        self, class_mocker: MockerFixture, subscription: models.Subscription
+    ) -> MagicMock:
+        return class_mocker.patch.object(
+            services, "get_subscriptions_by_condition", return_value=[subscription]
+        )
+
+    @pytest.fixture(scope="class")
+    def response(self, client: TestClient, mock_service: MagicMock) -> Response:
+        return client.get(
+            "/subscriptions/by-condition",
+            params={"condition": "temp", "op": "gt", "value": 25},
+        )
+
+    def test_returns_subscriptions(self, response: Response, out_data: dict):
+        assert response.json() == [out_data]
+
+    def test_calls_service_with_query(
+        self, response: Response, mock_service: MagicMock
+    ):
+        mock_service.assert_called_once_with(
+            ANY, schemas.ConditionEnum.temp, op=schemas.OpEnum.gt, value=25.0
+        )
+
+
+class TestGetSubscriptionsByLocation:
+    @pytest.fixture(scope="class")
+    def location(self) -> Location:
+        location = Location("copenhagen", "DK", owm_city_id=2618425)
+        location.id = 1
+        return location
+
+    @pytest.fixture(scope="class")
+    def mock_service(
+        self,
+        class_mocker: MockerFixture,
+        location: Location,
+        subscription: models.Subscription,
+    ) -> MagicMock:
+        return class_mocker.patch.object(
+            services,
+            "get_subscriptions_by_location",
+            return_value=[(location, [subscription])],
+        )
+
+    @pytest.fixture(scope="class")
+    def response(self, client: TestClient, mock_service: MagicMock) -> Response:
+        return client.get("/subscriptions/by-location")
+
+    def test_returns_subscriptions_grouped_by_location(
+        self, response: Response, out_data: dict
+    ):
+        assert response.json() == [
+            {
+                "location": {
+                    "id": 1,
+                    "city": "copenhagen",
+                    "country_code": "DK",
+                    "owm_city_id": 2618425,
+                    "lat": None,
+                    "lon": None,
+                },
+                "subscriptions": [out_data],
+            }
+        ]
@@ -0,0 +1,78 @@
+"""
+Benchmark alert evaluation, comparing `generate_alerts` called per subscription with the
+vectorized AlertEvaluator
+
+Run with `python benchmarks/bench_alert_evaluation.py`
+"""
+import argparse
+import random
+import time
+
+from notifier.evaluation import CONDITIONS, AlertEvaluator
+from notifier.schemas import Subscription, WeatherConditions
+from notifier.services import generate_alerts, group_subscriptions_by_location
+
+
+def make_subscriptions(n: int, n_locations: int) -> list[Subscription]:
+    rng = random.Random(0)
+    return [
+        Subscription(
+            email=f"user{i}@test.com",
+            city=f"City {rng.randrange(n_locations)}",
+            country_code="GB",
+            conditions=[
+                {
+                    "condition": rng.choice(CONDITIONS),
+                    "op": rng.choice(["gt", "ge", "lt", "le", "eq"]),
+                    "threshold": rng.uniform(-20, 1100),
+                }
+                for _ in range(3)
+            ],
+        )
+        for i in range(n)
+    ]
+
+
+def run(n: int, n_locations: int) -> None:
+    subscriptions_by_location = group_subscriptions_by_location(
+        make_subscriptions(n, n_locations)
+    )
+    rng = random.Random(1)
+    weather = {
+        location: WeatherConditions(
+            temp=rng.uniform(-20, 40),
+            pressure=rng.uniform(950, 1050),
+            humidity=rng.uniform(0, 100),
+        )
+        for location in subscriptions_by_location
+    }
+
+    start = time.perf_counter()
+    for location, subscriptions in subscriptions_by_location.items():
+        for sub in subscriptions:
+            generate_alerts(sub.conditions, weather[location])
+    per_subscription = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluator = AlertEvaluator.compile(subscriptions_by_location)
+    compiled = time.perf_counter() - start
+    evaluator.evaluate(weather)
+    vectorized = time.perf_counter() - start
+
+    n_conditions = len(evaluator.threshold)
+    print(f"{n} subscriptions, {n_conditions} conditions, {n_locations} locations")
+    print(f"{'generate_alerts':<25} {per_subscription * 1000:10.1f} ms")
+    print(
+        f"{'AlertEvaluator':<25} {vectorized * 1000:10.1f} ms "
+        f"(of which compiling {compiled * 1000:.1f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="Number of subscriptions")
+    parser.add_argument(
+        "--locations", type=int, default=1000, help="Number of locations"
+    )
+    args = parser.parse_args()
+    run(args.n, args.locations)
@@ -0,0 +1,69 @@
+"""
+Benchmark requests/sec of the ApiClient against a local stub server, comparing a new
+connection per request with the pooled, keep-alive client
+
+Run with `python benchmarks/bench_api_client.py`
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from notifier.api_client import ApiClient
+
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    body = json.dumps(
+        {"main": {"temp": 10.0, "pressure": 1000, "humidity": 50}}
+    ).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def new_client_per_request(base_url: str, n: int) -> None:
+    for _ in range(n):
+        with httpx.Client(base_url=base_url) as c:
+            c.get("/weather").raise_for_status()
+
+
+def pooled_client(base_url: str, n: int) -> None:
+    with ApiClient(base_url) as client:
+        for _ in range(n):
+            client.get("/weather")
+
+
+def run(n: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        for name, func in [
+            ("new client per request", new_client_per_request),
+            ("pooled client", pooled_client),
+        ]:
+            start = time.perf_counter()
+            func(base_url, n)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<25} {n / elapsed:>10.0f} requests/sec")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2000, help="Number of requests")
+    run(parser.parse_args().n)
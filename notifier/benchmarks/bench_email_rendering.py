@@ -0,0 +1,130 @@
+"""
+Benchmark rendering notification emails, comparing the original f-string and dedent
+formatting with the precompiled, memoized templates
+
+Run with `python benchmarks/bench_email_rendering.py`
+"""
+import argparse
+import random
+import textwrap
+import time
+from typing import Optional
+
+from notifier.evaluation import CONDITIONS
+from notifier.services import AlertDict, DigestSectionDict
+from notifier.templates import render_alert, render_html_body, render_text_body
+
+
+def legacy_format_alert_message(
+    alert: AlertDict, city: str, country_code: Optional[str] = None
+) -> str:
+    op_mappings = {
+        "gt": "greater than",
+        "ge": "greater than or equal to",
+        "lt": "less than",
+        "le": "less than or equal to",
+        "eq": "equal to",
+    }
+
+    location = city if country_code is None else f"{city}, {country_code}"
+    str_op = op_mappings[alert["op"]]
+
+    return textwrap.dedent(
+        f"""
+            The {alert['condition']} in {location} is now {alert['actual']}.
+            This is {str_op} your threshold of {alert['threshold']}
+         """
+    )
+
+
+def legacy_format_email_body(
+    alerts: list[AlertDict], city: str, country_code: Optional[str] = None
+) -> str:
+    notifications = "\n".join(
+        legacy_format_alert_message(alert, city=city, country_code=country_code)
+        for alert in alerts
+    )
+
+    return textwrap.dedent(
+        f"""
+Hello,
+
+You've received the following weather notifications:
+
+{notifications}
+"""
+    )
+
+
+def make_emails(n: int, n_locations: int) -> list[DigestSectionDict]:
+    rng = random.Random(0)
+    actual = {
+        (i, condition): round(rng.uniform(-20, 1050), 2)
+        for i in range(n_locations)
+        for condition in CONDITIONS
+    }
+    emails = []
+    for _ in range(n):
+        i_location = rng.randrange(n_locations)
+        alerts: list[AlertDict] = []
+        for _ in range(rng.randint(1, 3)):
+            condition = rng.choice(CONDITIONS)
+            alerts.append(
+                {
+                    "condition": condition,
+                    "op": rng.choice(["gt", "ge", "lt", "le"]),
+                    "threshold": rng.choice([0, 10, 20, 30, 50, 1000]),
+                    "actual": actual[i_location, condition],
+                }
+            )
+        emails.append(
+            {
+                "city": f"City {i_location}",
+                "country_code": "GB",
+                "alerts": alerts,
+                "cleared": [],
+            }
+        )
+    return emails
+
+
+def run(n: int, n_locations: int) -> None:
+    emails = make_emails(n, n_locations)
+
+    start = time.perf_counter()
+    legacy = [
+        legacy_format_email_body(email["alerts"], email["city"], email["country_code"])
+        for email in emails
+    ]
+    legacy_time = time.perf_counter() - start
+
+    render_alert.cache_clear()
+    start = time.perf_counter()
+    text = [render_text_body([email]) for email in emails]
+    text_time = time.perf_counter() - start
+    cache_info = render_alert.cache_info()
+
+    start = time.perf_counter()
+    for email in emails:
+        render_html_body([email])
+    html_time = time.perf_counter() - start
+
+    assert text == legacy, "The templates render different emails"
+    hit_rate = cache_info.hits / (cache_info.hits + cache_info.misses)
+    print(f"{n} emails, {n_locations} locations")
+    print(f"{'f-string + dedent':<25} {legacy_time * 1000:10.1f} ms")
+    print(
+        f"{'templates, text':<25} {text_time * 1000:10.1f} ms "
+        f"({hit_rate:.0%} of alert lines memoized)"
+    )
+    print(f"{'templates, html':<25} {html_time * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="Number of emails")
+    parser.add_argument(
+        "--locations", type=int, default=1000, help="Number of locations"
+    )
+    args = parser.parse_args()
+    run(args.n, args.locations)
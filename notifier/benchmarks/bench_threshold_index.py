@@ -0,0 +1,85 @@
+"""
+Benchmark finding the subscriptions triggered by a weather reading, comparing
+`generate_alerts` called per subscription with a lookup in the ThresholdIndex. Also compares
+finding the triggered conditions of a whole cycle, the weather of every location, with the
+vectorized pass of the AlertEvaluator over every condition
+
+Run with `python benchmarks/bench_threshold_index.py`
+"""
+import argparse
+import random
+import time
+
+from bench_alert_evaluation import make_subscriptions
+
+from notifier.evaluation import AlertEvaluator
+from notifier.schemas import WeatherConditions
+from notifier.services import generate_alerts, group_subscriptions_by_location
+from notifier.threshold_index import ThresholdIndex
+
+
+def run(n: int, n_locations: int, n_queries: int) -> None:
+    subscriptions = make_subscriptions(n, n_locations)
+    subscriptions_by_location = group_subscriptions_by_location(subscriptions)
+
+    start = time.perf_counter()
+    index = ThresholdIndex.build(enumerate(subscriptions))
+    built = time.perf_counter() - start
+    evaluator = AlertEvaluator.compile(subscriptions_by_location)
+
+    rng = random.Random(1)
+    queries = [
+        (
+            rng.choice(list(subscriptions_by_location)),
+            WeatherConditions(
+                temp=rng.uniform(-20, 40),
+                pressure=rng.uniform(950, 1050),
+                humidity=rng.uniform(0, 100),
+            ),
+        )
+        for _ in range(n_queries)
+    ]
+
+    start = time.perf_counter()
+    for location, weather in queries:
+        for sub in subscriptions_by_location[location]:
+            generate_alerts(sub.conditions, weather)
+    per_subscription = (time.perf_counter() - start) / n_queries
+
+    start = time.perf_counter()
+    for location, weather in queries:
+        index.triggered(location, weather)
+    indexed = (time.perf_counter() - start) / n_queries
+
+    # A cycle evaluates the weather of every location
+    cycles = [dict.fromkeys(evaluator.locations, weather) for _, weather in queries]
+
+    start = time.perf_counter()
+    for cycle in cycles:
+        evaluator.hits(evaluator.weather_matrix(cycle))
+    vectorized_cycle = (time.perf_counter() - start) / n_queries
+
+    start = time.perf_counter()
+    for cycle in cycles:
+        for location, weather in cycle.items():
+            for _ in index.triggered_conditions(location, weather):
+                pass
+    indexed_cycle = (time.perf_counter() - start) / n_queries
+
+    print(
+        f"{n} subscriptions, {index.n_conditions} conditions, {n_locations} locations"
+    )
+    print(f"Built the index in {built * 1000:.1f} ms")
+    print(f"{'generate_alerts':<25} {per_subscription * 1000:10.2f} ms per query")
+    print(f"{'ThresholdIndex':<25} {indexed * 1000:10.2f} ms per query")
+    print(f"{'AlertEvaluator.hits':<25} {vectorized_cycle * 1000:10.2f} ms per cycle")
+    print(f"{'ThresholdIndex':<25} {indexed_cycle * 1000:10.2f} ms per cycle")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=333_334, help="Number of subscriptions")
+    parser.add_argument("--locations", type=int, default=10, help="Number of locations")
+    parser.add_argument("--queries", type=int, default=20, help="Number of queries")
+    args = parser.parse_args()
+    run(args.n, args.locations, args.queries)
@@ -0,0 +1,479 @@
+"""
+The alert state of each subscription condition, as last notified to the subscriber. Only
+conditions which trigger or clear since the subscriber was last notified produce emails, and a
+condition is notified at most once per cooldown window, so flapping weather doesn't flood the
+subscriber.
+
+Each store only reads the states of the subscriptions evaluated in a call, so a shard or a
+batch of leased locations doesn't walk the states of every other subscription. With
+`work_leasing`, locations move between replicas from one cycle to the next, so the states
+are stored in the Subscription API, shared by every replica
+"""
+import math
+import sqlite3
+import time
+from typing import Callable, Collection, Iterable, Mapping, Protocol
+
+import attr
+
+from notifier.api_client import ApiClient, WritableApiClientInterface
+from notifier.schemas import Subscription
+from notifier.services import AlertDict
+from notifier.settings import Settings
+
+# Identifies a condition of a subscription by the subscription uuid and the condition itself
+AlertKey = tuple[str, str]
+
+# The number of subscriptions to look up the states of per query
+KEYS_PER_QUERY = 500
+
+
+def subscription_key(sub: Subscription) -> str:
+    """
+    Returns the uuid of a subscription, or its email and location for subscriptions which
+    don't come from the Subscription API
+    """
+    if sub.subscription_uuid is not None:
+        return sub.subscription_uuid
+    return f"{sub.email} {sub.city} {sub.country_code}"
+
+
+def alert_key(sub: Subscription, condition: str, op: str, threshold: float) -> AlertKey:
+    """Returns the key of a condition of a subscription"""
+    return subscription_key(sub), f"{condition} {op} {threshold!r}"
+
+
+@attr.define()
+class AlertChanges:
+    """
+    The alerts of a subscription which triggered or cleared since the subscriber was last
+    notified
+
+    Parameters
+    ----------
+    triggered
+        The alerts which are now triggered
+    cleared
+        The alerts which are no longer triggered
+    transitions
+        The new state of each changed condition, to record once the subscriber is notified
+    """
+
+    triggered: list[AlertDict] = attr.field(factory=list)
+    cleared: list[AlertDict] = attr.field(factory=list)
+    transitions: dict[AlertKey, bool] = attr.field(factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.transitions)
+
+    @classmethod
+    def merge(cls, changes: Iterable["AlertChanges"]) -> "AlertChanges":
+        """Combine the changes of several subscriptions"""
+        merged = cls()
+        for subscription_changes in changes:
+            merged.triggered.extend(subscription_changes.triggered)
+            merged.cleared.extend(subscription_changes.cleared)
+            merged.transitions.update(subscription_changes.transitions)
+        return merged
+
+
+class AlertStateInterface(Protocol):
+    """
+    Represents the interface a store of alert states should satisfy
+    """
+
+    def transitions(
+        self,
+        active: Collection[AlertKey],
+        evaluated: Collection[AlertKey],
+        subscription_uuids: Collection[str],
+    ) -> dict[AlertKey, bool]:
+        """Should return the conditions whose state should be notified, with their new state"""
+        ...
+
+    def record(self, transitions: Mapping[AlertKey, bool]) -> None:
+        """Should record that the subscribers were notified of the transitions"""
+        ...
+
+
+@attr.define()
+class AlertStateChanges:
+    """
+    The result of comparing the evaluated alerts with the stored alert states
+
+    Parameters
+    ----------
+    transitions
+        The conditions whose state should be notified, with their new state
+    expired
+        The stored conditions which no longer need a state, either because the condition was
+        removed from its subscription or because it's inactive and its cooldown has passed
+    """
+
+    transitions: dict[AlertKey, bool] = attr.field(factory=dict)
+    expired: list[AlertKey] = attr.field(factory=list)
+
+    @classmethod
+    def compare(
+        cls,
+        states: Mapping[AlertKey, tuple[bool, float]],
+        active: Collection[AlertKey],
+        evaluated: Collection[AlertKey],
+        subscription_uuids: Collection[str],
+        now: float,
+        cooldown: float,
+    ) -> "AlertStateChanges":
+        """
+        Compare the evaluated alerts with the stored alert states. A condition without a state
+        is inactive and has never been notified
+
+        Parameters
+        ----------
+        states
+            Whether each stored condition of the evaluated subscriptions was last notified as
+            active, and when
+        active
+            The conditions which are triggered
+        evaluated
+            Every condition which was evaluated
+        subscription_uuids
+            The uuids of the subscriptions which were evaluated
+        now
+            The current time in seconds
+        cooldown
+            The minimum number of seconds between two notifications of a condition
+
+        Returns
+        -------
+        AlertStateChanges
+        """
+        changes = cls()
+        for key in set(active).union(states):
+            notified_active, notified_at = states.get(key, (False, -math.inf))
+            if key not in evaluated:
+                if key[0] in subscription_uuids:
+                    changes.expired.append(key)
+                continue
+
+            is_active = key in active
+            cooled_down = now - notified_at >= cooldown
+            if is_active != notified_active and cooled_down:
+                changes.transitions[key] = is_active
+            elif not is_active and not notified_active and cooled_down:
+                changes.expired.append(key)
+        return changes
+
+
+@attr.define()
+class InMemoryAlertState:
+    """
+    An in-process store of alert states. States are lost on restart, so subscribers with
+    triggered alerts are notified again after a restart
+
+    Parameters
+    ----------
+    cooldown
+        The minimum number of seconds between two notifications of a condition
+    clock
+        A function returning the current time in seconds
+    """
+
+    cooldown: float = 3600
+    clock: Callable[[], float] = time.monotonic
+    _states: dict[str, dict[str, tuple[bool, float]]] = attr.field(
+        factory=dict, init=False
+    )
+
+    def __len__(self) -> int:
+        return sum(map(len, self._states.values()))
+
+    def transitions(
+        self,
+        active: Collection[AlertKey],
+        evaluated: Collection[AlertKey],
+        subscription_uuids: Collection[str],
+    ) -> dict[AlertKey, bool]:
+        """
+        Find the conditions which triggered or cleared since they were last notified, and
+        whose cooldown has passed
+
+        Parameters
+        ----------
+        active
+            The conditions which are triggered
+        evaluated
+            Every condition which was evaluated
+        subscription_uuids
+            The uuids of the subscriptions which were evaluated
+
+        Returns
+        -------
+        dict of AlertKey to bool
+            The new state of each condition to notify
+        """
+        states = {
+            (subscription_uuid, condition): state
+            for subscription_uuid in subscription_uuids
+            for condition, state in self._states.get(subscription_uuid, {}).items()
+        }
+        changes = AlertStateChanges.compare(
+            states,
+            active,
+            evaluated,
+            subscription_uuids,
+            self.clock(),
+            self.cooldown,
+        )
+        for subscription_uuid, condition in changes.expired:
+            conditions = self._states[subscription_uuid]
+            del conditions[condition]
+            if not conditions:
+                del self._states[subscription_uuid]
+        return changes.transitions
+
+    def record(self, transitions: Mapping[AlertKey, bool]) -> None:
+        """Record that the subscribers were notified of the transitions"""
+        now = self.clock()
+        for (subscription_uuid, condition), is_active in transitions.items():
+            self._states.setdefault(subscription_uuid, {})[condition] = (is_active, now)
+
+
+@attr.define()
+class SqliteAlertState:
+    """
+    An on-disk store of alert states backed by SQLite. As the states survive restarts, a
+    restarted notifier doesn't notify subscribers of alerts they were already notified of
+
+    Parameters
+    ----------
+    path
+        The path to the SQLite database file
+    cooldown
+        The minimum number of seconds between two notifications of a condition
+    clock
+        A function returning the current unix time in seconds
+    """
+
+    path: str
+    cooldown: float = 3600
+    clock: Callable[[], float] = time.time
+    _conn: sqlite3.Connection = attr.field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS alert_state (
+                    subscription_uuid TEXT NOT NULL,
+                    condition TEXT NOT NULL,
+                    active INTEGER NOT NULL,
+                    notified_at REAL NOT NULL,
+                    PRIMARY KEY (subscription_uuid, condition)
+                )
+                """
+            )
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM alert_state").fetchone()[0]
+
+    def transitions(
+        self,
+        active: Collection[AlertKey],
+        evaluated: Collection[AlertKey],
+        subscription_uuids: Collection[str],
+    ) -> dict[AlertKey, bool]:
+        """
+        Find the conditions which triggered or cleared since they were last notified, and
+        whose cooldown has passed
+
+        Parameters
+        ----------
+        active
+            The conditions which are triggered
+        evaluated
+            Every condition which was evaluated
+        subscription_uuids
+            The uuids of the subscriptions which were evaluated
+
+        Returns
+        -------
+        dict of AlertKey to bool
+            The new state of each condition to notify
+        """
+        uuids = sorted(subscription_uuids)
+        states = {}
+        for start in range(0, len(uuids), KEYS_PER_QUERY):
+            end = start + KEYS_PER_QUERY
+            batch = uuids[start:end]
+            rows = self._conn.execute(
+                f"""
+                SELECT subscription_uuid, condition, active, notified_at FROM alert_state
+                WHERE subscription_uuid IN ({", ".join("?" * len(batch))})
+                """,
+                batch,
+            )
+            states.update(
+                ((subscription_uuid, condition), (bool(is_active), notified_at))
+                for subscription_uuid, condition, is_active, notified_at in rows
+            )
+        changes = AlertStateChanges.compare(
+            states,
+            active,
+            evaluated,
+            subscription_uuids,
+            self.clock(),
+            self.cooldown,
+        )
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM alert_state WHERE subscription_uuid = ? AND condition = ?",
+                changes.expired,
+            )
+        return changes.transitions
+
+    def record(self, transitions: Mapping[AlertKey, bool]) -> None:
+        """Record that the subscribers were notified of the transitions"""
+        now = self.clock()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO alert_state VALUES (?, ?, ?, ?)",
+                (
+                    (subscription_uuid, condition, int(is_active), now)
+                    for (subscription_uuid, condition), is_active in transitions.items()
+                ),
+            )
+
+    def close(self) -> None:
+        """Close the connection to the alert state database"""
+        self._conn.close()
+
+
+@attr.define()
+class ApiAlertState:
+    """
+    A store of alert states kept in the Subscription API, shared by every notifier replica.
+    The notification times are the unix times of the replicas' clocks
+
+    Parameters
+    ----------
+    client
+        An API client for the Subscription API
+    cooldown
+        The minimum number of seconds between two notifications of a condition
+    clock
+        A function returning the current unix time in seconds
+    """
+
+    client: WritableApiClientInterface
+    cooldown: float = 3600
+    clock: Callable[[], float] = time.time
+
+    def transitions(
+        self,
+        active: Collection[AlertKey],
+        evaluated: Collection[AlertKey],
+        subscription_uuids: Collection[str],
+    ) -> dict[AlertKey, bool]:
+        """
+        Find the conditions which triggered or cleared since they were last notified by any
+        replica, and whose cooldown has passed
+
+        Parameters
+        ----------
+        active
+            The conditions which are triggered
+        evaluated
+            Every condition which was evaluated
+        subscription_uuids
+            The uuids of the subscriptions which were evaluated
+
+        Returns
+        -------
+        dict of AlertKey to bool
+            The new state of each condition to notify
+        """
+        found = self.client.post(
+            "/alert-states/search",
+            json={"subscription_keys": sorted(subscription_uuids)},
+        )
+        states = {
+            (state["subscription_key"], state["condition"]): (
+                state["active"],
+                state["notified_at"],
+            )
+            for state in found["states"]
+        }
+        changes = AlertStateChanges.compare(
+            states,
+            active,
+            evaluated,
+            subscription_uuids,
+            self.clock(),
+            self.cooldown,
+        )
+        if changes.expired:
+            self.client.put(
+                "/alert-states",
+                json={
+                    "delete": [
+                        {"subscription_key": subscription_uuid, "condition": condition}
+                        for subscription_uuid, condition in changes.expired
+                    ]
+                },
+            )
+        return changes.transitions
+
+    def record(self, transitions: Mapping[AlertKey, bool]) -> None:
+        """Record that the subscribers were notified of the transitions"""
+        if not transitions:
+            return
+        now = self.clock()
+        self.client.put(
+            "/alert-states",
+            json={
+                "record": [
+                    {
+                        "subscription_key": subscription_uuid,
+                        "condition": condition,
+                        "active": is_active,
+                        "notified_at": now,
+                    }
+                    for (subscription_uuid, condition), is_active in transitions.items()
+                ]
+            },
+        )
+
+
+def record_notified(
+    alert_state: AlertStateInterface, changes: Iterable[AlertChanges]
+) -> None:
+    """Record the transitions of all alert changes the subscribers were notified of"""
+    alert_state.record(AlertChanges.merge(changes).transitions)
+
+
+def create_alert_state(settings: Settings) -> AlertStateInterface:
+    """
+    Create the alert state store defined by the settings. With `work_leasing`, the states are
+    stored in the Subscription API, as a location can be notified by a different replica every
+    cycle. Otherwise uses an on-disk store if `alert_state_path` is set, or an in-memory store
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+
+    Returns
+    -------
+    AlertStateInterface
+    """
+    if settings.work_leasing:
+        return ApiAlertState(
+            ApiClient(settings.subscription_api_url),
+            cooldown=settings.alert_cooldown_seconds,
+        )
+    if settings.alert_state_path is not None:
+        return SqliteAlertState(
+            settings.alert_state_path, cooldown=settings.alert_cooldown_seconds
+        )
+    return InMemoryAlertState(cooldown=settings.alert_cooldown_seconds)
@@ -1,9 +1,18 @@
-from typing import Optional, Any
+import asyncio
+import json
+import time
+from typing import Iterator, Optional, Any
 
 import attr
 import httpx
+import structlog
 from typing import Protocol
 
+from notifier.metrics import observe_api_response
+from notifier.rate_limit import RateLimiter, RetryPolicy, parse_retry_after
+
+logger = structlog.get_logger()
+
 
 @attr.define()
 class ApiAuth:
@@ -22,6 +31,44 @@ class ApiAuth:
 JsonResponseType = dict[str, Any] | list[dict[str, Any]]
 
 
+@attr.define()
+class ConnectionSettings:
+    """
+    Represents the connection pool settings of an API client
+
+    Parameters
+    ----------
+    timeout
+        The number of seconds to wait for connecting, reading or writing before timing out
+    max_connections
+        The maximum number of concurrent connections to the API
+    max_keepalive_connections
+        The maximum number of idle connections to keep open for reuse
+    keepalive_expiry
+        The number of seconds an idle connection is kept open for
+    http2
+        Whether to use HTTP/2 if the server supports it. Requires the `http2` extra
+    """
+
+    timeout: float = 5.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 5.0
+    http2: bool = False
+
+    def client_kwargs(self) -> dict[str, Any]:
+        """Returns the keyword arguments to configure an httpx client with"""
+        return {
+            "timeout": httpx.Timeout(self.timeout),
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "http2": self.http2,
+        }
+
+
 class ApiClientInterface(Protocol):
     """
     Represent the Interface an APIClient should satisfy
@@ -33,18 +80,79 @@ class ApiClientInterface(Protocol):
         ...
 
 
+class StreamingApiClientInterface(ApiClientInterface, Protocol):
+    """
+    Represent the Interface an APIClient which can stream newline-delimited JSON should satisfy
+    """
+
+    def stream(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> Iterator[dict[str, Any]]:
+        ...
+
+
+class WritableApiClientInterface(ApiClientInterface, Protocol):
+    """
+    Represent the Interface an APIClient which can post and put JSON data should satisfy
+    """
+
+    def post(self, endpoint: str, json: Any = None) -> Optional[JsonResponseType]:
+        ...
+
+    def put(self, endpoint: str, json: Any = None) -> Optional[JsonResponseType]:
+        ...
+
+
+class AsyncApiClientInterface(Protocol):
+    """
+    Represent the Interface an asynchronous APIClient should satisfy
+    """
+
+    auth: ApiAuth
+
+    async def get(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> JsonResponseType:
+        ...
+
+
 @attr.define()
 class ApiClient:
     """
-    An API client for fetching data from Web APIs
+    An API client for fetching data from Web APIs. Connections are pooled and kept alive
+    between requests until the client is closed, so use it as a context manager or
+    call `close` when done. Requests wait for the `rate_limiter` if given, and throttled or
+    failed requests are retried according to the `retry` policy
     """
 
     base_url: str
     auth: ApiAuth = None
+    connection: ConnectionSettings = attr.field(factory=ConnectionSettings)
+    rate_limiter: Optional[RateLimiter] = None
+    retry: Optional[RetryPolicy] = None
+    _http_client: Optional[httpx.Client] = attr.field(
+        default=None, init=False, repr=False
+    )
+
+    def __enter__(self) -> "ApiClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def _client(self) -> httpx.Client:
-        """Returns the client used to communicate with the API"""
-        return httpx.Client(base_url=self.base_url)
+        """Returns the pooled client used to communicate with the API"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.Client(
+                base_url=self.base_url, **self.connection.client_kwargs()
+            )
+        return self._http_client
+
+    def close(self) -> None:
+        """Close all pooled connections"""
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
 
     def get(self, endpoint: str, params: Optional[dict] = None) -> JsonResponseType:
         """
@@ -68,7 +176,240 @@ class ApiClient:
             The API response converted to a dict or list of dicts
         """
         params = {} if params is None else params
-        with self._client() as c:
-            r = c.get(endpoint, params=params)
+        r = self._request("GET", endpoint, params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def stream(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Streams newline-delimited JSON from an HTTP endpoint, parsing one record at a time as
+        it arrives, so memory use doesn't grow with the size of the response
+
+        Parameters
+        ----------
+        endpoint
+            The endpoint to stream data from
+        params
+            Any query parameters that should be sent to the API
+
+        Raises
+        ------
+        HTTPStatusError
+            Raised if the server returns either 4xx or 5xx status codes
+
+        Returns
+        -------
+        iterator of dicts
+            An iterator over each JSON record in the response
+        """
+        params = {} if params is None else params
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        with self._client().stream("GET", endpoint, params=params) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+    def post(self, endpoint: str, json: Any = None) -> Optional[JsonResponseType]:
+        """
+        Posts JSON data to an HTTP endpoint
+
+        Parameters
+        ----------
+        endpoint
+            The endpoint to post data to
+        json
+            The data to send as the JSON body of the request
+
+        Raises
+        ------
+        HTTPStatusError
+            Raised if the server returns either 4xx or 5xx status codes
+
+        Returns
+        -------
+        JsonResponseType or None
+            The API response converted to a dict or list of dicts. None if the response has
+            no content
+        """
+        return self._send("POST", endpoint, json)
+
+    def put(self, endpoint: str, json: Any = None) -> Optional[JsonResponseType]:
+        """
+        Puts JSON data to an HTTP endpoint
+
+        Parameters
+        ----------
+        endpoint
+            The endpoint to put data to
+        json
+            The data to send as the JSON body of the request
+
+        Raises
+        ------
+        HTTPStatusError
+            Raised if the server returns either 4xx or 5xx status codes
+
+        Returns
+        -------
+        JsonResponseType or None
+            The API response converted to a dict or list of dicts. None if the response has
+            no content
+        """
+        return self._send("PUT", endpoint, json)
+
+    def _send(
+        self, method: str, endpoint: str, json: Any
+    ) -> Optional[JsonResponseType]:
+        """Sends JSON data to an HTTP endpoint, returning the JSON response if any"""
+        r = self._request(method, endpoint, json=json)
+        r.raise_for_status()
+        return r.json() if r.content else None
+
+    def _request(self, method: str, endpoint: str, **kwargs: Any) -> httpx.Response:
+        """Sends a request once the rate limiter allows it, retrying it if needed"""
+        attempt = 0
+        while True:
+            sent_at = None
+            if self.rate_limiter is not None:
+                sent_at = self.rate_limiter.acquire()
+            start = time.perf_counter()
+            r = self._client().request(method, endpoint, **kwargs)
+            observe_api_response(r, time.perf_counter() - start)
+            if (delay := handle_response(self, r, attempt, sent_at)) is None:
+                return r
+            time.sleep(delay)
+            attempt += 1
+
+
+@attr.define()
+class AsyncApiClient:
+    """
+    An asynchronous API client for fetching data from Web APIs. Connections are pooled and kept
+    alive between requests until the client is closed, so use it as an async context manager or
+    call `aclose` when done. Requests wait for the `rate_limiter` if given, and throttled or
+    failed requests are retried according to the `retry` policy
+    """
+
+    base_url: str
+    auth: ApiAuth = None
+    connection: ConnectionSettings = attr.field(factory=ConnectionSettings)
+    rate_limiter: Optional[RateLimiter] = None
+    retry: Optional[RetryPolicy] = None
+    _http_client: Optional[httpx.AsyncClient] = attr.field(
+        default=None, init=False, repr=False
+    )
+
+    async def __aenter__(self) -> "AsyncApiClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _client(self) -> httpx.AsyncClient:
+        """Returns the pooled client used to communicate with the API"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.base_url, **self.connection.client_kwargs()
+            )
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """Close all pooled connections"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def get(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> JsonResponseType:
+        """
+        Gets the JSON data from an HTTP endpoint
+
+        Parameters
+        ----------
+        endpoint
+            The endpoint to get data from
+        params
+            Any query parameters that should be sent to the API
+
+        Raises
+        ------
+        HTTPStatusError
+            Raised if the server returns either 4xx or 5xx status codes
+
+        Returns
+        -------
+        JsonResponseType
+            The API response converted to a dict or list of dicts
+        """
+        params = {} if params is None else params
+        r = await self._request("GET", endpoint, params=params)
         r.raise_for_status()
         return r.json()
+
+    async def _request(
+        self, method: str, endpoint: str, **kwargs: Any
+    ) -> httpx.Response:
+        """Sends a request once the rate limiter allows it, retrying it if needed"""
+        attempt = 0
+        while True:
+            sent_at = None
+            if self.rate_limiter is not None:
+                sent_at = await self.rate_limiter.acquire_async()
+            start = time.perf_counter()
+            r = await self._client().request(method, endpoint, **kwargs)
+            observe_api_response(r, time.perf_counter() - start)
+            if (delay := handle_response(self, r, attempt, sent_at)) is None:
+                return r
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def handle_response(
+    client: ApiClient | AsyncApiClient,
+    response: httpx.Response,
+    attempt: int,
+    sent_at: Optional[float] = None,
+) -> Optional[float]:
+    """
+    Report a response to the rate limiter of a client, and decide whether to retry it
+
+    Parameters
+    ----------
+    client
+        The client which sent the request
+    response
+        The response to the request
+    attempt
+        The number of times the request has been retried already
+    sent_at
+        The time the rate limiter let the request be sent at
+
+    Returns
+    -------
+    float or None
+        The number of seconds to wait before retrying the request, or None to not retry it
+    """
+    if client.rate_limiter is not None:
+        if response.status_code == 429:
+            client.rate_limiter.throttled(
+                parse_retry_after(response.headers.get("Retry-After")), sent_at
+            )
+        elif response.is_success:
+            client.rate_limiter.succeeded()
+
+    if client.retry is None:
+        return None
+    if (delay := client.retry.delay(response, attempt)) is not None:
+        logger.msg(
+            "Retrying request",
+            url=str(response.request.url.copy_with(query=None)),
+            status_code=response.status_code,
+            attempt=attempt + 1,
+            delay=round(delay, 3),
+        )
+    return delay
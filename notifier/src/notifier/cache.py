@@ -0,0 +1,233 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Protocol
+
+import attr
+
+from notifier.schemas import Location, WeatherConditions
+from notifier.settings import Settings
+
+
+class WeatherCacheInterface(Protocol):
+    """
+    Represents the interface a cache of weather conditions should satisfy
+    """
+
+    def get(self, location: Location) -> Optional[WeatherConditions]:
+        """Should return the cached weather for the location or None if missing or expired"""
+        ...
+
+    def set(self, location: Location, weather: WeatherConditions) -> None:
+        """Should store the weather for the location"""
+        ...
+
+
+@attr.define()
+class InMemoryWeatherCache:
+    """
+    An in-process weather cache with a time-to-live and least-recently-used eviction
+
+    Parameters
+    ----------
+    ttl
+        The number of seconds a cached weather condition is valid for
+    max_size
+        The maximum number of locations to keep in the cache
+    clock
+        A function returning the current time in seconds
+    """
+
+    ttl: float = 600
+    max_size: int = 10_000
+    clock: Callable[[], float] = time.monotonic
+    _entries: OrderedDict[Location, tuple[float, WeatherConditions]] = attr.field(
+        factory=OrderedDict, init=False
+    )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, location: Location) -> Optional[WeatherConditions]:
+        """
+        Get the cached weather for a location
+
+        Parameters
+        ----------
+        location
+            The location to look up
+
+        Returns
+        -------
+        WeatherConditions or None
+            None if the location is not cached or the cached value has expired
+        """
+        if (entry := self._entries.get(location)) is None:
+            return None
+
+        fetched_at, weather = entry
+        if self.clock() - fetched_at > self.ttl:
+            del self._entries[location]
+            return None
+
+        self._entries.move_to_end(location)
+        return weather
+
+    def set(self, location: Location, weather: WeatherConditions) -> None:
+        """
+        Store the weather for a location, evicting the least recently used locations
+        if the cache is full
+
+        Parameters
+        ----------
+        location
+            The location the weather was fetched for
+        weather
+            The fetched weather conditions
+        """
+        self._entries[location] = (self.clock(), weather)
+        self._entries.move_to_end(location)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+@attr.define()
+class SqliteWeatherCache:
+    """
+    An on-disk weather cache backed by SQLite, with a time-to-live and least-recently-used
+    eviction. As the cache survives restarts, a restarted notifier doesn't have to refetch
+    the weather for every location
+
+    Parameters
+    ----------
+    path
+        The path to the SQLite database file
+    ttl
+        The number of seconds a cached weather condition is valid for
+    max_size
+        The maximum number of locations to keep in the cache
+    clock
+        A function returning the current unix time in seconds
+    """
+
+    path: str
+    ttl: float = 600
+    max_size: int = 10_000
+    clock: Callable[[], float] = time.time
+    _conn: sqlite3.Connection = attr.field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._conn = sqlite3.connect(self.path)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS weather_cache (
+                    city TEXT NOT NULL,
+                    country_code TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    weather TEXT NOT NULL,
+                    PRIMARY KEY (city, country_code)
+                )
+                """
+            )
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM weather_cache").fetchone()[0]
+
+    def get(self, location: Location) -> Optional[WeatherConditions]:
+        """
+        Get the cached weather for a location
+
+        Parameters
+        ----------
+        location
+            The location to look up
+
+        Returns
+        -------
+        WeatherConditions or None
+            None if the location is not cached or the cached value has expired
+        """
+        now = self.clock()
+        row = self._conn.execute(
+            "SELECT fetched_at, weather FROM weather_cache WHERE city = ? AND country_code = ?",
+            (location.city, location.country_code),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        fetched_at, weather = row
+        with self._conn:
+            if now - fetched_at > self.ttl:
+                self._conn.execute(
+                    "DELETE FROM weather_cache WHERE city = ? AND country_code = ?",
+                    (location.city, location.country_code),
+                )
+                return None
+
+            self._conn.execute(
+                "UPDATE weather_cache SET accessed_at = ? WHERE city = ? AND country_code = ?",
+                (now, location.city, location.country_code),
+            )
+        return WeatherConditions.parse_obj(json.loads(weather))
+
+    def set(self, location: Location, weather: WeatherConditions) -> None:
+        """
+        Store the weather for a location, evicting the least recently used locations
+        if the cache is full
+
+        Parameters
+        ----------
+        location
+            The location the weather was fetched for
+        weather
+            The fetched weather conditions
+        """
+        now = self.clock()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO weather_cache VALUES (?, ?, ?, ?, ?)",
+                (location.city, location.country_code, now, now, weather.json()),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM weather_cache WHERE rowid IN (
+                    SELECT rowid FROM weather_cache
+                    ORDER BY accessed_at DESC, rowid DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_size,),
+            )
+
+    def close(self) -> None:
+        """Close the connection to the cache database"""
+        self._conn.close()
+
+
+def create_weather_cache(settings: Settings) -> WeatherCacheInterface:
+    """
+    Create the weather cache defined by the settings. Uses an on-disk cache if
+    `weather_cache_path` is set, otherwise an in-memory cache
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+
+    Returns
+    -------
+    WeatherCacheInterface
+    """
+    if settings.weather_cache_path is not None:
+        return SqliteWeatherCache(
+            settings.weather_cache_path,
+            ttl=settings.weather_cache_ttl,
+            max_size=settings.weather_cache_max_size,
+        )
+    return InMemoryWeatherCache(
+        ttl=settings.weather_cache_ttl, max_size=settings.weather_cache_max_size
+    )
@@ -1,24 +1,61 @@
 import email
+import queue
 import smtplib
-from typing import Protocol
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Protocol
 
 import attr
 
 
+@attr.define(frozen=True)
+class Email:
+    """
+    Represents an email to be sent
+
+    Parameters
+    ----------
+    to
+        The recipient email
+    subject
+        The subject line of the email
+    body
+        The contents of the email
+    html
+        Optionally, an HTML alternative of the contents, sent as a multipart email
+    """
+
+    to: str
+    subject: str
+    body: str
+    html: Optional[str] = None
+
+
 class EmailClientInterface(Protocol):
     """
     An interface defining an EmailClient
     """
 
-    def send_email(self, to: str, subject: str, body: str) -> None:
+    def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        message_id: Optional[str] = None,
+        html: Optional[str] = None,
+    ) -> None:
         """Should send an email to the 'to' subject"""
         ...
 
+    def send_many(self, emails: Iterable[Email]) -> list[Email]:
+        """Should send all the emails, returning the ones that failed"""
+        ...
+
 
 @attr.define()
 class EmailClient:
     """
-    Implementation of an email client
+    Implementation of an email client. SMTP connections are kept open and reused between
+    emails, so use it as a context manager or call `close` when done
 
     Parameters
     ----------
@@ -27,17 +64,85 @@ class EmailClient:
 
     sender:
         The sender to attach to the email
+
+    pool_size:
+        The maximum number of SMTP connections to keep open at the same time
     """
 
     smtp_host: str
     sender: str = "noreply@weather-notifier.com"
+    pool_size: int = 1
+    _pool: queue.LifoQueue[Optional[smtplib.SMTP]] = attr.field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        for _ in range(self.pool_size):
+            self._pool.put(None)
+
+    def __enter__(self) -> "EmailClient":
+        return self
 
-    @property
-    def smtp(self) -> smtplib.SMTP:
-        """Return an instance of the SMTP client"""
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _connect(self) -> smtplib.SMTP:
+        """Return a new connection to the SMTP server"""
         return smtplib.SMTP(self.smtp_host)
 
-    def send_email(self, to: str, subject: str, body: str) -> None:
+    def _create_message(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        message_id: Optional[str] = None,
+        html: Optional[str] = None,
+    ) -> email.message.EmailMessage:
+        """Build the email message to send, as a multipart message if it has an HTML body"""
+        email_message = email.message.EmailMessage()
+        email_message.set_content(body)
+        if html is not None:
+            email_message.add_alternative(html, subtype="html")
+        email_message["From"] = self.sender
+        email_message["To"] = to
+        email_message["Subject"] = subject
+        if message_id is not None:
+            email_message["Message-ID"] = message_id
+        return email_message
+
+    def _send_message(self, message: email.message.EmailMessage) -> None:
+        """
+        Send a message using a connection from the pool, waiting for a free connection if
+        all are in use. Reconnects once if the server has closed the connection
+        """
+        smtp = self._pool.get()
+        try:
+            if smtp is None:
+                smtp = self._connect()
+            try:
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                smtp = None
+                smtp = self._connect()
+                smtp.send_message(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server rejected the message, but the connection is still usable
+            raise
+        except OSError:
+            if smtp is not None:
+                smtp.close()
+            smtp = None
+            raise
+        finally:
+            self._pool.put(smtp)
+
+    def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        message_id: Optional[str] = None,
+        html: Optional[str] = None,
+    ) -> None:
         """
         Send an email message to the 'to' email
 
@@ -49,15 +154,52 @@ class EmailClient:
             The subject line of the email
         body: str
             The contents of the email
+        message_id: str, optional
+            The Message-ID header of the email, so resending it can be deduplicated
+        html: str, optional
+            An HTML alternative of the contents, sent as a multipart email
 
         Returns
         -------
         None
         """
-        email_message = email.message.EmailMessage()
-        email_message.set_content(body)
-        email_message["From"] = self.sender
-        email_message["To"] = to
-        email_message["Subject"] = subject
+        self._send_message(self._create_message(to, subject, body, message_id, html))
+
+    def send_many(self, emails: Iterable[Email]) -> list[Email]:
+        """
+        Send multiple emails, using up to `pool_size` connections at the same time. A failed
+        email doesn't stop the remaining emails from being sent
+
+        Parameters
+        ----------
+        emails
+            The emails to send
+
+        Returns
+        -------
+        list of Emails
+            The emails which could not be sent
+        """
+
+        def send(outgoing: Email) -> Optional[Email]:
+            try:
+                self.send_email(
+                    outgoing.to, outgoing.subject, outgoing.body, html=outgoing.html
+                )
+            except OSError:
+                return outgoing
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            return [failed for failed in executor.map(send, emails) if failed]
 
-        self.smtp.send_message(email_message)
+    def close(self) -> None:
+        """Close all open SMTP connections, waiting for any in use to be returned"""
+        connections = [self._pool.get() for _ in range(self.pool_size)]
+        for smtp in connections:
+            if smtp is not None:
+                try:
+                    smtp.quit()
+                except smtplib.SMTPServerDisconnected:
+                    pass
+            self._pool.put(None)
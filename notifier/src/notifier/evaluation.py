@@ -0,0 +1,276 @@
+from typing import Mapping, Sequence
+
+import attr
+import numpy as np
+
+from notifier.alert_state import (
+    AlertChanges,
+    AlertKey,
+    AlertStateInterface,
+    alert_key,
+    subscription_key,
+)
+from notifier.schemas import Location, Subscription, WeatherConditions
+from notifier.services import AlertDict
+from notifier.threshold_index import ThresholdIndex
+
+CONDITIONS = ("temp", "pressure", "humidity")
+OPS = ("gt", "ge", "lt", "le", "eq", "ne")
+
+CONDITION_CODES = {condition: code for code, condition in enumerate(CONDITIONS)}
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+
+
+@attr.define()
+class AlertEvaluator:
+    """
+    Evaluates the alert conditions of many subscriptions at once. All conditions are compiled
+    into columnar arrays, one row per condition, so they can be compared against the weather
+    of every location in a single vectorized pass. The conditions are also kept in a
+    ThresholdIndex, so finding the triggered alerts of a cycle only touches the conditions
+    which hit
+
+    Parameters
+    ----------
+    subscriptions
+        The compiled subscriptions, in the order alerts are returned
+    locations
+        The unique locations of the subscriptions, in the order of the weather matrix rows
+    condition_index
+        The index into `CONDITIONS` of the weather condition each condition compares
+    op_code
+        The index into `OPS` of the comparison of each condition
+    threshold
+        The threshold of each condition
+    subscription_index
+        The index into `subscriptions` each condition belongs to
+    location_index
+        The index into `locations` each condition is evaluated at
+    keys
+        The alert key of each condition, identifying its alert state
+    index
+        The conditions, indexed by threshold and keyed by the index into `subscriptions`
+    """
+
+    subscriptions: list[Subscription]
+    locations: list[Location]
+    condition_index: np.ndarray
+    op_code: np.ndarray
+    threshold: np.ndarray
+    subscription_index: np.ndarray
+    location_index: np.ndarray
+    keys: list[AlertKey] = attr.field(factory=list)
+    index: ThresholdIndex = attr.field(factory=ThresholdIndex)
+    _key_index: dict[AlertKey, int] = attr.field(init=False)
+
+    def __attrs_post_init__(self):
+        self._key_index = {}
+        for i, key in enumerate(self.keys):
+            self._key_index.setdefault(key, i)
+
+    @classmethod
+    def compile(
+        cls, subscriptions_by_location: Mapping[Location, Sequence[Subscription]]
+    ) -> "AlertEvaluator":
+        """
+        Compile the conditions of all subscriptions into arrays
+
+        Parameters
+        ----------
+        subscriptions_by_location
+            The subscriptions to compile, grouped by location
+
+        Raises
+        ------
+        ValueError
+            Raised if a condition has an unknown weather condition or comparison
+
+        Returns
+        -------
+        AlertEvaluator
+        """
+        subscriptions = []
+        condition_index, op_code, threshold = [], [], []
+        subscription_index, location_index = [], []
+        keys = []
+
+        for i_location, location_subscriptions in enumerate(
+            subscriptions_by_location.values()
+        ):
+            for sub in location_subscriptions:
+                i_subscription = len(subscriptions)
+                subscriptions.append(sub)
+                for condition in sub.conditions:
+                    try:
+                        condition_index.append(CONDITION_CODES[condition.condition])
+                        op_code.append(OP_CODES[condition.op])
+                    except KeyError as e:
+                        raise ValueError(f"Unknown condition or op: {e}") from e
+                    threshold.append(condition.threshold)
+                    keys.append(
+                        alert_key(
+                            sub,
+                            condition.condition,
+                            condition.op,
+                            float(condition.threshold),
+                        )
+                    )
+                    subscription_index.append(i_subscription)
+                    location_index.append(i_location)
+
+        return cls(
+            subscriptions=subscriptions,
+            locations=list(subscriptions_by_location),
+            condition_index=np.array(condition_index, dtype=np.intp),
+            op_code=np.array(op_code, dtype=np.intp),
+            threshold=np.array(threshold, dtype=np.float64),
+            subscription_index=np.array(subscription_index, dtype=np.intp),
+            location_index=np.array(location_index, dtype=np.intp),
+            keys=keys,
+            index=ThresholdIndex.build(enumerate(subscriptions)),
+        )
+
+    def weather_matrix(
+        self, weather: Mapping[Location, WeatherConditions]
+    ) -> np.ndarray:
+        """
+        Build the weather matrix, with one row per location and one column per condition
+
+        Parameters
+        ----------
+        weather
+            The weather conditions of every compiled location
+
+        Returns
+        -------
+        np.ndarray
+            An array of shape (n_locations, n_conditions)
+        """
+        return np.array(
+            [
+                [getattr(weather[location], condition) for condition in CONDITIONS]
+                for location in self.locations
+            ],
+            dtype=np.float64,
+        ).reshape(len(self.locations), len(CONDITIONS))
+
+    def hits(self, weather_matrix: np.ndarray) -> np.ndarray:
+        """
+        Evaluate every condition against the weather matrix
+
+        Parameters
+        ----------
+        weather_matrix
+            The weather of every location, as returned by `weather_matrix`
+
+        Returns
+        -------
+        np.ndarray
+            A boolean array with one element per condition, True if the condition is triggered
+        """
+        actual = weather_matrix[self.location_index, self.condition_index]
+        comparisons = [
+            actual > self.threshold,
+            actual >= self.threshold,
+            actual < self.threshold,
+            actual <= self.threshold,
+            actual == self.threshold,
+            actual != self.threshold,
+        ]
+        return np.choose(self.op_code, comparisons)
+
+    def evaluate(
+        self, weather: Mapping[Location, WeatherConditions]
+    ) -> list[list[AlertDict]]:
+        """
+        Generate the alerts of every subscription
+
+        Parameters
+        ----------
+        weather
+            The weather conditions of every compiled location
+
+        Returns
+        -------
+        list of lists of alert dicts
+            The alerts of each subscription, in the same order as `subscriptions`
+        """
+        weather_matrix = self.weather_matrix(weather)
+        actual = weather_matrix[self.location_index, self.condition_index]
+        hit = np.flatnonzero(self.hits(weather_matrix))
+
+        alerts: list[list[AlertDict]] = [[] for _ in self.subscriptions]
+        for i_subscription, i_condition, i_op, threshold, actual_value in zip(
+            self.subscription_index[hit].tolist(),
+            self.condition_index[hit].tolist(),
+            self.op_code[hit].tolist(),
+            self.threshold[hit].tolist(),
+            actual[hit].tolist(),
+        ):
+            alerts[i_subscription].append(
+                {
+                    "condition": CONDITIONS[i_condition],
+                    "op": OPS[i_op],
+                    "threshold": threshold,
+                    "actual": actual_value,
+                }
+            )
+        return alerts
+
+    def evaluate_changes(
+        self,
+        weather: Mapping[Location, WeatherConditions],
+        alert_state: AlertStateInterface,
+    ) -> list[AlertChanges]:
+        """
+        Find the alerts of every subscription which triggered or cleared since the subscriber
+        was last notified, according to the alert state. The triggered conditions are
+        looked up in the threshold index. Cleared conditions come from the alert state,
+        which knows which conditions were active when the subscriber was last notified
+
+        Parameters
+        ----------
+        weather
+            The weather conditions of every compiled location
+        alert_state
+            The alert states of the conditions, as last notified
+
+        Returns
+        -------
+        list of AlertChanges
+            The changed alerts of each subscription, in the same order as `subscriptions`
+        """
+        active = {
+            alert_key(
+                self.subscriptions[i_subscription], condition, op, float(threshold)
+            )
+            for location in self.locations
+            for i_subscription, condition, op, threshold in self.index.triggered_conditions(
+                location, weather[location]
+            )
+        }
+
+        transitions = alert_state.transitions(
+            active,
+            self._key_index,
+            {subscription_key(sub) for sub in self.subscriptions},
+        )
+
+        changes = [AlertChanges() for _ in self.subscriptions]
+        for key in sorted(transitions, key=self._key_index.__getitem__):
+            i = self._key_index[key]
+            subscription_changes = changes[self.subscription_index[i]]
+            condition = CONDITIONS[self.condition_index[i]]
+            location = self.locations[self.location_index[i]]
+            alert: AlertDict = {
+                "condition": condition,
+                "op": OPS[self.op_code[i]],
+                "threshold": self.threshold[i].item(),
+                "actual": float(getattr(weather[location], condition)),
+            }
+            if transitions[key]:
+                subscription_changes.triggered.append(alert)
+            else:
+                subscription_changes.cleared.append(alert)
+            subscription_changes.transitions[key] = transitions[key]
+        return changes
@@ -1,78 +1,1191 @@
+import asyncio
 import time
+from typing import Iterator, Optional, Sequence
 
-import schedule
+import attr
 import structlog
+from structlog.types import BindableLogger
 
-from notifier.api_client import ApiClient, ApiAuth
-from notifier.email_client import EmailClient
+from notifier.alert_state import (
+    AlertChanges,
+    AlertKey,
+    AlertStateInterface,
+    create_alert_state,
+    record_notified,
+    subscription_key,
+)
+from notifier.api_client import (
+    ApiClient,
+    ApiAuth,
+    AsyncApiClient,
+    ConnectionSettings,
+)
+from notifier.cache import WeatherCacheInterface, create_weather_cache
+from notifier.email_client import Email, EmailClient
+from notifier.evaluation import AlertEvaluator
+from notifier.metrics import (
+    ALERT_EVALUATION_SECONDS,
+    CYCLE_FAILURES,
+    CYCLE_LAG_SECONDS,
+    CYCLE_SECONDS,
+    EMAIL_SEND_SECONDS,
+    EMAILS_QUEUED,
+    OUTBOX_PENDING,
+    SUBSCRIPTION_FETCH_SECONDS,
+    WEATHER_FETCH_SECONDS,
+    observe_emails,
+    start_metrics_server,
+)
+from notifier.outbox import SqliteOutbox, create_outbox, idempotency_key
+from notifier.rate_limit import RateLimiter, RetryPolicy
+from notifier.replica import SubscriptionReplica
+from notifier.scheduler import CycleScheduler, location_slot
+from notifier.schemas import Location, Subscription, WeatherConditions
 from notifier.services import (
+    AlertDict,
+    claim_locations,
+    complete_locations,
+    fetch_cached_weather,
+    fetch_cached_weather_async,
     fetch_subscriptions,
-    fetch_weather,
-    format_email_body,
-    generate_alerts,
+    DigestSectionDict,
+    format_digest_body,
+    format_digest_html,
+    group_subscriptions_by_location,
+    stream_subscriptions,
 )
 from notifier.settings import Settings
+from notifier.sharding import ShardMetrics, ShardPool, partition_locations
+from notifier.weather_groups import (
+    CityIds,
+    fetch_weather_grouped,
+    fetch_weather_grouped_async,
+)
 
 logger = structlog.get_logger()
 
+WEATHER_API_URL = "https://api.openweathermap.org/data/2.5"
+
+
+def weather_connection_settings(settings: Settings) -> ConnectionSettings:
+    """Returns the connection pool settings for the weather API client"""
+    return ConnectionSettings(
+        timeout=settings.http_timeout,
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        http2=settings.http2,
+    )
+
+
+_weather_rate_limiter: Optional[RateLimiter] = None
 
-def main() -> None:
+
+def weather_rate_limiter(settings: Settings) -> Optional[RateLimiter]:
     """
-    Entrypoint for one cycle of fetching data from the API and sending alerts
+    Returns the rate limiter of the weather API client, or None if `weather_calls_per_minute`
+    isn't set. The limiter is kept between cycles, so an adaptive rate carries over, and the
+    limit is split evenly between shard processes
+    """
+    global _weather_rate_limiter
+    if settings.weather_calls_per_minute is None:
+        return None
+    if _weather_rate_limiter is None:
+        _weather_rate_limiter = RateLimiter(
+            settings.weather_calls_per_minute / settings.shards,
+            burst=settings.weather_burst,
+            adaptive=settings.adaptive_rate_limit,
+        )
+    return _weather_rate_limiter
+
 
+_weather_cache: Optional[WeatherCacheInterface] = None
+_alert_state: Optional[AlertStateInterface] = None
+_outbox: Optional[SqliteOutbox] = None
+
+
+def get_weather_cache(settings: Settings) -> WeatherCacheInterface:
     """
-    settings = Settings()
+    Returns the weather cache of this process, kept between cycles, so an on-disk cache is
+    only connected to once
+    """
+    global _weather_cache
+    if _weather_cache is None:
+        _weather_cache = create_weather_cache(settings)
+    return _weather_cache
 
-    client = ApiClient(settings.subscription_api_url)
+
+def get_alert_state(settings: Settings) -> AlertStateInterface:
+    """Returns the alert states of this process, kept between cycles"""
+    global _alert_state
+    if _alert_state is None:
+        _alert_state = create_alert_state(settings)
+    return _alert_state
+
+
+def get_outbox(settings: Settings) -> Optional[SqliteOutbox]:
+    """
+    Returns the outbox of this process if `outbox_path` is set, otherwise None and emails are
+    sent directly
+    """
+    global _outbox
+    if _outbox is None:
+        _outbox = create_outbox(settings)
+    return _outbox
+
+
+def weather_retry_policy(settings: Settings) -> RetryPolicy:
+    """Returns the policy for retrying throttled or failed weather requests"""
+    return RetryPolicy(
+        max_retries=settings.weather_max_retries,
+        backoff=settings.weather_backoff_seconds,
+        max_backoff=settings.weather_max_backoff_seconds,
+    )
+
+
+def load_subscriptions(
+    settings: Settings,
+    client: ApiClient,
+    replica: Optional[SubscriptionReplica] = None,
+) -> Iterator[Subscription]:
+    """
+    Load all subscriptions. If a replica is passed, it is synced and its subscriptions
+    returned. Otherwise they are lazily loaded, either streamed in one request or paginated
+    depending on the `stream_subscriptions` setting
+    """
+    if replica is not None:
+        replica.sync(client)
+        return iter(replica)
+    if settings.stream_subscriptions:
+        return stream_subscriptions(client)
+    return fetch_subscriptions(client, settings.subscription_page_size)
+
+
+def create_notification(
+    sub: Subscription,
+    alerts: list[AlertDict],
+    sub_logger: BindableLogger,
+    cleared: Sequence[AlertDict] = (),
+    html: bool = False,
+) -> Email:
+    """
+    Create the email notifying the subscriber of their alerts
+
+    Parameters
+    ----------
+    sub
+        The subscription to notify
+    alerts
+        The alerts generated for the subscription
+    sub_logger
+        A logger bound to the subscription
+    cleared
+        The alerts which are no longer triggered
+    html
+        Whether to add an HTML alternative of the body
+
+    Returns
+    -------
+    Email
+        The notification email to send
+    """
+    sub_logger.msg("Generated alerts", alerts=alerts, cleared=list(cleared))
+    section: DigestSectionDict = {
+        "city": sub.city,
+        "country_code": sub.country_code,
+        "alerts": alerts,
+        "cleared": list(cleared),
+    }
+    return Email(
+        to=sub.email,
+        subject=f"Weather Notification for {sub.city}",
+        body=format_digest_body([section]),
+        html=format_digest_html([section]) if html else None,
+    )
+
+
+def create_digest(
+    changed: Sequence[tuple[Subscription, AlertChanges]], html: bool = False
+) -> Email:
+    """
+    Create one email notifying a subscriber of the changed alerts of all of their
+    subscriptions
+
+    Parameters
+    ----------
+    changed
+        The subscriptions of the subscriber with changed alerts, and their changes
+    html
+        Whether to add an HTML alternative of the body
+
+    Returns
+    -------
+    Email
+        The notification email to send
+    """
+    if len(changed) == 1:
+        sub, changes = changed[0]
+        return create_notification(
+            sub,
+            changes.triggered,
+            bind_subscription_logger(sub),
+            changes.cleared,
+            html,
+        )
+
+    to = changed[0][0].email
+    cities = list(dict.fromkeys(sub.city for sub, _ in changed))
+    logger.msg(
+        "Generated digest",
+        user_email=to,
+        n_subscriptions=len(changed),
+        n_alerts=sum(len(changes.triggered) for _, changes in changed),
+        n_cleared=sum(len(changes.cleared) for _, changes in changed),
+    )
+    sections: list[DigestSectionDict] = [
+        {
+            "city": sub.city,
+            "country_code": sub.country_code,
+            "alerts": changes.triggered,
+            "cleared": changes.cleared,
+        }
+        for sub, changes in changed
+    ]
+    return Email(
+        to=to,
+        subject=f"Weather Notification for {', '.join(cities)}",
+        body=format_digest_body(sections),
+        html=format_digest_html(sections) if html else None,
+    )
+
+
+def bind_subscription_logger(sub: Subscription) -> BindableLogger:
+    """Bind the details of a subscription to the logger"""
+    return logger.bind(
+        user_email=sub.email,
+        subscription_city=sub.city,
+        subscription_country_code=sub.country_code,
+    )
+
+
+def log_fetched_weather(
+    location: Location, weather: WeatherConditions, n_subscriptions: int
+) -> None:
+    """Log the weather fetched for a location"""
+    logger.msg(
+        "Fetched weather condition",
+        location_city=location.city,
+        location_country_code=location.country_code,
+        n_subscriptions=n_subscriptions,
+        **weather.dict(),
+    )
+
+
+def evaluate_changed_alerts(
+    evaluator: AlertEvaluator,
+    weather: dict[Location, WeatherConditions],
+    alert_state: AlertStateInterface,
+) -> list[tuple[Subscription, AlertChanges]]:
+    """
+    Evaluate the alerts of every subscription in one pass, and return the subscriptions whose
+    alerts triggered or cleared since they were last notified
+
+    Parameters
+    ----------
+    evaluator
+        The compiled conditions of all subscriptions
+    weather
+        The weather of every location
+    alert_state
+        The alert states of the conditions, as last notified
+
+    Returns
+    -------
+    list of Subscription and AlertChanges pairs
+        The subscriptions with changed alerts, and their changes
+    """
+    changes = evaluator.evaluate_changes(weather, alert_state)
+    logger.msg(
+        "Evaluated alerts",
+        n_conditions=len(evaluator.threshold),
+        n_triggered=sum(len(sub_changes.triggered) for sub_changes in changes),
+        n_cleared=sum(len(sub_changes.cleared) for sub_changes in changes),
+    )
+    return [
+        (sub, sub_changes)
+        for sub, sub_changes in zip(evaluator.subscriptions, changes)
+        if sub_changes
+    ]
+
+
+def create_notifications(
+    changed: Sequence[tuple[Subscription, AlertChanges]],
+    digest: bool = False,
+    html: bool = False,
+) -> list[tuple[Email, AlertChanges]]:
+    """
+    Create the notification emails of the subscriptions with changed alerts
+
+    Parameters
+    ----------
+    changed
+        The subscriptions with changed alerts, and their changes
+    digest
+        Whether to send one email per email address with the alerts of all of its
+        subscriptions, instead of one email per subscription
+    html
+        Whether to add an HTML alternative to the body of the emails
+
+    Returns
+    -------
+    list of Email and AlertChanges pairs
+        The notification emails, and the changes to record once each is sent
+    """
+    if digest:
+        by_recipient: dict[str, list[tuple[Subscription, AlertChanges]]] = {}
+        for sub, sub_changes in changed:
+            by_recipient.setdefault(sub.email, []).append((sub, sub_changes))
+        groups = list(by_recipient.values())
+    else:
+        groups = [[sub_changed] for sub_changed in changed]
+
+    return [
+        (
+            create_digest(group, html),
+            AlertChanges.merge(changes for _, changes in group),
+        )
+        for group in groups
+    ]
+
+
+def evaluate_alerts(
+    evaluator: AlertEvaluator,
+    weather: dict[Location, WeatherConditions],
+    alert_state: AlertStateInterface,
+    digest: bool = False,
+    html: bool = False,
+) -> list[tuple[Email, AlertChanges]]:
+    """
+    Evaluate the alerts of every subscription in one pass and create the notification emails
+    of the subscriptions whose alerts triggered or cleared since they were last notified
+
+    Parameters
+    ----------
+    evaluator
+        The compiled conditions of all subscriptions
+    weather
+        The weather of every location
+    alert_state
+        The alert states of the conditions, as last notified
+    digest
+        Whether to send one email per email address with the alerts of all of its
+        subscriptions, instead of one email per subscription
+    html
+        Whether to add an HTML alternative to the body of the emails
+
+    Returns
+    -------
+    list of Email and AlertChanges pairs
+        The notification emails, and the changes to record once each is sent
+    """
+    changed = evaluate_changed_alerts(evaluator, weather, alert_state)
+    return create_notifications(changed, digest, html)
+
+
+def record_sent_notifications(
+    alert_state: AlertStateInterface,
+    notifications: list[tuple[Email, AlertChanges]],
+    failed: list[Email],
+) -> None:
+    """
+    Record the alert changes of the sent notifications, so the changes of the notifications
+    which failed are notified again next cycle
+    """
+    failed_emails = set(failed)
+    record_notified(
+        alert_state,
+        (changes for email, changes in notifications if email not in failed_emails),
+    )
+
+
+def spread_window(settings: Settings) -> float:
+    """The number of seconds at the start of a cycle to spread weather requests over"""
+    return settings.schedule_minutes * 60 * settings.spread_fraction
+
+
+def fetch_subscriptions_by_location(
+    settings: Settings, replica: Optional[SubscriptionReplica] = None
+) -> dict[Location, list[Subscription]]:
+    """Load all subscriptions from the Subscription API, grouped by location"""
+    with SUBSCRIPTION_FETCH_SECONDS.time(), ApiClient(
+        settings.subscription_api_url
+    ) as client:
+        logger.msg("Fetching subscriptions...")
+        return group_subscriptions_by_location(
+            load_subscriptions(settings, client, replica)
+        )
+
+
+def load_city_ids(settings: Settings) -> Optional[CityIds]:
+    """
+    Load the OpenWeatherMap city ids of all locations from the Subscription API. Returns None
+    unless `group_weather_requests` is set
+    """
+    if not settings.group_weather_requests:
+        return None
+    with ApiClient(settings.subscription_api_url) as client:
+        return CityIds.load(client)
+
+
+def save_city_ids(settings: Settings, city_ids: CityIds) -> None:
+    """Save the city ids resolved while fetching the weather to the Subscription API"""
+    with ApiClient(settings.subscription_api_url) as client:
+        city_ids.save(client)
+
+
+def queue_notifications(
+    outbox: SqliteOutbox, notifications: list[tuple[Email, AlertChanges]]
+) -> None:
+    """
+    Queue the notifications in the outbox for the sender worker to send. As the outbox
+    delivers them durably, their alert changes can be recorded as soon as they're queued
+    """
+    n_queued = outbox.enqueue(
+        (idempotency_key(email, changes.transitions), email)
+        for email, changes in notifications
+    )
+    EMAILS_QUEUED.inc(n_queued)
+    OUTBOX_PENDING.set(n_pending := len(outbox))
+    logger.msg("Emails queued", n_queued=n_queued, n_pending=n_pending)
+
+
+def deliver_notifications(
+    settings: Settings, notifications: list[tuple[Email, AlertChanges]]
+) -> list[Email]:
+    """
+    Queue the notification emails in the outbox if `outbox_path` is set, otherwise send them.
+    The alert changes of the delivered notifications are left to the caller to record
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    notifications
+        The notification emails and their alert changes
+
+    Returns
+    -------
+    list of Emails
+        The notifications which could not be sent
+    """
+    if (outbox := get_outbox(settings)) is not None:
+        with EMAIL_SEND_SECONDS.time():
+            queue_notifications(outbox, notifications)
+        return []
+
+    emails = [email for email, _ in notifications]
+    with EMAIL_SEND_SECONDS.time(), EmailClient(settings.smtp_host) as email_client:
+        failed = email_client.send_many(emails)
+    observe_emails(len(emails) - len(failed), len(failed))
+    logger.msg(
+        "Emails sent",
+        n_sent=len(emails) - len(failed),
+        failed=[notification.to for notification in failed],
+    )
+    return failed
+
+
+def evaluate_locations(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    spread: float = 0.0,
+    city_ids: Optional[CityIds] = None,
+) -> list[tuple[Subscription, AlertChanges]]:
+    """
+    Fetch the weather for one location at a time, or for groups of locations if city ids are
+    passed, and evaluate all alerts in one pass
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    subscriptions_by_location
+        The subscriptions to notify, grouped by location
+    spread
+        The number of seconds to spread the weather requests over. Each location is fetched
+        in its own slot within this window, as given by `location_slot`
+    city_ids
+        The city ids of the locations. If passed, the weather is fetched for up to 20
+        locations per request
+
+    Returns
+    -------
+    list of Subscription and AlertChanges pairs
+        The subscriptions with changed alerts, and their changes
+    """
+    evaluator = AlertEvaluator.compile(subscriptions_by_location)
 
     weather_client = ApiClient(
-        "https://api.openweathermap.org/data/2.5",
+        WEATHER_API_URL,
+        auth=ApiAuth(api_key=settings.api_key.get_secret_value()),
+        connection=weather_connection_settings(settings),
+        rate_limiter=weather_rate_limiter(settings),
+        retry=weather_retry_policy(settings),
+    )
+
+    slots = {
+        location: location_slot(location, spread)
+        for location in subscriptions_by_location
+    }
+    start = time.monotonic()
+
+    def wait_for(location: Location) -> None:
+        if (wait := start + slots[location] - time.monotonic()) > 0:
+            time.sleep(wait)
+
+    locations = sorted(subscriptions_by_location, key=slots.get)
+    weather = {}
+    with weather_client, WEATHER_FETCH_SECONDS.time():
+        if city_ids is None:
+            for location in locations:
+                wait_for(location)
+                weather[location] = fetch_cached_weather(
+                    weather_client, cache, location
+                )
+        else:
+            weather = fetch_weather_grouped(
+                weather_client, cache, locations, city_ids, wait_for
+            )
+    for location in locations:
+        log_fetched_weather(
+            location, weather[location], len(subscriptions_by_location[location])
+        )
+    if city_ids is not None:
+        save_city_ids(settings, city_ids)
+
+    with ALERT_EVALUATION_SECONDS.time():
+        return evaluate_changed_alerts(evaluator, weather, get_alert_state(settings))
+
+
+def notify_locations(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    spread: float = 0.0,
+    city_ids: Optional[CityIds] = None,
+) -> tuple[list[Email], list[Email]]:
+    """
+    Fetch the weather for one location at a time, or for groups of locations if city ids are
+    passed, evaluate all alerts in one pass and then send the emails
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    subscriptions_by_location
+        The subscriptions to notify, grouped by location
+    spread
+        The number of seconds to spread the weather requests over. Each location is fetched
+        in its own slot within this window, as given by `location_slot`
+    city_ids
+        The city ids of the locations. If passed, the weather is fetched for up to 20
+        locations per request
+
+    Returns
+    -------
+    list of Emails and list of Emails
+        The notifications and the notifications which could not be sent
+    """
+    changed = evaluate_locations(
+        settings, cache, subscriptions_by_location, spread, city_ids
+    )
+    notifications = create_notifications(
+        changed, settings.digest_emails, settings.html_emails
+    )
+    failed = deliver_notifications(settings, notifications)
+    record_sent_notifications(get_alert_state(settings), notifications, failed)
+    return [email for email, _ in notifications], failed
+
+
+async def evaluate_locations_async(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    spread: float = 0.0,
+    city_ids: Optional[CityIds] = None,
+) -> list[tuple[Subscription, AlertChanges]]:
+    """
+    Fetch the weather for all locations at the same time, or for groups of locations if city
+    ids are passed, limited by `max_concurrent_requests`, and evaluate all alerts in one pass
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    subscriptions_by_location
+        The subscriptions to notify, grouped by location
+    spread
+        The number of seconds to spread the weather requests over. Each location is fetched
+        in its own slot within this window, as given by `location_slot`
+    city_ids
+        The city ids of the locations. If passed, the weather is fetched for up to 20
+        locations per request
+
+    Returns
+    -------
+    list of Subscription and AlertChanges pairs
+        The subscriptions with changed alerts, and their changes
+    """
+    weather_client = AsyncApiClient(
+        WEATHER_API_URL,
         auth=ApiAuth(api_key=settings.api_key.get_secret_value()),
+        connection=weather_connection_settings(settings),
+        rate_limiter=weather_rate_limiter(settings),
+        retry=weather_retry_policy(settings),
     )
 
-    email_client = EmailClient(settings.smtp_host)
+    request_semaphore = asyncio.Semaphore(settings.max_concurrent_requests)
+
+    async def wait_for_slot(location: Location) -> None:
+        await asyncio.sleep(location_slot(location, spread))
+
+    async def fetch_location_weather(
+        location: Location, subscriptions: list[Subscription]
+    ) -> WeatherConditions:
+        await wait_for_slot(location)
+        async with request_semaphore:
+            weather = await fetch_cached_weather_async(weather_client, cache, location)
+        log_fetched_weather(location, weather, len(subscriptions))
+        return weather
 
-    logger.msg("Fetching subscriptions...")
+    evaluator = AlertEvaluator.compile(subscriptions_by_location)
 
-    for sub in fetch_subscriptions(client):
-        sub_logger = logger.bind(
-            user_email=sub.email,
-            subscription_city=sub.city,
-            subscription_country_code=sub.country_code,
+    weather_start = time.perf_counter()
+    async with weather_client:
+        if city_ids is None:
+            fetched = await asyncio.gather(
+                *(
+                    fetch_location_weather(location, subscriptions)
+                    for location, subscriptions in subscriptions_by_location.items()
+                )
+            )
+            weather = dict(zip(evaluator.locations, fetched))
+        else:
+            weather = await fetch_weather_grouped_async(
+                weather_client,
+                cache,
+                evaluator.locations,
+                city_ids,
+                wait_for_slot,
+                settings.max_concurrent_requests,
+            )
+            for location, subscriptions in subscriptions_by_location.items():
+                log_fetched_weather(location, weather[location], len(subscriptions))
+            await asyncio.to_thread(save_city_ids, settings, city_ids)
+    WEATHER_FETCH_SECONDS.observe(time.perf_counter() - weather_start)
+
+    with ALERT_EVALUATION_SECONDS.time():
+        return evaluate_changed_alerts(evaluator, weather, get_alert_state(settings))
+
+
+async def notify_locations_async(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    spread: float = 0.0,
+    city_ids: Optional[CityIds] = None,
+) -> tuple[list[Email], list[Email]]:
+    """
+    Fetch the weather for all locations at the same time, or for groups of locations if city
+    ids are passed, evaluate all alerts in one pass and then send the emails at the same time,
+    limited by `max_concurrent_requests` and `max_concurrent_emails`
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    subscriptions_by_location
+        The subscriptions to notify, grouped by location
+    spread
+        The number of seconds to spread the weather requests over. Each location is fetched
+        in its own slot within this window, as given by `location_slot`
+    city_ids
+        The city ids of the locations. If passed, the weather is fetched for up to 20
+        locations per request
+
+    Returns
+    -------
+    list of Emails and list of Emails
+        The notifications and the notifications which could not be sent
+    """
+    changed = await evaluate_locations_async(
+        settings, cache, subscriptions_by_location, spread, city_ids
+    )
+    notifications = create_notifications(
+        changed, settings.digest_emails, settings.html_emails
+    )
+    emails = [email for email, _ in notifications]
+    alert_state = get_alert_state(settings)
+
+    if (outbox := get_outbox(settings)) is not None:
+        with EMAIL_SEND_SECONDS.time():
+            queue_notifications(outbox, notifications)
+        record_notified(alert_state, (changes for _, changes in notifications))
+        return emails, []
+
+    email_client = EmailClient(
+        settings.smtp_host, pool_size=settings.max_concurrent_emails
+    )
+    email_semaphore = asyncio.Semaphore(settings.max_concurrent_emails)
+
+    async def send_notification(notification: Email) -> Optional[Email]:
+        async with email_semaphore:
+            try:
+                await asyncio.to_thread(
+                    email_client.send_email,
+                    notification.to,
+                    notification.subject,
+                    notification.body,
+                    html=notification.html,
+                )
+            except OSError:
+                logger.msg("Email failed", user_email=notification.to)
+                return notification
+        logger.msg("Email sent", user_email=notification.to)
+        return None
+
+    send_start = time.perf_counter()
+    with email_client:
+        sent = await asyncio.gather(
+            *(send_notification(notification) for notification in emails)
         )
+    EMAIL_SEND_SECONDS.observe(time.perf_counter() - send_start)
+    failed = [failed for failed in sent if failed]
+    observe_emails(len(emails) - len(failed), len(failed))
+    record_sent_notifications(alert_state, notifications, failed)
+    return emails, failed
+
+
+def log_finished_cycle(
+    subscriptions_by_location: dict[Location, list[Subscription]]
+) -> None:
+    """Log the size of a finished cycle"""
+    logger.msg(
+        "Finished cycle",
+        unique_locations=len(subscriptions_by_location),
+        subscriptions_processed=sum(map(len, subscriptions_by_location.values())),
+    )
+
+
+def run_cycle(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    replica: Optional[SubscriptionReplica] = None,
+) -> None:
+    """
+    Run one cycle, fetching the weather for one location at a time, evaluating all alerts in
+    one pass and then sending the emails
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    replica
+        The local replica of the subscriptions to sync. If None, all subscriptions are
+        fetched from the API
+    """
+    subscriptions_by_location = fetch_subscriptions_by_location(settings, replica)
+    notify_locations(
+        settings,
+        cache,
+        subscriptions_by_location,
+        spread_window(settings),
+        load_city_ids(settings),
+    )
+    log_finished_cycle(subscriptions_by_location)
+
+
+async def run_async_cycle(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    replica: Optional[SubscriptionReplica] = None,
+) -> None:
+    """
+    Run one cycle concurrently. The weather for all locations is fetched at the same time,
+    all alerts are evaluated in one pass and then the emails are sent at the same time
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    replica
+        The local replica of the subscriptions to sync. If None, all subscriptions are
+        fetched from the API
+    """
+    subscriptions_by_location = await asyncio.to_thread(
+        fetch_subscriptions_by_location, settings, replica
+    )
+    city_ids = await asyncio.to_thread(load_city_ids, settings)
+    await notify_locations_async(
+        settings,
+        cache,
+        subscriptions_by_location,
+        spread_window(settings),
+        city_ids,
+    )
+    log_finished_cycle(subscriptions_by_location)
+
+
+# The weather cache of a shard worker process, created when the process starts
+_shard_cache: Optional[WeatherCacheInterface] = None
+
+
+def init_shard_worker(settings: Settings) -> None:
+    """
+    Set up a shard worker process, creating the weather cache and alert states it keeps
+    between cycles. The emails are delivered by the main process, so workers don't open the
+    outbox
+    """
+    global _shard_cache, _alert_state
+    _shard_cache = create_weather_cache(settings)
+    _alert_state = create_alert_state(settings)
 
-        weather = fetch_weather(weather_client, sub.city, sub.country_code)
 
-        sub_logger.msg("Fetched weather condition", **weather.dict())
+def create_shard_pool(settings: Settings) -> ShardPool:
+    """Start one worker process per shard"""
+    return ShardPool(settings.shards, init_shard_worker, (settings,))
 
-        alerts = generate_alerts(sub.conditions, weather)
-        sub_logger.msg("Generated alerts", alerts=alerts)
-        email_client.send_email(
-            sub.email,
-            subject=f"Weather Notification for {sub.city}",
-            body=format_email_body(alerts, sub.city, sub.country_code),
+
+def run_shard(
+    shard: int,
+    settings: Settings,
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    city_ids: Optional[CityIds] = None,
+) -> tuple[ShardMetrics, list[tuple[Subscription, AlertChanges]]]:
+    """
+    Evaluate the alerts of the subscriptions owned by a shard. Runs in the shard's worker
+    process. The emails are created and sent by the main process, so a digest lists the
+    subscriptions of a subscriber owned by every shard
+
+    Parameters
+    ----------
+    shard
+        The index of the shard
+    settings
+        The notifier settings
+    subscriptions_by_location
+        The subscriptions owned by the shard, grouped by location
+    city_ids
+        The city ids of the locations, if the weather is fetched in groups
+
+    Returns
+    -------
+    ShardMetrics and list of Subscription and AlertChanges pairs
+        The metrics of the shard, and the subscriptions with changed alerts with their
+        changes
+    """
+    start = time.perf_counter()
+    if settings.async_mode:
+        changed = asyncio.run(
+            evaluate_locations_async(
+                settings,
+                _shard_cache,
+                subscriptions_by_location,
+                spread_window(settings),
+                city_ids,
+            )
+        )
+    else:
+        changed = evaluate_locations(
+            settings,
+            _shard_cache,
+            subscriptions_by_location,
+            spread_window(settings),
+            city_ids,
+        )
+    metrics = ShardMetrics(
+        shard=shard,
+        unique_locations=len(subscriptions_by_location),
+        subscriptions_processed=sum(map(len, subscriptions_by_location.values())),
+        subscriptions_changed=len(changed),
+        duration=time.perf_counter() - start,
+    )
+    return metrics, changed
+
+
+def record_shard_notified(shard: int, transitions: dict[AlertKey, bool]) -> None:
+    """
+    Record the transitions the subscribers of a shard were notified of in the alert states of
+    the shard. Runs in the shard's worker process
+    """
+    _alert_state.record(transitions)
+
+
+def split_transitions_by_shard(
+    notifications: list[tuple[Email, AlertChanges]],
+    failed: list[Email],
+    owners: dict[str, int],
+    n_shards: int,
+) -> list[dict[AlertKey, bool]]:
+    """
+    Split the transitions of the sent notifications between the shards owning their
+    subscriptions, as a digest can list the subscriptions of several shards
+
+    Parameters
+    ----------
+    notifications
+        The notification emails and their alert changes
+    failed
+        The notifications which could not be sent
+    owners
+        The shard owning each subscription, by subscription key
+    n_shards
+        The number of shards
+
+    Returns
+    -------
+    list of dicts of AlertKey to bool
+        The transitions to record in each shard
+    """
+    failed_emails = set(failed)
+    transitions: list[dict[AlertKey, bool]] = [{} for _ in range(n_shards)]
+    for email, changes in notifications:
+        if email in failed_emails:
+            continue
+        for key, is_active in changes.transitions.items():
+            transitions[owners[key[0]]][key] = is_active
+    return transitions
+
+
+def run_sharded_cycle(
+    settings: Settings,
+    pool: ShardPool,
+    replica: Optional[SubscriptionReplica] = None,
+) -> list[ShardMetrics]:
+    """
+    Run one cycle split across the worker processes of a shard pool. The subscriptions are
+    fetched once, then each worker evaluates the alerts of the locations its shard owns. The
+    changed alerts of all shards are then grouped by recipient and sent from this process,
+    and each worker records the alert changes of its own subscriptions
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    pool
+        The pool of shard worker processes
+    replica
+        The local replica of the subscriptions to sync. If None, all subscriptions are
+        fetched from the API
+
+    Returns
+    -------
+    list of ShardMetrics
+        The metrics of each shard
+    """
+    subscriptions_by_location = fetch_subscriptions_by_location(settings, replica)
+    shards = partition_locations(subscriptions_by_location, pool.n_shards)
+    city_ids = load_city_ids(settings)
+    results = pool.run(run_shard, [(settings, shard, city_ids) for shard in shards])
+    metrics = [shard_metrics for shard_metrics, _ in results]
+    for shard_metrics in metrics:
+        logger.msg("Finished shard", **attr.asdict(shard_metrics))
+
+    owners = {
+        subscription_key(sub): shard
+        for shard, (_, changed) in enumerate(results)
+        for sub, _ in changed
+    }
+    notifications = create_notifications(
+        [sub_changed for _, changed in results for sub_changed in changed],
+        settings.digest_emails,
+        settings.html_emails,
+    )
+    failed = deliver_notifications(settings, notifications)
+    transitions = split_transitions_by_shard(
+        notifications, failed, owners, pool.n_shards
+    )
+    pool.run(
+        record_shard_notified,
+        [(shard_transitions,) for shard_transitions in transitions],
+    )
+
+    logger.msg(
+        "Finished cycle",
+        n_shards=pool.n_shards,
+        unique_locations=sum(m.unique_locations for m in metrics),
+        subscriptions_processed=sum(m.subscriptions_processed for m in metrics),
+        emails_sent=len(notifications) - len(failed),
+        emails_failed=len(failed),
+        slowest_shard_duration=max(m.duration for m in metrics),
+    )
+    return metrics
+
+
+def current_run_id(schedule_minutes: int, tick: Optional[float] = None) -> str:
+    """
+    Returns the id of the run of a tick, the number of schedule intervals since the epoch. All
+    replicas running a cycle for the same tick share the run id. Uses the current time if no
+    tick is passed
+    """
+    tick = time.time() if tick is None else tick
+    return str(int(tick // (schedule_minutes * 60)))
+
+
+def run_leased_cycle(
+    settings: Settings,
+    cache: WeatherCacheInterface,
+    run_id: str,
+    replica: Optional[SubscriptionReplica] = None,
+) -> None:
+    """
+    Run one cycle as one of several notifier replicas. Locations are claimed from the
+    Subscription API in batches, so each location is evaluated by only one replica, until
+    no locations are left to claim. Weather requests aren't spread out, as each batch has to
+    be completed within its lease. The emails are sent once every batch is evaluated, so a
+    digest lists the subscriptions of a subscriber in all batches of this replica. If the
+    replica stops before sending them, the alerts are notified in the next cycle, as their
+    changes are only recorded once sent
+
+    Parameters
+    ----------
+    settings
+        The notifier settings
+    cache
+        The weather cache to look up weather conditions in
+    run_id
+        The id of the run, shared by all replicas running the same cycle
+    replica
+        The local replica of the subscriptions to sync. If None, all subscriptions are
+        fetched from the API
+    """
+    subscriptions_by_location = fetch_subscriptions_by_location(settings, replica)
+    city_ids = load_city_ids(settings)
+
+    notified: dict[Location, list[Subscription]] = {}
+    changed: list[tuple[Subscription, AlertChanges]] = []
+    with ApiClient(settings.subscription_api_url) as client:
+        while leases := claim_locations(
+            client,
+            run_id,
+            settings.worker_id,
+            batch_size=settings.lease_batch_size,
+            lease_seconds=settings.lease_seconds,
+        ):
+            batch = {
+                location: subscriptions_by_location.get(location, [])
+                for location in leases.values()
+            }
+            logger.msg("Claimed locations", run_id=run_id, n_locations=len(batch))
+            if settings.async_mode:
+                changed += asyncio.run(
+                    evaluate_locations_async(settings, cache, batch, city_ids=city_ids)
+                )
+            else:
+                changed += evaluate_locations(settings, cache, batch, city_ids=city_ids)
+            complete_locations(client, run_id, settings.worker_id, leases)
+            notified.update(batch)
+
+    notifications = create_notifications(
+        changed, settings.digest_emails, settings.html_emails
+    )
+    failed = deliver_notifications(settings, notifications)
+    record_sent_notifications(get_alert_state(settings), notifications, failed)
+    log_finished_cycle(notified)
+
+
+def main(
+    cache: Optional[WeatherCacheInterface] = None,
+    replica: Optional[SubscriptionReplica] = None,
+    pool: Optional[ShardPool] = None,
+    tick: Optional[float] = None,
+) -> None:
+    """
+    Entrypoint for one cycle of fetching data from the API and sending alerts
+
+    Parameters
+    ----------
+    cache
+        The weather cache to share between cycles. If not passed, the cache of this process
+        is used, created from the settings on the first cycle
+    replica
+        The subscription replica to share between cycles. Only used if `sync_subscriptions`
+        is set, in which case a new replica is created if not passed
+    pool
+        The shard worker processes to share between cycles. Only used if `shards` is more
+        than 1, in which case new worker processes are started if not passed
+    tick
+        The scheduled time of the cycle. Replicas use it to agree on the run when
+        `work_leasing` is set. Defaults to the current time
+    """
+    settings = Settings()
+    cache = get_weather_cache(settings) if cache is None else cache
+    if not settings.sync_subscriptions:
+        replica = None
+    elif replica is None:
+        replica = SubscriptionReplica()
+
+    if settings.work_leasing:
+        run_leased_cycle(
+            settings, cache, current_run_id(settings.schedule_minutes, tick), replica
         )
-        sub_logger.msg("Email sent")
+    elif settings.shards > 1 and pool is None:
+        with create_shard_pool(settings) as pool:
+            run_sharded_cycle(settings, pool, replica)
+    elif settings.shards > 1:
+        run_sharded_cycle(settings, pool, replica)
+    elif settings.async_mode:
+        asyncio.run(run_async_cycle(settings, cache, replica))
+    else:
+        run_cycle(settings, cache, replica)
 
 
-def scheduled_run(schedule_minutes=1):
+def scheduled_run(schedule_minutes: Optional[int] = None):
     """
-    Scheduler entrypoint. Schedules the main function to run every `schedule_minutes`
+    Scheduler entrypoint. Runs the main function every `schedule_minutes`, aligned to the
+    clock, without overlapping cycles
 
     Parameters
     ----------
     schedule_minutes
-        The schedule interval
+        The schedule interval. Defaults to the `schedule_minutes` setting
 
     Returns
     -------
     None
     """
     logger.msg("Started notifying...")
-    schedule.every(schedule_minutes).minutes.do(main)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    settings = Settings()
+    if schedule_minutes is None:
+        schedule_minutes = settings.schedule_minutes
+    cache = get_weather_cache(settings)
+    replica = SubscriptionReplica() if settings.sync_subscriptions else None
+    pool = create_shard_pool(settings) if settings.shards > 1 else None
+    if settings.metrics_port is not None:
+        start_metrics_server(settings.metrics_port)
+        logger.msg("Serving metrics", port=settings.metrics_port)
+
+    def run_scheduled_cycle(tick: float) -> None:
+        CYCLE_LAG_SECONDS.observe(max(time.time() - tick, 0.0))
+        with CYCLE_SECONDS.time(), CYCLE_FAILURES.count_exceptions():
+            main(cache=cache, replica=replica, pool=pool, tick=tick)
+
+    scheduler = CycleScheduler(
+        schedule_minutes * 60, run_scheduled_cycle, missed_ticks=settings.missed_ticks
+    )
+    scheduler.run()
 
 
 if __name__ == "__main__":
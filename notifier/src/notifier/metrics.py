@@ -0,0 +1,121 @@
+"""
+Prometheus metrics of the notifier, served from a `/metrics` endpoint when `metrics_port` is
+set. The metrics are registered with the default registry, so they're collected in every
+process which imports this module. Shard worker processes only export their metrics if
+`PROMETHEUS_MULTIPROC_DIR` is set, in which case the endpoint aggregates them. The outbox
+sender serves its own endpoint when `sender_metrics_port` is set
+"""
+import os
+
+import httpx
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+
+# Buckets for the phases of a cycle, which take from well under a second to many minutes
+PHASE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+SUBSCRIPTION_FETCH_SECONDS = Histogram(
+    "notifier_subscription_fetch_seconds",
+    "Time spent loading the subscriptions of a cycle",
+    buckets=PHASE_BUCKETS,
+)
+WEATHER_FETCH_SECONDS = Histogram(
+    "notifier_weather_fetch_seconds",
+    "Time spent fetching the weather of all locations of a cycle, including spread delays",
+    buckets=PHASE_BUCKETS,
+)
+ALERT_EVALUATION_SECONDS = Histogram(
+    "notifier_alert_evaluation_seconds",
+    "Time spent evaluating the alerts of a cycle",
+    buckets=PHASE_BUCKETS,
+)
+EMAIL_SEND_SECONDS = Histogram(
+    "notifier_email_send_seconds",
+    "Time spent sending, or queueing in the outbox, the emails of a cycle",
+    buckets=PHASE_BUCKETS,
+)
+CYCLE_SECONDS = Histogram(
+    "notifier_cycle_seconds",
+    "Duration of a scheduled cycle",
+    buckets=PHASE_BUCKETS,
+)
+CYCLE_LAG_SECONDS = Histogram(
+    "notifier_cycle_lag_seconds",
+    "Delay between the scheduled tick of a cycle and the cycle starting",
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+CYCLE_FAILURES = Counter("notifier_cycle_failures", "Cycles which raised an error")
+
+API_REQUEST_SECONDS = Histogram(
+    "notifier_api_request_seconds",
+    "Duration of each request to an API, including retries as separate requests",
+    ["host"],
+)
+API_ERRORS = Counter(
+    "notifier_api_errors",
+    "Responses from an API with an error status code",
+    ["host", "status_code"],
+)
+API_THROTTLED = Counter(
+    "notifier_api_throttled",
+    "Responses from an API which throttled the notifier with a 429 status code",
+    ["host"],
+)
+
+EMAILS_SENT = Counter("notifier_emails_sent", "Emails sent to the SMTP server")
+EMAILS_FAILED = Counter(
+    "notifier_emails_failed", "Emails the SMTP server failed to accept"
+)
+EMAILS_QUEUED = Counter("notifier_emails_queued", "Emails queued in the outbox")
+OUTBOX_SEND_FAILURES = Counter(
+    "notifier_outbox_send_failures",
+    "Failed attempts of the outbox sender to send an email, by whether it's retried",
+    ["outcome"],
+)
+OUTBOX_PENDING = Gauge(
+    "notifier_outbox_pending",
+    "Emails in the outbox waiting to be sent",
+    multiprocess_mode="livemax",
+)
+
+
+def observe_api_response(response: httpx.Response, seconds: float) -> None:
+    """Record the duration and status of a request to an API"""
+    host = response.request.url.host
+    API_REQUEST_SECONDS.labels(host).observe(seconds)
+    if response.status_code == 429:
+        API_THROTTLED.labels(host).inc()
+    if response.is_error:
+        API_ERRORS.labels(host, str(response.status_code)).inc()
+
+
+def observe_emails(n_sent: int, n_failed: int) -> None:
+    """Record the number of emails sent and failed"""
+    EMAILS_SENT.inc(n_sent)
+    EMAILS_FAILED.inc(n_failed)
+
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> None:
+    """
+    Serve the metrics over HTTP from a background thread. If `PROMETHEUS_MULTIPROC_DIR` is
+    set, the metrics of all processes writing to it are served
+
+    Parameters
+    ----------
+    port
+        The port to listen on
+    addr
+        The address to listen on
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, addr, registry=registry)
+    else:
+        start_http_server(port, addr)
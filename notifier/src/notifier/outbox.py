@@ -0,0 +1,477 @@
+"""
+A durable outbox of notification emails. The notifier writes rendered emails to the outbox,
+and a separate sender worker drains it, so a slow SMTP server doesn't hold up evaluating the
+weather, and queued emails survive restarts
+"""
+import hashlib
+import json
+import random
+import smtplib
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Mapping, Optional
+
+import attr
+import structlog
+
+from notifier.alert_state import AlertKey
+from notifier.email_client import Email, EmailClient, EmailClientInterface
+from notifier.metrics import (
+    EMAILS_SENT,
+    OUTBOX_PENDING,
+    OUTBOX_SEND_FAILURES,
+    start_metrics_server,
+)
+from notifier.settings import Settings
+
+logger = structlog.get_logger()
+
+
+def idempotency_key(email: Email, transitions: Mapping[AlertKey, bool]) -> str:
+    """
+    Returns the idempotency key of a notification, identifying the alert transitions it
+    notifies the recipient of. Queueing the same notification again while it's waiting to be
+    sent is a no-op
+    """
+    content = json.dumps([email.to, sorted(transitions.items())])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@attr.define(frozen=True)
+class OutboxMessage:
+    """
+    An email claimed from the outbox to send
+
+    Parameters
+    ----------
+    id
+        The id of the message in the outbox
+    idempotency_key
+        The idempotency key the message was queued with
+    email
+        The email to send
+    attempts
+        The number of times sending the message has failed
+    claim_token
+        Identifies the claim of the message. Marking the message as sent or failed only
+        succeeds while the claim is still the latest one
+    """
+
+    id: int
+    idempotency_key: str
+    email: Email
+    attempts: int
+    claim_token: str
+
+    @property
+    def message_id(self) -> str:
+        """The Message-ID header of the email, the same every time the message is sent"""
+        return f"<{self.id}.{self.idempotency_key[:32]}@weather-notifier>"
+
+
+@attr.define()
+class SqliteOutbox:
+    """
+    An outbox of emails backed by SQLite. Messages are `pending` until a sender claims them,
+    `sending` while claimed, and end up `sent`, or `failed` once they run out of attempts.
+    A claim expires after `lease_seconds`, so the messages of a crashed sender are sent by
+    the next one. Each claim has its own token, so a sender whose claim expired can't
+    overwrite the outcome of the sender which claimed the message after it
+
+    Parameters
+    ----------
+    path
+        The path to the SQLite database file
+    lease_seconds
+        The number of seconds a sender has to send the messages it claimed
+    clock
+        A function returning the current unix time in seconds
+    """
+
+    path: str
+    lease_seconds: float = 300
+    clock: Callable[[], float] = time.time
+    _conn: sqlite3.Connection = attr.field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY,
+                    idempotency_key TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    html TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_at REAL,
+                    claim_token TEXT,
+                    sent_at REAL,
+                    last_error TEXT
+                )
+                """
+            )
+            columns = {
+                row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")
+            }
+            if "html" not in columns:
+                # Outboxes created before emails had an HTML alternative
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN html TEXT")
+            if "claim_token" not in columns:
+                # Outboxes created before claims had tokens
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN claim_token TEXT")
+            self._conn.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS ix_outbox_unsent_idempotency_key
+                ON outbox (idempotency_key) WHERE status IN ('pending', 'sending')
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS ix_outbox_status_next_attempt_at
+                ON outbox (status, next_attempt_at)
+                """
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Run statements in a transaction holding the write lock from the start"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def __len__(self) -> int:
+        """The number of messages waiting to be sent"""
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+        ).fetchone()[0]
+
+    def enqueue(self, messages: Iterable[tuple[str, Email]]) -> int:
+        """
+        Queue emails to be sent, in one transaction. Emails whose idempotency key is already
+        waiting to be sent are skipped
+
+        Parameters
+        ----------
+        messages
+            Pairs of idempotency key and email
+
+        Returns
+        -------
+        int
+            The number of emails queued
+        """
+        now = self.clock()
+        with self._transaction():
+            cursor = self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO outbox
+                (idempotency_key, recipient, subject, body, html, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (key, email.to, email.subject, email.body, email.html, now, now)
+                    for key, email in messages
+                ),
+            )
+        return cursor.rowcount
+
+    def claim(self, limit: int) -> list[OutboxMessage]:
+        """
+        Claim up to `limit` messages which are due to be sent, oldest first, including
+        messages whose previous claim expired
+
+        Parameters
+        ----------
+        limit
+            The maximum number of messages to claim
+
+        Returns
+        -------
+        list of OutboxMessages
+        """
+        now = self.clock()
+        token = uuid.uuid4().hex
+        with self._transaction():
+            rows = self._conn.execute(
+                """
+                SELECT id, idempotency_key, recipient, subject, body, html, attempts
+                FROM outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                OR (status = 'sending' AND claimed_at <= ?)
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+                """,
+                (now, now - self.lease_seconds, limit),
+            ).fetchall()
+            self._conn.executemany(
+                """
+                UPDATE outbox SET status = 'sending', claimed_at = ?, claim_token = ?
+                WHERE id = ?
+                """,
+                ((now, token, row[0]) for row in rows),
+            )
+        return [
+            OutboxMessage(
+                id=id_,
+                idempotency_key=key,
+                email=Email(to=recipient, subject=subject, body=body, html=html),
+                attempts=attempts,
+                claim_token=token,
+            )
+            for id_, key, recipient, subject, body, html, attempts in rows
+        ]
+
+    def mark_sent(self, messages: Iterable[OutboxMessage]) -> int:
+        """
+        Mark claimed messages as sent, skipping messages whose claim was taken over by
+        another sender
+
+        Returns
+        -------
+        int
+            The number of messages marked as sent
+        """
+        now = self.clock()
+        with self._transaction():
+            cursor = self._conn.executemany(
+                """
+                UPDATE outbox SET status = 'sent', sent_at = ?
+                WHERE id = ? AND claim_token = ? AND status = 'sending'
+                """,
+                ((now, message.id, message.claim_token) for message in messages),
+            )
+        return cursor.rowcount
+
+    def mark_failed(
+        self, message: OutboxMessage, error: str, retry_in: Optional[float]
+    ) -> bool:
+        """
+        Record a failed attempt to send a claimed message, unless its claim was taken over by
+        another sender
+
+        Parameters
+        ----------
+        message
+            The message which failed
+        error
+            The error sending the message
+        retry_in
+            The number of seconds to wait before retrying, or None to give up on the message
+
+        Returns
+        -------
+        bool
+            Whether the failure was recorded
+        """
+        now = self.clock()
+        with self._transaction():
+            cursor = self._conn.execute(
+                """
+                UPDATE outbox
+                SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ? AND claim_token = ? AND status = 'sending'
+                """,
+                (
+                    "failed" if retry_in is None else "pending",
+                    now if retry_in is None else now + retry_in,
+                    error,
+                    message.id,
+                    message.claim_token,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def purge(self, older_than: float) -> int:
+        """Delete the messages sent more than `older_than` seconds ago"""
+        with self._transaction():
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+                (self.clock() - older_than,),
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Close the connection to the outbox database"""
+        self._conn.close()
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """
+    Whether an email failed for good, so retrying it is pointless. Errors other than network
+    and SMTP errors come from the email itself, such as a header with a newline in it
+    """
+    if not isinstance(error, OSError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+@attr.define()
+class OutboxSender:
+    """
+    Drains an outbox, sending up to `pool_size` of the email client's emails at the same
+    time. Failed emails are retried with an exponential backoff with jitter, until they run
+    out of attempts or fail permanently
+
+    Parameters
+    ----------
+    outbox
+        The outbox to drain
+    email_client
+        The client to send the emails with
+    concurrency
+        The number of emails to send at the same time
+    batch_size
+        The number of messages to claim at once
+    max_attempts
+        The number of times to try sending a message before giving up
+    backoff
+        The number of seconds to wait before the first retry. Doubled for every retry
+    max_backoff
+        The maximum number of seconds to wait before a retry
+    random
+        A function returning a random number between 0 and 1, used for the jitter
+    """
+
+    outbox: SqliteOutbox
+    email_client: EmailClientInterface
+    concurrency: int = 1
+    batch_size: int = 100
+    max_attempts: int = 8
+    backoff: float = 30.0
+    max_backoff: float = 3600.0
+    random: Callable[[], float] = random.random
+
+    def retry_in(self, message: OutboxMessage, error: Exception) -> Optional[float]:
+        """The number of seconds to wait before retrying a failed message, or None to give up"""
+        if is_permanent_failure(error) or message.attempts + 1 >= self.max_attempts:
+            return None
+        backoff = min(self.max_backoff, self.backoff * 2**message.attempts)
+        return backoff / 2 + self.random() * backoff / 2
+
+    def send(self, message: OutboxMessage) -> Optional[Exception]:
+        """
+        Send a message, returning the error if it failed. Any error is caught, so one bad
+        message can't stop the rest of its batch from being recorded
+        """
+        try:
+            self.email_client.send_email(
+                message.email.to,
+                message.email.subject,
+                message.email.body,
+                message_id=message.message_id,
+                html=message.email.html,
+            )
+        except Exception as e:
+            return e
+        return None
+
+    def drain_once(self) -> int:
+        """
+        Claim a batch of due messages and send them
+
+        Returns
+        -------
+        int
+            The number of messages claimed
+        """
+        messages = self.outbox.claim(self.batch_size)
+        OUTBOX_PENDING.set(len(self.outbox))
+        if not messages:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            errors = list(executor.map(self.send, messages))
+
+        sent = [message for message, error in zip(messages, errors) if error is None]
+        EMAILS_SENT.inc(len(sent))
+        if (n_marked := self.outbox.mark_sent(sent)) < len(sent):
+            logger.msg("Claims expired before sending", n_messages=len(sent) - n_marked)
+        for message, error in zip(messages, errors):
+            if error is not None:
+                retry_in = self.retry_in(message, error)
+                recorded = self.outbox.mark_failed(message, repr(error), retry_in)
+                OUTBOX_SEND_FAILURES.labels(
+                    "gave_up" if retry_in is None else "retry"
+                ).inc()
+                logger.msg(
+                    "Email failed",
+                    user_email=message.email.to,
+                    attempts=message.attempts + 1,
+                    retry_in=retry_in,
+                    error=repr(error),
+                    claim_expired=not recorded,
+                )
+        logger.msg(
+            "Emails sent",
+            n_sent=sum(error is None for error in errors),
+            n_failed=sum(error is not None for error in errors),
+        )
+        return len(messages)
+
+    def run(
+        self,
+        poll_seconds: float = 1.0,
+        retention_seconds: float = 86400,
+        should_stop: Callable[[], bool] = lambda: False,
+    ) -> None:
+        """
+        Drain the outbox until `should_stop` returns True, polling for new messages every
+        `poll_seconds` while it's empty and deleting sent messages after `retention_seconds`
+        """
+        while not should_stop():
+            if self.drain_once() == 0:
+                self.outbox.purge(retention_seconds)
+                time.sleep(poll_seconds)
+
+
+def create_outbox(settings: Settings) -> Optional[SqliteOutbox]:
+    """Create the outbox defined by the settings, or None if `outbox_path` isn't set"""
+    if settings.outbox_path is None:
+        return None
+    return SqliteOutbox(
+        settings.outbox_path, lease_seconds=settings.outbox_lease_seconds
+    )
+
+
+def run_sender() -> None:
+    """
+    Sender entrypoint. Drains the outbox at `outbox_path`, sending up to
+    `max_concurrent_emails` emails at the same time
+    """
+    settings = Settings()
+    outbox = create_outbox(settings)
+    if outbox is None:
+        raise SystemExit("OUTBOX_PATH must be set to run the sender")
+
+    logger.msg("Started sending...", outbox_path=settings.outbox_path)
+    if settings.sender_metrics_port is not None:
+        start_metrics_server(settings.sender_metrics_port)
+    with EmailClient(
+        settings.smtp_host, pool_size=settings.max_concurrent_emails
+    ) as email_client:
+        sender = OutboxSender(
+            outbox,
+            email_client,
+            concurrency=settings.max_concurrent_emails,
+            batch_size=settings.outbox_batch_size,
+            max_attempts=settings.outbox_max_attempts,
+        )
+        sender.run(poll_seconds=settings.outbox_poll_seconds)
@@ -0,0 +1,236 @@
+"""
+Rate limiting and retrying of API requests. A `RateLimiter` is a token bucket shared by every
+request of a process, and a `RetryPolicy` decides how long to back off before retrying a
+throttled or failed request
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import attr
+import httpx
+
+# The longest pause a `Retry-After` header can ask for, so a bogus header can't stop requests
+MAX_RETRY_AFTER = 3600.0
+
+
+@attr.define()
+class RateLimiter:
+    """
+    A token bucket limiting the rate of requests to an API. Tokens refill continuously at
+    `calls_per_minute`, up to `burst` tokens, and each request takes one token, waiting for it
+    if the bucket is empty.
+
+    In adaptive mode the rate is halved when the API throttles a request, and recovers
+    linearly to `calls_per_minute` over `recovery_seconds` while requests succeed, so the
+    limiter settles just below the rate the API allows. Only requests sent after the last cut
+    can cut the rate again, so a burst of requests throttled together halves it once
+
+    Parameters
+    ----------
+    calls_per_minute
+        The maximum number of requests per minute
+    burst
+        The maximum number of requests which can be sent at once after being idle
+    adaptive
+        Whether to lower the rate when the API throttles requests
+    min_calls_per_minute
+        The lowest rate the adaptive mode lowers the rate to
+    recovery_seconds
+        The number of seconds the adaptive mode takes to recover from the lowest rate to
+        `calls_per_minute`
+    clock
+        A function returning the current time in seconds
+    sleep
+        A function sleeping for a number of seconds
+    """
+
+    calls_per_minute: float
+    burst: int = 1
+    adaptive: bool = False
+    min_calls_per_minute: float = 1.0
+    recovery_seconds: float = 60.0
+    clock: Callable[[], float] = time.monotonic
+    sleep: Callable[[float], None] = time.sleep
+    rate: float = attr.field(init=False)
+    _tokens: float = attr.field(init=False)
+    _updated_at: float = attr.field(init=False)
+    _adjusted_at: float = attr.field(init=False)
+    _cut_at: float = attr.field(init=False, default=-math.inf)
+    _paused_until: float = attr.field(init=False, default=0.0)
+    _lock: threading.Lock = attr.field(init=False, factory=threading.Lock)
+
+    def __attrs_post_init__(self):
+        self.rate = self.calls_per_minute
+        self._tokens = float(self.burst)
+        self._updated_at = self._adjusted_at = self.clock()
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket, returning the number of seconds to wait before sending
+        the request. The token is reserved even if the request has to wait for it, so
+        concurrent requests queue up behind each other
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens * 60 / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self) -> float:
+        """Wait until a request can be sent, returning the time it's sent at"""
+        if (wait := self.reserve()) > 0:
+            self.sleep(wait)
+        return self.clock()
+
+    async def acquire_async(self) -> float:
+        """Asynchronously wait until a request can be sent, returning the time it's sent at"""
+        if (wait := self.reserve()) > 0:
+            await asyncio.sleep(wait)
+        return self.clock()
+
+    def throttled(
+        self, retry_after: Optional[float] = None, sent_at: Optional[float] = None
+    ) -> None:
+        """
+        Record that the API throttled a request. No request is sent for `retry_after` seconds,
+        and the rate is halved in adaptive mode, unless the request was sent before the rate
+        was last cut
+
+        Parameters
+        ----------
+        retry_after
+            The number of seconds the API asked to wait, if any
+        sent_at
+            The time the throttled request was sent, as returned by `acquire`. If None, the
+            request is assumed to be sent after the last cut
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after is not None:
+                retry_after = min(retry_after, MAX_RETRY_AFTER)
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if self.adaptive and (sent_at is None or sent_at >= self._cut_at):
+                self._set_rate(max(self.min_calls_per_minute, self.rate / 2))
+                self._adjusted_at = self._cut_at = now
+
+    def succeeded(self) -> None:
+        """Record that the API accepted a request, recovering the rate in adaptive mode"""
+        if not self.adaptive or self.rate >= self.calls_per_minute:
+            return
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            recovered = self.calls_per_minute * (now - self._adjusted_at)
+            self._set_rate(
+                min(
+                    self.calls_per_minute, self.rate + recovered / self.recovery_seconds
+                )
+            )
+            self._adjusted_at = now
+
+    def _set_rate(self, rate: float) -> None:
+        """
+        Change the rate, rescaling the tokens owed by queued requests so they're paid back in
+        the time they were reserved for, instead of compounding into a longer wait
+        """
+        if self._tokens < 0:
+            self._tokens *= rate / self.rate
+        self.rate = rate
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens accumulated since the last update"""
+        elapsed = now - self._updated_at
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate / 60)
+        self._updated_at = now
+
+
+@attr.define()
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a request. Requests are retried with an
+    exponential backoff with jitter, unless the API says how long to wait with a
+    `Retry-After` header, which is honored as long as it's no longer than `max_backoff`
+
+    Parameters
+    ----------
+    max_retries
+        The maximum number of times to retry a request
+    backoff
+        The number of seconds to back off before the first retry. Doubled for every retry
+    max_backoff
+        The maximum number of seconds to back off before a retry
+    retry_statuses
+        The status codes of the responses to retry
+    random
+        A function returning a random number between 0 and 1, used for the jitter
+    """
+
+    max_retries: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    retry_statuses: frozenset[int] = frozenset({429, 502, 503, 504})
+    random: Callable[[], float] = random.random
+
+    def delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """
+        Returns the number of seconds to wait before retrying a request, or None if it
+        shouldn't be retried
+
+        Parameters
+        ----------
+        response
+            The response to the request
+        attempt
+            The number of times the request has been retried already
+
+        Returns
+        -------
+        float or None
+        """
+        if response.status_code not in self.retry_statuses:
+            return None
+        if attempt >= self.max_retries:
+            return None
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_backoff else None
+
+        backoff = min(self.max_backoff, self.backoff * 2**attempt)
+        return backoff / 2 + self.random() * backoff / 2
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a `Retry-After` header, given either as a number of seconds or as an HTTP date
+
+    Returns
+    -------
+    float or None
+        The number of seconds to wait, at most `MAX_RETRY_AFTER`, or None if the header is
+        missing or invalid
+    """
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return None
+    return min(max(0.0, seconds), MAX_RETRY_AFTER)
@@ -0,0 +1,72 @@
+from typing import Iterator, Optional
+
+import attr
+import structlog
+
+from notifier.api_client import ApiClientInterface
+from notifier.schemas import Subscription
+from notifier.services import fetch_subscription_changes
+
+logger = structlog.get_logger()
+
+
+@attr.define()
+class SubscriptionReplica:
+    """
+    A local copy of the subscriptions in the Subscription API. After the first sync, which
+    fetches every subscription, only the subscriptions changed since the previous sync are
+    fetched and patched into the replica
+
+    Parameters
+    ----------
+    token
+        The token of the last sync, None if the replica has never been synced
+    """
+
+    token: Optional[str] = None
+    _subscriptions: dict[str, Subscription] = attr.field(factory=dict, init=False)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def __iter__(self) -> Iterator[Subscription]:
+        return iter(self._subscriptions.values())
+
+    def apply(
+        self, updated: list[Subscription], deleted: list[str], next_token: str
+    ) -> None:
+        """
+        Patch the replica with a set of changes. Applying the same changes again is harmless
+
+        Parameters
+        ----------
+        updated
+            The subscriptions created or updated
+        deleted
+            The uuids of the deleted subscriptions
+        next_token
+            The token to fetch the following changes with
+        """
+        for subscription_uuid in deleted:
+            self._subscriptions.pop(subscription_uuid, None)
+        for subscription in updated:
+            self._subscriptions[subscription.subscription_uuid] = subscription
+        self.token = next_token
+
+    def sync(self, client: ApiClientInterface) -> None:
+        """
+        Fetch the changes since the last sync from the Subscription API and apply them
+
+        Parameters
+        ----------
+        client
+            An API client for the Subscription API
+        """
+        updated, deleted, next_token = fetch_subscription_changes(client, self.token)
+        self.apply(updated, deleted, next_token)
+        logger.msg(
+            "Synced subscriptions",
+            n_updated=len(updated),
+            n_deleted=len(deleted),
+            n_subscriptions=len(self),
+        )
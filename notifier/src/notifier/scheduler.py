@@ -0,0 +1,132 @@
+import math
+import time
+import zlib
+from typing import Callable, Literal, Optional
+
+import attr
+import structlog
+
+from notifier.schemas import Location
+
+logger = structlog.get_logger()
+
+MissedTicks = Literal["coalesce", "skip"]
+
+
+def location_slot(location: Location, window: float) -> float:
+    """
+    Return the offset into a cycle at which to fetch the weather of a location. Offsets are
+    spread evenly over the window by a stable hash, so a location is fetched at the same point
+    in every cycle and requests to the weather API are spread out instead of arriving in bursts
+
+    Parameters
+    ----------
+    location
+        The location to find the slot of
+    window
+        The number of seconds to spread the slots over
+
+    Returns
+    -------
+    float
+        The offset in seconds, between 0 and `window`
+    """
+    key = f"{location.city}/{location.country_code}".encode()
+    return zlib.crc32(key) / 2**32 * window
+
+
+@attr.define()
+class CycleScheduler:
+    """
+    Runs a job once per interval, with the ticks aligned to multiples of the interval since the
+    epoch so they don't drift and so every notifier replica ticks at the same time. A cycle
+    never overlaps the previous one. If a cycle overruns the following ticks, they are either
+    coalesced into a single cycle started immediately or skipped until the next tick on time
+
+    Parameters
+    ----------
+    interval
+        The number of seconds between ticks
+    job
+        The job to run every tick. Called with the time of the tick it runs for
+    missed_ticks
+        What to do with ticks missed while a cycle overran, either "coalesce" or "skip"
+    clock
+        A function returning the current unix time in seconds
+    sleep
+        A function sleeping for a number of seconds
+    """
+
+    interval: float
+    job: Callable[[float], None]
+    missed_ticks: MissedTicks = "coalesce"
+    clock: Callable[[], float] = time.time
+    sleep: Callable[[float], None] = time.sleep
+    last_lag: Optional[float] = attr.field(default=None, init=False)
+    last_duration: Optional[float] = attr.field(default=None, init=False)
+
+    def next_tick(self, now: float) -> float:
+        """Returns the first tick after `now`"""
+        return (math.floor(now / self.interval) + 1) * self.interval
+
+    def run_tick(self, tick: float) -> float:
+        """
+        Wait for a tick and run the job for it
+
+        Parameters
+        ----------
+        tick
+            The time of the tick
+
+        Returns
+        -------
+        float
+            The time of the tick to run next
+        """
+        if (wait := tick - self.clock()) > 0:
+            self.sleep(wait)
+
+        start = self.clock()
+        self.last_lag = start - tick
+        try:
+            self.job(tick)
+        except Exception:
+            logger.exception("Cycle failed", tick=tick)
+        end = self.clock()
+        self.last_duration = end - start
+
+        next_tick = tick + self.interval
+        missed = (
+            math.floor((end - next_tick) / self.interval) + 1 if end > next_tick else 0
+        )
+        if missed and self.missed_ticks == "coalesce":
+            # Run the latest missed tick straight away, standing in for all of them
+            next_tick += (missed - 1) * self.interval
+        elif missed:
+            next_tick += missed * self.interval
+
+        logger.msg(
+            "Cycle timing",
+            tick=tick,
+            lag=self.last_lag,
+            duration=self.last_duration,
+            interval=self.interval,
+            missed_ticks=missed,
+            missed_ticks_policy=self.missed_ticks,
+        )
+        return next_tick
+
+    def run(self, max_cycles: Optional[int] = None) -> None:
+        """
+        Run the job every tick, starting from the next tick
+
+        Parameters
+        ----------
+        max_cycles
+            Stop after this many cycles. Runs forever if None
+        """
+        tick = self.next_tick(self.clock())
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            tick = self.run_tick(tick)
+            cycles += 1
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, EmailStr, validator
 
 
@@ -33,6 +35,34 @@ class AlertCondition(BaseModel):
         return v
 
 
+class Location(BaseModel):
+    """
+    Represents a location to fetch weather conditions for. The city and country code are
+    normalized, so that differently cased or spaced spellings of the same location compare equal
+
+    Parameters
+    ----------
+    city
+        The name of the city
+    country_code
+        The country as a 2-digit country code
+    """
+
+    city: str
+    country_code: str
+
+    class Config:
+        frozen = True
+
+    @validator("city")
+    def normalize_city(cls, v):
+        return " ".join(v.split()).lower()
+
+    @validator("country_code")
+    def normalize_country_code(cls, v):
+        return v.strip().upper()
+
+
 class Subscription(BaseModel):
     """
     Represents a given Subscription to weather alerting
@@ -47,12 +77,15 @@ class Subscription(BaseModel):
         The country to alert for as a 2-digit country code
     conditions
         A list of subscribed AlertConditions
+    subscription_uuid
+        The unique id of the subscription in the Subscription API
     """
 
     email: EmailStr
     city: str
     country_code: str
     conditions: list[AlertCondition]
+    subscription_uuid: Optional[str] = None
 
     @validator("country_code")
     def country_code_must_be_2_chars(cls, v):
@@ -60,6 +93,11 @@ class Subscription(BaseModel):
             raise ValueError("Country code must be exactly 2 chars")
         return v
 
+    @property
+    def location(self) -> Location:
+        """The normalized location of the subscription"""
+        return Location(city=self.city, country_code=self.country_code)
+
 
 class WeatherConditions(BaseModel):
     """
@@ -69,3 +107,26 @@ class WeatherConditions(BaseModel):
     temp: float
     pressure: float
     humidity: float
+
+
+class CityWeather(BaseModel):
+    """
+    The weather conditions of a city as returned by the weather API, with the id the weather
+    API knows the city by
+
+    Parameters
+    ----------
+    city_id
+        The OpenWeatherMap id of the city
+    lat
+        The latitude of the city
+    lon
+        The longitude of the city
+    weather
+        The weather conditions of the city
+    """
+
+    city_id: int
+    lat: Optional[float]
+    lon: Optional[float]
+    weather: WeatherConditions
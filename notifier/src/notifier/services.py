@@ -1,9 +1,24 @@
 import operator
-import textwrap
-from typing import Optional, TypedDict
-
-from notifier.api_client import ApiClientInterface
-from notifier.schemas import Subscription, WeatherConditions, AlertCondition
+from typing import Any, Iterable, Iterator, Optional, Sequence, TypedDict
+
+from notifier.api_client import (
+    ApiClientInterface,
+    AsyncApiClientInterface,
+    StreamingApiClientInterface,
+    WritableApiClientInterface,
+)
+from notifier.cache import WeatherCacheInterface
+from notifier.schemas import (
+    AlertCondition,
+    CityWeather,
+    Location,
+    Subscription,
+    WeatherConditions,
+)
+from notifier.templates import render_alert_text, render_html_body, render_text_body
+
+# The maximum number of city ids the weather API's `/group` endpoint accepts per request
+GROUP_MAX_CITY_IDS = 20
 
 
 class AlertDict(TypedDict):
@@ -13,29 +28,226 @@ class AlertDict(TypedDict):
     op: str
 
 
+class DigestSectionDict(TypedDict):
+    city: str
+    country_code: Optional[str]
+    alerts: list[AlertDict]
+    cleared: list[AlertDict]
+
+
 class WeatherConditionDict(TypedDict):
     temp: float
     pressure: float
     humidity: float
 
 
-def fetch_subscriptions(client: ApiClientInterface) -> list[Subscription]:
+def fetch_subscriptions(
+    client: ApiClientInterface, page_size: int = 1000
+) -> Iterator[Subscription]:
+    """
+    Lazily get all subscriptions from the API, one page at a time. The next page is only
+    fetched once the current page has been consumed
+
+    Parameters
+    ----------
+    client
+        An API client which can get data from an API
+    page_size
+        The number of subscriptions to fetch per request
+
+    Returns
+    -------
+    iterator of Subscriptions
+        An iterator over all subscriptions returned from the API
+
+    """
+    cursor = None
+    while True:
+        params = {"limit": page_size}
+        if cursor is not None:
+            params["cursor"] = cursor
+
+        page = client.get("/subscriptions/page", params=params)
+        for data in page["subscriptions"]:
+            yield Subscription.parse_obj(data)
+
+        if (cursor := page["next_cursor"]) is None:
+            return
+
+
+def stream_subscriptions(client: StreamingApiClientInterface) -> Iterator[Subscription]:
     """
-    Get all subscriptions from the API
+    Stream all subscriptions from the API in a single request, parsing each subscription as
+    it arrives
+
+    Parameters
+    ----------
+    client
+        An API client which can stream newline-delimited JSON from an API
+
+    Returns
+    -------
+    iterator of Subscriptions
+        An iterator over all subscriptions returned from the API
+    """
+    for data in client.stream("/subscriptions/stream"):
+        yield Subscription.parse_obj(data)
+
+
+def fetch_subscription_changes(
+    client: ApiClientInterface, since: Optional[str] = None
+) -> tuple[list[Subscription], list[str], str]:
+    """
+    Get the subscriptions changed since a token from the API. Without a token, the snapshot
+    of all subscriptions is fetched page by page, and the token of its first page is
+    returned, so changes made while paging are fetched by the next call
 
     Parameters
     ----------
     client
         An API client which can get data from an API
+    since
+        The token returned with the previous changes. If None, all subscriptions are returned
+
+    Returns
+    -------
+    list of updated Subscriptions, list of deleted subscription uuids and the next token
+    """
+    params = {} if since is None else {"since": since}
+    changes = page = client.get("/subscriptions/changes", params=params)
+    updated = [Subscription.parse_obj(data) for data in page["updated"]]
+    while page.get("next_cursor") is not None:
+        page = client.get(
+            "/subscriptions/changes", params={"cursor": page["next_cursor"]}
+        )
+        updated.extend(Subscription.parse_obj(data) for data in page["updated"])
+    return updated, changes["deleted"], changes["next_token"]
+
+
+def claim_locations(
+    client: WritableApiClientInterface,
+    run_id: str,
+    worker_id: str,
+    batch_size: int = 100,
+    lease_seconds: int = 300,
+) -> dict[int, Location]:
+    """
+    Claim a batch of locations to notify in a run, so no other notifier replica notifies them
+
+    Parameters
+    ----------
+    client
+        An API client for the Subscription API
+    run_id
+        The id of the run, shared by all replicas running the same cycle
+    worker_id
+        The id of this replica
+    batch_size
+        The maximum number of locations to claim
+    lease_seconds
+        The number of seconds until the locations can be claimed by another replica, unless
+        they are completed
+
+    Returns
+    -------
+    dict of lease id to Location
+        The claimed locations. Empty if there are no locations left to claim
+    """
+    batch = client.post(
+        f"/notification-runs/{run_id}/claim",
+        json={
+            "worker_id": worker_id,
+            "batch_size": batch_size,
+            "lease_seconds": lease_seconds,
+        },
+    )
+    return {
+        lease["lease_id"]: Location(
+            city=lease["city"], country_code=lease["country_code"]
+        )
+        for lease in batch["leases"]
+    }
+
+
+def complete_locations(
+    client: WritableApiClientInterface,
+    run_id: str,
+    worker_id: str,
+    lease_ids: Iterable[int],
+) -> None:
+    """
+    Mark claimed locations as notified
+
+    Parameters
+    ----------
+    client
+        An API client for the Subscription API
+    run_id
+        The id of the run the locations were claimed in
+    worker_id
+        The id of this replica
+    lease_ids
+        The lease ids of the notified locations
+    """
+    client.post(
+        f"/notification-runs/{run_id}/complete",
+        json={"worker_id": worker_id, "lease_ids": list(lease_ids)},
+    )
+
+
+def group_subscriptions_by_location(
+    subscriptions: Iterable[Subscription],
+) -> dict[Location, list[Subscription]]:
+    """
+    Group subscriptions by their normalized location, so that the weather for each location
+    only needs to be fetched once per cycle
+
+    Parameters
+    ----------
+    subscriptions
+        The subscriptions to group
+
     Returns
     -------
-    list of Subscriptions
-        A list of all subscriptions returned from the API
+    dict of Location to list of Subscriptions
+        Every unique location mapped to the subscriptions for that location, in the order
+        they were first seen
+    """
+    grouped: dict[Location, list[Subscription]] = {}
+    for subscription in subscriptions:
+        grouped.setdefault(subscription.location, []).append(subscription)
+    return grouped
+
+
+def weather_query_params(
+    client: ApiClientInterface | AsyncApiClientInterface,
+    city: str,
+    country_code: Optional[str] = None,
+) -> dict[str, str]:
+    """
+    Build the query parameters for fetching the weather conditions of a location
 
+    Parameters
+    ----------
+    client
+        The client used to call the weather api
+    city
+        The city to fetch the data for
+    country_code
+        An optional country code to get the correct city in case of multiple cities with the same
+        name in different countries
+
+    Returns
+    -------
+    dict
+        The query parameters to send to the `/weather` endpoint
     """
-    # TODO: Implement streaming responses / paginated batches
-    subscription_data = client.get("/subscriptions")
-    return [Subscription.parse_obj(data) for data in subscription_data]
+    query = city
+
+    if country_code:
+        query = f"{query},{country_code}"
+
+    return {"appid": client.auth.api_key, "q": query, "units": "metric"}
 
 
 def fetch_weather(
@@ -59,20 +271,251 @@ def fetch_weather(
     WeatherConditions
 
     """
-    query = city
+    data = client.get(
+        "/weather", params=weather_query_params(client, city, country_code)
+    )
 
-    if country_code:
-        query = f"{query},{country_code}"
+    return WeatherConditions.parse_obj(data["main"])
 
-    data = client.get(
-        "/weather", params={"appid": client.auth.api_key, "q": query, "units": "metric"}
+
+async def fetch_weather_async(
+    client: AsyncApiClientInterface, city: str, country_code: Optional[str] = None
+) -> WeatherConditions:
+    """
+    Asynchronously get the weather conditions for a given location
+
+    Parameters
+    ----------
+    client
+        An instance of an AsyncApiClient which can get data from the weather api
+    city
+        The city to fetch the data for
+    country_code
+        An optional country code to get the correct city in case of multiple cities with the same
+        name in different countries
+
+    Returns
+    -------
+    WeatherConditions
+    """
+    data = await client.get(
+        "/weather", params=weather_query_params(client, city, country_code)
     )
 
     return WeatherConditions.parse_obj(data["main"])
 
 
+def parse_city_weather(data: dict[str, Any]) -> CityWeather:
+    """Parse the weather of a city as returned by the `/weather` and `/group` endpoints"""
+    coord = data.get("coord", {})
+    return CityWeather(
+        city_id=data["id"],
+        lat=coord.get("lat"),
+        lon=coord.get("lon"),
+        weather=WeatherConditions.parse_obj(data["main"]),
+    )
+
+
+def group_query_params(
+    client: ApiClientInterface | AsyncApiClientInterface, city_ids: Sequence[int]
+) -> dict[str, str]:
+    """
+    Build the query parameters for fetching the weather conditions of several cities
+
+    Parameters
+    ----------
+    client
+        The client used to call the weather api
+    city_ids
+        The OpenWeatherMap ids of the cities, at most `GROUP_MAX_CITY_IDS`
+
+    Raises
+    ------
+    ValueError
+        Raised if there are too many city ids for one request
+
+    Returns
+    -------
+    dict
+        The query parameters to send to the `/group` endpoint
+    """
+    if len(city_ids) > GROUP_MAX_CITY_IDS:
+        raise ValueError(
+            f"At most {GROUP_MAX_CITY_IDS} city ids can be fetched per request"
+        )
+    return {
+        "appid": client.auth.api_key,
+        "id": ",".join(map(str, city_ids)),
+        "units": "metric",
+    }
+
+
+def fetch_city_weather(
+    client: ApiClientInterface, city: str, country_code: Optional[str] = None
+) -> CityWeather:
+    """
+    Get the weather conditions for a location by name, along with the city id the weather
+    API resolved the name to
+
+    Parameters
+    ----------
+    client
+        An instance of an ApiClient which can get data from the weather api
+    city
+        The city to fetch the data for
+    country_code
+        An optional country code to get the correct city in case of multiple cities with the same
+        name in different countries
+
+    Returns
+    -------
+    CityWeather
+    """
+    data = client.get(
+        "/weather", params=weather_query_params(client, city, country_code)
+    )
+    return parse_city_weather(data)
+
+
+async def fetch_city_weather_async(
+    client: AsyncApiClientInterface, city: str, country_code: Optional[str] = None
+) -> CityWeather:
+    """
+    Asynchronously get the weather conditions for a location by name, along with the city
+    id the weather API resolved the name to
+
+    Parameters
+    ----------
+    client
+        An instance of an AsyncApiClient which can get data from the weather api
+    city
+        The city to fetch the data for
+    country_code
+        An optional country code to get the correct city in case of multiple cities with the same
+        name in different countries
+
+    Returns
+    -------
+    CityWeather
+    """
+    data = await client.get(
+        "/weather", params=weather_query_params(client, city, country_code)
+    )
+    return parse_city_weather(data)
+
+
+def fetch_weather_group(
+    client: ApiClientInterface, city_ids: Sequence[int]
+) -> dict[int, CityWeather]:
+    """
+    Get the weather conditions of up to `GROUP_MAX_CITY_IDS` cities in a single request
+
+    Parameters
+    ----------
+    client
+        An instance of an ApiClient which can get data from the weather api
+    city_ids
+        The OpenWeatherMap ids of the cities
+
+    Returns
+    -------
+    dict of city id to CityWeather
+        The weather of every city the weather API returned. Unknown ids are left out
+    """
+    data = client.get("/group", params=group_query_params(client, city_ids))
+    return {
+        city_weather.city_id: city_weather
+        for city_weather in map(parse_city_weather, data["list"])
+    }
+
+
+async def fetch_weather_group_async(
+    client: AsyncApiClientInterface, city_ids: Sequence[int]
+) -> dict[int, CityWeather]:
+    """
+    Asynchronously get the weather conditions of up to `GROUP_MAX_CITY_IDS` cities in a
+    single request
+
+    Parameters
+    ----------
+    client
+        An instance of an AsyncApiClient which can get data from the weather api
+    city_ids
+        The OpenWeatherMap ids of the cities
+
+    Returns
+    -------
+    dict of city id to CityWeather
+        The weather of every city the weather API returned. Unknown ids are left out
+    """
+    data = await client.get("/group", params=group_query_params(client, city_ids))
+    return {
+        city_weather.city_id: city_weather
+        for city_weather in map(parse_city_weather, data["list"])
+    }
+
+
+def fetch_cached_weather(
+    client: ApiClientInterface, cache: WeatherCacheInterface, location: Location
+) -> WeatherConditions:
+    """
+    Get the weather conditions for a location, only calling the weather API if the location
+    isn't in the cache or the cached value has expired
+
+    Parameters
+    ----------
+    client
+        An instance of an ApiClient which can get data from the weather api
+    cache
+        The cache to look up and store weather conditions in
+    location
+        The location to fetch the weather for
+
+    Returns
+    -------
+    WeatherConditions
+    """
+    if (weather := cache.get(location)) is not None:
+        return weather
+
+    weather = fetch_weather(client, location.city, location.country_code)
+    cache.set(location, weather)
+    return weather
+
+
+async def fetch_cached_weather_async(
+    client: AsyncApiClientInterface, cache: WeatherCacheInterface, location: Location
+) -> WeatherConditions:
+    """
+    Asynchronously get the weather conditions for a location, only calling the weather API
+    if the location isn't in the cache or the cached value has expired
+
+    Parameters
+    ----------
+    client
+        An instance of an AsyncApiClient which can get data from the weather api
+    cache
+        The cache to look up and store weather conditions in
+    location
+        The location to fetch the weather for
+
+    Returns
+    -------
+    WeatherConditions
+    """
+    if (weather := cache.get(location)) is not None:
+        return weather
+
+    weather = await fetch_weather_async(client, location.city, location.country_code)
+    cache.set(location, weather)
+    return weather
+
+
 def format_alert_message(
-    alert: AlertDict, city: str, country_code: Optional[str] = None
+    alert: AlertDict,
+    city: str,
+    country_code: Optional[str] = None,
+    cleared: bool = False,
 ) -> str:
     """
     Returns a formatted string with for the alert. Used to format the message appropriately
@@ -86,33 +529,22 @@ def format_alert_message(
         The city in which the alert took place
     country_code
         The country in which the alert took place
+    cleared
+        Whether the alert is no longer triggered
 
     Returns
     -------
     str
         The formatted alert message string
     """
-    op_mappings = {
-        "gt": "greater than",
-        "ge": "greater than or equal to",
-        "lt": "less than",
-        "le": "less than or equal to",
-        "eq": "equal to",
-    }
-
-    location = city if country_code is None else f"{city}, {country_code}"
-    str_op = op_mappings[alert["op"]]
-
-    return textwrap.dedent(
-        f"""
-            The {alert['condition']} in {location} is now {alert['actual']}.
-            This is {str_op} your threshold of {alert['threshold']}
-         """
-    )
+    return render_alert_text(alert, city, country_code, cleared)
 
 
 def format_email_body(
-    alerts: list[AlertDict], city: str, country_code: Optional[str] = None
+    alerts: list[AlertDict],
+    city: str,
+    country_code: Optional[str] = None,
+    cleared: Sequence[AlertDict] = (),
 ) -> str:
     """
     Format the body of the email with all alerts
@@ -125,26 +557,59 @@ def format_email_body(
         The city where the alert took place
     country_code
         Optionally, the country where the alert took place
+    cleared
+        A list of the alerts which are no longer triggered
 
     Returns
     -------
     str
         The formatted email body
     """
-    notifications = "\n".join(
-        format_alert_message(alert, city=city, country_code=country_code)
-        for alert in alerts
+    return format_digest_body(
+        [
+            {
+                "city": city,
+                "country_code": country_code,
+                "alerts": alerts,
+                "cleared": list(cleared),
+            }
+        ]
     )
 
-    return textwrap.dedent(
-        f"""
-Hello,
 
-You've received the following weather notifications:
+def format_digest_body(sections: Sequence[DigestSectionDict]) -> str:
+    """
+    Format the body of an email with the alerts of several locations, so a subscriber is
+    sent one email for all of their subscriptions
 
-{notifications}
-"""
-    )
+    Parameters
+    ----------
+    sections
+        The alerts and cleared alerts of each location, in the order to list them
+
+    Returns
+    -------
+    str
+        The formatted email body
+    """
+    return render_text_body(sections)
+
+
+def format_digest_html(sections: Sequence[DigestSectionDict]) -> str:
+    """
+    Format the HTML alternative of the body of an email with the alerts of several locations
+
+    Parameters
+    ----------
+    sections
+        The alerts and cleared alerts of each location, in the order to list them
+
+    Returns
+    -------
+    str
+        The formatted HTML email body
+    """
+    return render_html_body(sections)
 
 
 def compare_threshold(
@@ -1,10 +1,58 @@
-from pydantic import BaseSettings, AnyHttpUrl, SecretStr
+import os
+import socket
+from typing import Literal, Optional
+
+from pydantic import BaseSettings, AnyHttpUrl, Field, SecretStr
+
+
+def default_worker_id() -> str:
+    """Identify this notifier replica by its hostname and process id"""
+    return f"{socket.gethostname()}-{os.getpid()}"
 
 
 class Settings(BaseSettings):
     subscription_api_url: AnyHttpUrl
     api_key: SecretStr
     smtp_host: str
+    subscription_page_size: int = 1000
+    stream_subscriptions: bool = False
+    sync_subscriptions: bool = False
+    weather_cache_ttl: int = 600
+    weather_cache_max_size: int = 10_000
+    weather_cache_path: Optional[str] = None
+    http_timeout: float = 5.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http2: bool = False
+    group_weather_requests: bool = False
+    weather_calls_per_minute: Optional[float] = Field(None, gt=0)
+    weather_burst: int = Field(10, ge=1)
+    adaptive_rate_limit: bool = False
+    weather_max_retries: int = Field(3, ge=0)
+    weather_backoff_seconds: float = 0.5
+    weather_max_backoff_seconds: float = 30.0
+    async_mode: bool = False
+    max_concurrent_requests: int = 50
+    max_concurrent_emails: int = 10
+    alert_cooldown_seconds: int = Field(3600, ge=0)
+    alert_state_path: Optional[str] = None
+    digest_emails: bool = False
+    html_emails: bool = False
+    outbox_path: Optional[str] = None
+    outbox_batch_size: int = Field(100, ge=1)
+    outbox_max_attempts: int = Field(8, ge=1)
+    outbox_lease_seconds: int = 300
+    outbox_poll_seconds: float = 1.0
+    metrics_port: Optional[int] = Field(None, ge=1, le=65535)
+    sender_metrics_port: Optional[int] = Field(None, ge=1, le=65535)
+    shards: int = Field(1, ge=1)
+    schedule_minutes: int = 1
+    missed_ticks: Literal["coalesce", "skip"] = "coalesce"
+    spread_fraction: float = Field(0.0, ge=0, le=1)
+    work_leasing: bool = False
+    worker_id: str = Field(default_factory=default_worker_id)
+    lease_batch_size: int = 100
+    lease_seconds: int = 300
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,148 @@
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Mapping, Sequence, TypeVar
+
+import attr
+
+from notifier.schemas import Location, Subscription
+
+T = TypeVar("T")
+
+
+def shard_of(location: Location, n_shards: int) -> int:
+    """
+    Return the shard owning a location. Uses a stable hash, so a location is owned by the same
+    shard in every process and every cycle
+
+    Parameters
+    ----------
+    location
+        The location to find the shard of
+    n_shards
+        The total number of shards
+
+    Returns
+    -------
+    int
+        The index of the shard, between 0 and `n_shards - 1`
+    """
+    key = f"{location.city}/{location.country_code}".encode()
+    return zlib.crc32(key) % n_shards
+
+
+def partition_locations(
+    subscriptions_by_location: Mapping[Location, Sequence[Subscription]],
+    n_shards: int,
+) -> list[dict[Location, list[Subscription]]]:
+    """
+    Split subscriptions grouped by location into one group per shard
+
+    Parameters
+    ----------
+    subscriptions_by_location
+        The subscriptions to split, grouped by location
+    n_shards
+        The number of shards to split into
+
+    Returns
+    -------
+    list of dicts of Location to list of Subscriptions
+        The subscriptions owned by each shard, grouped by location
+    """
+    shards: list[dict[Location, list[Subscription]]] = [{} for _ in range(n_shards)]
+    for location, subscriptions in subscriptions_by_location.items():
+        shards[shard_of(location, n_shards)][location] = list(subscriptions)
+    return shards
+
+
+@attr.define(frozen=True)
+class ShardMetrics:
+    """
+    The result of running one shard of a cycle
+
+    Parameters
+    ----------
+    shard
+        The index of the shard
+    unique_locations
+        The number of locations processed by the shard
+    subscriptions_processed
+        The number of subscriptions processed by the shard
+    subscriptions_changed
+        The number of subscriptions whose alerts triggered or cleared
+    duration
+        The number of seconds the shard took
+    """
+
+    shard: int
+    unique_locations: int
+    subscriptions_processed: int
+    subscriptions_changed: int
+    duration: float
+
+
+@attr.define()
+class ShardPool:
+    """
+    A pool of worker processes with one process per shard. Each shard is always run in the
+    same process, so per-process state such as a weather cache is kept between cycles. Use it
+    as a context manager or call `close` when done
+
+    Parameters
+    ----------
+    n_shards
+        The number of shards and worker processes
+    initializer
+        Called once in each worker process when it starts
+    initargs
+        The arguments to call `initializer` with
+    """
+
+    n_shards: int
+    initializer: Callable[..., None]
+    initargs: tuple = ()
+    _executors: list[ProcessPoolExecutor] = attr.field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._executors = [
+            ProcessPoolExecutor(
+                max_workers=1, initializer=self.initializer, initargs=self.initargs
+            )
+            for _ in range(self.n_shards)
+        ]
+
+    def __enter__(self) -> "ShardPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def run(
+        self, func: Callable[..., T], shard_args: Sequence[Sequence[Any]]
+    ) -> list[T]:
+        """
+        Run `func` once per shard in the shard's worker process, waiting for all shards to
+        finish. Shard `i` is called with `func(i, *shard_args[i])`
+
+        Parameters
+        ----------
+        func
+            The function to run. Must be picklable, i.e. defined at the top level of a module
+        shard_args
+            The arguments to pass to each shard
+
+        Returns
+        -------
+        list
+            The result of each shard, in shard order
+        """
+        futures = [
+            executor.submit(func, shard, *args)
+            for shard, (executor, args) in enumerate(zip(self._executors, shard_args))
+        ]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Shut down all worker processes"""
+        for executor in self._executors:
+            executor.shutdown()
@@ -0,0 +1,185 @@
+"""
+The templates of the notification emails. The templates are written as `string.Template`s and
+compiled into format strings once when the module is imported, and each rendered alert line is
+memoized, as the subscribers of a location share the same weather and mostly the same
+thresholds
+"""
+import html
+from functools import lru_cache
+from string import Template
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
+
+if TYPE_CHECKING:
+    from notifier.services import AlertDict, DigestSectionDict
+
+
+def compile_template(template: Template) -> Callable[..., str]:
+    """
+    Compile a template into the `format` method of an equivalent format string, which
+    substitutes the placeholders without matching the template's pattern every time
+
+    Parameters
+    ----------
+    template
+        The template to compile
+
+    Returns
+    -------
+    callable
+        Renders the template given the placeholders as keyword arguments
+    """
+    parts, position = [], 0
+    for match in template.pattern.finditer(template.template):
+        start = match.start()
+        literal = template.template[position:start]
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if match.group("escaped") is not None:
+            parts.append(template.delimiter)
+        elif (name := match.group("named") or match.group("braced")) is not None:
+            parts.append(f"{{{name}}}")
+        else:
+            raise ValueError(f"Invalid placeholder in template: {template.template!r}")
+        position = match.end()
+    literal = template.template[position:]
+    parts.append(literal.replace("{", "{{").replace("}", "}}"))
+    return "".join(parts).format
+
+
+OP_DESCRIPTIONS = {
+    "gt": "greater than",
+    "ge": "greater than or equal to",
+    "lt": "less than",
+    "le": "less than or equal to",
+    "eq": "equal to",
+    "ne": "not equal to",
+}
+
+ALERT_TEXT = compile_template(
+    Template(
+        "\nThe $condition in $location is now $actual.\n"
+        "This is $op your threshold of $threshold\n"
+    )
+)
+BODY_TEXT = compile_template(
+    Template(
+        "\nHello,\n\nYou've received the following weather notifications:\n\n$alerts\n"
+    )
+)
+ALERT_HTML = compile_template(
+    Template(
+        "<li>The $condition in $location is now $actual. "
+        "This is $op your threshold of $threshold</li>"
+    )
+)
+BODY_HTML = compile_template(
+    Template(
+        "<html>\n<body>\n<p>Hello,</p>\n"
+        "<p>You've received the following weather notifications:</p>\n"
+        "<ul>\n$alerts\n</ul>\n</body>\n</html>\n"
+    )
+)
+
+# The number of rendered alert lines to keep. Only the lines of the current cycle's weather
+# are reused, so this only needs to hold the distinct alerts of one cycle
+ALERT_CACHE_SIZE = 100_000
+
+
+@lru_cache(maxsize=ALERT_CACHE_SIZE, typed=True)
+def render_alert(
+    condition: str,
+    op: str,
+    threshold: float,
+    actual: float,
+    city: str,
+    country_code: Optional[str],
+    cleared: bool = False,
+    as_html: bool = False,
+) -> str:
+    """
+    Render the line of an alert, as plain text or as an HTML list item
+
+    Parameters
+    ----------
+    condition
+        The weather condition of the alert
+    op
+        The comparison of the alert
+    threshold
+        The threshold of the alert
+    actual
+        The actual weather condition
+    city
+        The city in which the alert took place
+    country_code
+        The country in which the alert took place
+    cleared
+        Whether the alert is no longer triggered
+    as_html
+        Whether to render an HTML list item instead of plain text
+
+    Returns
+    -------
+    str
+    """
+    location = city if country_code is None else f"{city}, {country_code}"
+    description = OP_DESCRIPTIONS[op]
+    if cleared:
+        description = f"no longer {description}"
+
+    template = ALERT_TEXT
+    if as_html:
+        template = ALERT_HTML
+        condition, location = html.escape(condition), html.escape(location)
+    return template(
+        condition=condition,
+        location=location,
+        actual=actual,
+        op=description,
+        threshold=threshold,
+    )
+
+
+def render_alerts(
+    sections: Sequence["DigestSectionDict"], as_html: bool = False
+) -> list[str]:
+    """Render the alert lines of each section, triggered alerts before cleared alerts"""
+    return [
+        render_alert(
+            alert["condition"],
+            alert["op"],
+            alert["threshold"],
+            alert["actual"],
+            section["city"],
+            section["country_code"],
+            cleared,
+            as_html,
+        )
+        for section in sections
+        for alerts, cleared in ((section["alerts"], False), (section["cleared"], True))
+        for alert in alerts
+    ]
+
+
+def render_text_body(sections: Sequence["DigestSectionDict"]) -> str:
+    """Render the plain text body of an email with the alerts of each section"""
+    return BODY_TEXT(alerts="\n".join(render_alerts(sections)))
+
+
+def render_html_body(sections: Sequence["DigestSectionDict"]) -> str:
+    """Render the HTML body of an email with the alerts of each section"""
+    return BODY_HTML(alerts="\n".join(render_alerts(sections, as_html=True)))
+
+
+def render_alert_text(
+    alert: "AlertDict", city: str, country_code: Optional[str], cleared: bool
+) -> str:
+    """Render the plain text line of a single alert"""
+    return render_alert(
+        alert["condition"],
+        alert["op"],
+        alert["threshold"],
+        alert["actual"],
+        city,
+        country_code,
+        cleared,
+    )
@@ -0,0 +1,272 @@
+import bisect
+from typing import Hashable, Iterable, Iterator
+
+import attr
+
+from notifier.schemas import Location, Subscription, WeatherConditions
+from notifier.services import AlertDict
+
+
+@attr.define()
+class SortedThresholds:
+    """
+    The thresholds of all conditions with the same location, weather condition and op,
+    kept sorted so the triggered conditions can be found by bisecting
+
+    Parameters
+    ----------
+    thresholds
+        The sorted thresholds
+    keys
+        The key of the subscription each threshold belongs to
+    """
+
+    thresholds: list[float] = attr.field(factory=list)
+    keys: list[Hashable] = attr.field(factory=list)
+
+    def __len__(self) -> int:
+        return len(self.thresholds)
+
+    @classmethod
+    def from_unsorted(
+        cls, thresholds: list[float], keys: list[Hashable]
+    ) -> "SortedThresholds":
+        """Sort thresholds and their keys at once, instead of inserting them one by one"""
+        order = sorted(range(len(thresholds)), key=thresholds.__getitem__)
+        return cls(
+            thresholds=[thresholds[i] for i in order], keys=[keys[i] for i in order]
+        )
+
+    def insert(self, threshold: float, key: Hashable) -> None:
+        """Insert a threshold, keeping the thresholds sorted"""
+        i = bisect.bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.keys.insert(i, key)
+
+    def remove(self, threshold: float, key: Hashable) -> None:
+        """Remove a threshold belonging to the subscription `key`"""
+        lo = bisect.bisect_left(self.thresholds, threshold)
+        hi = bisect.bisect_right(self.thresholds, threshold)
+        i = self.keys.index(key, lo, hi)
+        del self.thresholds[i]
+        del self.keys[i]
+
+    def triggered(self, op: str, actual: float) -> Iterator[tuple[float, Hashable]]:
+        """
+        Find the thresholds which trigger an alert when compared with the actual value
+
+        Parameters
+        ----------
+        op
+            The comparison all thresholds use
+        actual
+            The actual value of the weather condition
+
+        Returns
+        -------
+        iterator of threshold and key pairs
+        """
+        lo = bisect.bisect_left(self.thresholds, actual)
+        hi = bisect.bisect_right(self.thresholds, actual)
+
+        # `actual op threshold` holds for the thresholds in these slices
+        slices = {
+            "gt": [slice(0, lo)],
+            "ge": [slice(0, hi)],
+            "lt": [slice(hi, None)],
+            "le": [slice(lo, None)],
+            "eq": [slice(lo, hi)],
+            "ne": [slice(0, lo), slice(hi, None)],
+        }[op]
+
+        for s in slices:
+            yield from zip(self.thresholds[s], self.keys[s])
+
+
+@attr.define()
+class ThresholdIndex:
+    """
+    An index of alert conditions, per location, weather condition and op. Finding the
+    subscriptions triggered by a weather reading takes O(log n + hits) instead of evaluating
+    every condition. Subscriptions can be inserted and removed as they change.
+
+    The AlertEvaluator builds one index per cycle to find the triggered conditions
+    """
+
+    _buckets: dict[Location, dict[tuple[str, str], SortedThresholds]] = attr.field(
+        factory=dict, init=False
+    )
+    _subscriptions: dict[Hashable, Subscription] = attr.field(factory=dict, init=False)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._subscriptions
+
+    @property
+    def n_conditions(self) -> int:
+        """The number of indexed conditions"""
+        return sum(
+            len(bucket)
+            for location_buckets in self._buckets.values()
+            for bucket in location_buckets.values()
+        )
+
+    @classmethod
+    def build(
+        cls, subscriptions: Iterable[tuple[Hashable, Subscription]]
+    ) -> "ThresholdIndex":
+        """
+        Index many subscriptions at once, sorting each bucket once instead of inserting
+        every condition into a sorted list
+
+        Parameters
+        ----------
+        subscriptions
+            Pairs of unique key and subscription to index
+
+        Raises
+        ------
+        ValueError
+            Raised if a key is repeated
+
+        Returns
+        -------
+        ThresholdIndex
+        """
+        index = cls()
+        unsorted: dict[Location, dict[tuple[str, str], tuple[list, list]]] = {}
+        # Comparing locations is slow, so look them up once per spelling
+        buckets_by_spelling: dict[tuple[str, str], dict] = {}
+        for key, subscription in subscriptions:
+            if key in index._subscriptions:
+                raise ValueError(f"Repeated subscription key: {key!r}")
+            index._subscriptions[key] = subscription
+            spelling = (subscription.city, subscription.country_code)
+            location_buckets = buckets_by_spelling.get(spelling)
+            if location_buckets is None:
+                location_buckets = unsorted.setdefault(subscription.location, {})
+                buckets_by_spelling[spelling] = location_buckets
+            for condition in subscription.conditions:
+                thresholds, keys = location_buckets.setdefault(
+                    (condition.condition, condition.op), ([], [])
+                )
+                thresholds.append(condition.threshold)
+                keys.append(key)
+
+        index._buckets = {
+            location: {
+                bucket_key: SortedThresholds.from_unsorted(thresholds, keys)
+                for bucket_key, (thresholds, keys) in location_buckets.items()
+            }
+            for location, location_buckets in unsorted.items()
+            if location_buckets
+        }
+        return index
+
+    def get(self, key: Hashable) -> Subscription:
+        """Get an indexed subscription by its key"""
+        return self._subscriptions[key]
+
+    def insert(self, key: Hashable, subscription: Subscription) -> None:
+        """
+        Index the conditions of a subscription. Replaces the subscription if the key is
+        already indexed
+
+        Parameters
+        ----------
+        key
+            A unique key identifying the subscription
+        subscription
+            The subscription to index
+        """
+        if key in self._subscriptions:
+            self.remove(key)
+
+        self._subscriptions[key] = subscription
+        location_buckets = self._buckets.setdefault(subscription.location, {})
+        for condition in subscription.conditions:
+            bucket = location_buckets.setdefault(
+                (condition.condition, condition.op), SortedThresholds()
+            )
+            bucket.insert(condition.threshold, key)
+
+    def remove(self, key: Hashable) -> None:
+        """
+        Remove a subscription and its conditions from the index
+
+        Parameters
+        ----------
+        key
+            The key of the subscription to remove
+
+        Raises
+        ------
+        KeyError
+            Raised if the key isn't indexed
+        """
+        subscription = self._subscriptions.pop(key)
+        location_buckets = self._buckets[subscription.location]
+        for condition in subscription.conditions:
+            bucket_key = (condition.condition, condition.op)
+            location_buckets[bucket_key].remove(condition.threshold, key)
+            if not location_buckets[bucket_key]:
+                del location_buckets[bucket_key]
+        if not location_buckets:
+            del self._buckets[subscription.location]
+
+    def triggered_conditions(
+        self, location: Location, weather: WeatherConditions
+    ) -> Iterator[tuple[Hashable, str, str, float]]:
+        """
+        Find the conditions at a location triggered by the weather, without building alerts
+
+        Parameters
+        ----------
+        location
+            The location of the weather reading
+        weather
+            The weather reading
+
+        Returns
+        -------
+        iterator of key, condition, op and threshold tuples
+        """
+        for (condition, op), bucket in self._buckets.get(location, {}).items():
+            actual = getattr(weather, condition)
+            for threshold, key in bucket.triggered(op, actual):
+                yield key, condition, op, threshold
+
+    def triggered(
+        self, location: Location, weather: WeatherConditions
+    ) -> dict[Hashable, list[AlertDict]]:
+        """
+        Find the subscriptions at a location triggered by the weather
+
+        Parameters
+        ----------
+        location
+            The location of the weather reading
+        weather
+            The weather reading
+
+        Returns
+        -------
+        dict of key to list of alert dicts
+            The alerts of every triggered subscription. Subscriptions without alerts
+            are not included
+        """
+        alerts: dict[Hashable, list[AlertDict]] = {}
+        for (condition, op), bucket in self._buckets.get(location, {}).items():
+            actual = getattr(weather, condition)
+            for threshold, key in bucket.triggered(op, actual):
+                alerts.setdefault(key, []).append(
+                    {
+                        "condition": condition,
+                        "op": op,
+                        "threshold": threshold,
+                        "actual": actual,
+                    }
+                )
+        return alerts
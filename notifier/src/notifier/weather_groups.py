@@ -0,0 +1,293 @@
+import asyncio
+from typing import Awaitable, Callable, Iterable, Optional, Sequence
+
+import attr
+import httpx
+import structlog
+
+from notifier.api_client import (
+    ApiClientInterface,
+    AsyncApiClientInterface,
+    WritableApiClientInterface,
+)
+from notifier.cache import WeatherCacheInterface
+from notifier.schemas import CityWeather, Location, WeatherConditions
+from notifier.services import (
+    GROUP_MAX_CITY_IDS,
+    fetch_city_weather,
+    fetch_city_weather_async,
+    fetch_weather_group,
+    fetch_weather_group_async,
+)
+
+logger = structlog.get_logger()
+
+
+@attr.define()
+class CityIds:
+    """
+    The OpenWeatherMap city ids of locations, as stored by the Subscription API. Locations
+    without a city id are resolved by fetching their weather by name once, and the resolved
+    ids are saved back to the Subscription API so later cycles and other replicas can fetch
+    them in groups
+
+    Parameters
+    ----------
+    city_ids
+        The city id of each location with a known city id
+    location_ids
+        The Subscription API id of each location
+    """
+
+    city_ids: dict[Location, int] = attr.field(factory=dict)
+    location_ids: dict[Location, int] = attr.field(factory=dict)
+    _resolved: dict[Location, CityWeather] = attr.field(factory=dict, init=False)
+
+    @classmethod
+    def load(cls, client: ApiClientInterface) -> "CityIds":
+        """Load the city ids of all locations from the Subscription API"""
+        city_ids, location_ids = {}, {}
+        for data in client.get("/locations"):
+            location = Location(city=data["city"], country_code=data["country_code"])
+            location_ids[location] = data["id"]
+            if data["owm_city_id"] is not None:
+                city_ids[location] = data["owm_city_id"]
+        return cls(city_ids=city_ids, location_ids=location_ids)
+
+    def get(self, location: Location) -> Optional[int]:
+        """Returns the city id of a location, or None if it isn't known yet"""
+        return self.city_ids.get(location)
+
+    def resolve(self, location: Location, city_weather: CityWeather) -> None:
+        """Record the city id a location was resolved to by fetching it by name"""
+        self.city_ids[location] = city_weather.city_id
+        self._resolved[location] = city_weather
+
+    def save(self, client: WritableApiClientInterface) -> list[Location]:
+        """
+        Save the city ids resolved since the last save to the Subscription API. Locations the
+        API doesn't know are skipped. Failures, including updates the API accepted without
+        storing the city id, are logged, as the ids are only an optimization and will be
+        resolved again next cycle
+
+        Returns
+        -------
+        list of Locations
+            The locations whose city ids weren't saved
+        """
+        resolved, self._resolved = self._resolved, {}
+        unsaved = []
+        for location, city_weather in resolved.items():
+            if (location_id := self.location_ids.get(location)) is None:
+                continue
+            log = logger.bind(
+                location_city=location.city,
+                location_country_code=location.country_code,
+                city_id=city_weather.city_id,
+            )
+            try:
+                saved = client.put(
+                    f"/locations/{location_id}",
+                    json={
+                        "owm_city_id": city_weather.city_id,
+                        "lat": city_weather.lat,
+                        "lon": city_weather.lon,
+                    },
+                )
+            except httpx.HTTPStatusError as e:
+                log.msg("Saving city id failed", status_code=e.response.status_code)
+                unsaved.append(location)
+                continue
+            except Exception:
+                log.exception("Saving city id failed")
+                unsaved.append(location)
+                continue
+            if not saved or saved.get("owm_city_id") != city_weather.city_id:
+                log.msg("City id not stored by the Subscription API", saved=saved)
+                unsaved.append(location)
+        return unsaved
+
+
+@attr.define()
+class WeatherRequests:
+    """
+    The weather requests needed to fetch the weather of some locations
+
+    Parameters
+    ----------
+    groups
+        The city ids of each `/group` request, mapped to the locations of each city id
+    by_name
+        The locations without a city id, fetched by name one request each
+    """
+
+    groups: list[dict[int, list[Location]]]
+    by_name: list[Location]
+
+    @classmethod
+    def plan(
+        cls, locations: Iterable[Location], city_ids: CityIds
+    ) -> "WeatherRequests":
+        """
+        Split locations into groups of up to `GROUP_MAX_CITY_IDS` city ids, keeping the order
+        of the locations, and the locations without a city id
+        """
+        groups: list[dict[int, list[Location]]] = []
+        by_name = []
+        for location in locations:
+            if (city_id := city_ids.get(location)) is None:
+                by_name.append(location)
+                continue
+            if not groups or (
+                len(groups[-1]) == GROUP_MAX_CITY_IDS and city_id not in groups[-1]
+            ):
+                groups.append({})
+            groups[-1].setdefault(city_id, []).append(location)
+        return cls(groups=groups, by_name=by_name)
+
+
+def fetch_weather_grouped(
+    client: ApiClientInterface,
+    cache: WeatherCacheInterface,
+    locations: Sequence[Location],
+    city_ids: CityIds,
+    wait_for: Callable[[Location], None] = lambda location: None,
+) -> dict[Location, WeatherConditions]:
+    """
+    Get the weather of many locations, fetching up to `GROUP_MAX_CITY_IDS` locations per
+    request from the `/group` endpoint. Locations without a known city id, or which the group
+    endpoint doesn't return, are fetched by name and their city ids recorded in `city_ids`
+
+    Parameters
+    ----------
+    client
+        An instance of an ApiClient which can get data from the weather api
+    cache
+        The cache to look up and store weather conditions in
+    locations
+        The locations to fetch the weather for, in the order to fetch them
+    city_ids
+        The known city ids
+    wait_for
+        Called with the first location of each request before sending it
+
+    Returns
+    -------
+    dict of Location to WeatherConditions
+    """
+    weather = {}
+    for location in locations:
+        if (cached := cache.get(location)) is not None:
+            weather[location] = cached
+
+    requests = WeatherRequests.plan(
+        (location for location in locations if location not in weather), city_ids
+    )
+    missing = list(requests.by_name)
+    for group in requests.groups:
+        wait_for(next(iter(group.values()))[0])
+        fetched = fetch_weather_group(client, list(group))
+        for city_id, group_locations in group.items():
+            if (city_weather := fetched.get(city_id)) is None:
+                missing.extend(group_locations)
+                continue
+            for location in group_locations:
+                weather[location] = city_weather.weather
+                cache.set(location, city_weather.weather)
+
+    for location in missing:
+        wait_for(location)
+        city_weather = fetch_city_weather(client, location.city, location.country_code)
+        city_ids.resolve(location, city_weather)
+        weather[location] = city_weather.weather
+        cache.set(location, city_weather.weather)
+
+    log_weather_requests(len(locations), len(requests.groups), len(missing))
+    return weather
+
+
+async def fetch_weather_grouped_async(
+    client: AsyncApiClientInterface,
+    cache: WeatherCacheInterface,
+    locations: Sequence[Location],
+    city_ids: CityIds,
+    wait_for: Callable[[Location], Awaitable[None]],
+    max_concurrent_requests: int = 50,
+) -> dict[Location, WeatherConditions]:
+    """
+    Asynchronously get the weather of many locations, sending the requests at the same time.
+    Up to `GROUP_MAX_CITY_IDS` locations are fetched per request from the `/group` endpoint.
+    Locations without a known city id, or which the group endpoint doesn't return, are
+    fetched by name and their city ids recorded in `city_ids`
+
+    Parameters
+    ----------
+    client
+        An instance of an AsyncApiClient which can get data from the weather api
+    cache
+        The cache to look up and store weather conditions in
+    locations
+        The locations to fetch the weather for
+    city_ids
+        The known city ids
+    wait_for
+        Awaited with the first location of each request before sending it
+    max_concurrent_requests
+        The maximum number of requests to send at the same time
+
+    Returns
+    -------
+    dict of Location to WeatherConditions
+    """
+    weather = {}
+    for location in locations:
+        if (cached := cache.get(location)) is not None:
+            weather[location] = cached
+
+    requests = WeatherRequests.plan(
+        (location for location in locations if location not in weather), city_ids
+    )
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    async def fetch_group(group: dict[int, list[Location]]) -> list[Location]:
+        await wait_for(next(iter(group.values()))[0])
+        async with semaphore:
+            fetched = await fetch_weather_group_async(client, list(group))
+        missing = []
+        for city_id, group_locations in group.items():
+            if (city_weather := fetched.get(city_id)) is None:
+                missing.extend(group_locations)
+                continue
+            for location in group_locations:
+                weather[location] = city_weather.weather
+                cache.set(location, city_weather.weather)
+        return missing
+
+    async def fetch_by_name(location: Location) -> None:
+        await wait_for(location)
+        async with semaphore:
+            city_weather = await fetch_city_weather_async(
+                client, location.city, location.country_code
+            )
+        city_ids.resolve(location, city_weather)
+        weather[location] = city_weather.weather
+        cache.set(location, city_weather.weather)
+
+    missing_from_groups = await asyncio.gather(*map(fetch_group, requests.groups))
+    missing = requests.by_name + [
+        location for group in missing_from_groups for location in group
+    ]
+    await asyncio.gather(*map(fetch_by_name, missing))
+
+    log_weather_requests(len(locations), len(requests.groups), len(missing))
+    return weather
+
+
+def log_weather_requests(n_locations: int, n_groups: int, n_by_name: int) -> None:
+    """Log the number of requests made to the weather API to fetch the weather of locations"""
+    logger.msg(
+        "Fetched weather in groups",
+        n_locations=n_locations,
+        n_group_requests=n_groups,
+        n_by_name_requests=n_by_name,
+    )
@@ -0,0 +1,120 @@
+import attr
+
+from notifier.alert_state import ApiAlertState, InMemoryAlertState, SqliteAlertState
+from notifier.services import format_email_body
+
+HOT = ("sub-1", "temp gt 25.0")
+HUMID = ("sub-1", "humidity gt 80.0")
+EVALUATED = {HOT, HUMID}
+
+
+@attr.define()
+class FakeClock:
+    now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_alert_state_notifies_transitions_into_and_out_of_alert():
+    clock = FakeClock()
+    alert_state = InMemoryAlertState(cooldown=600, clock=clock)
+
+    assert alert_state.transitions(set(), EVALUATED, {"sub-1"}) == {}
+
+    assert alert_state.transitions({HOT}, EVALUATED, {"sub-1"}) == {HOT: True}
+    alert_state.record({HOT: True})
+    assert alert_state.transitions({HOT}, EVALUATED, {"sub-1"}) == {}
+
+    clock.now = 600
+    assert alert_state.transitions(set(), EVALUATED, {"sub-1"}) == {HOT: False}
+
+
+def test_alert_state_suppresses_flapping_alerts_until_the_cooldown_passes():
+    clock = FakeClock()
+    alert_state = InMemoryAlertState(cooldown=600, clock=clock)
+    alert_state.record({HOT: True})
+
+    clock.now = 60
+    assert alert_state.transitions(set(), EVALUATED, {"sub-1"}) == {}
+    clock.now = 120
+    assert alert_state.transitions({HOT}, EVALUATED, {"sub-1"}) == {}
+    clock.now = 660
+    assert alert_state.transitions(set(), EVALUATED, {"sub-1"}) == {HOT: False}
+
+
+def test_alert_state_notifies_again_if_a_transition_was_not_recorded():
+    alert_state = InMemoryAlertState()
+
+    assert alert_state.transitions({HOT}, EVALUATED, {"sub-1"}) == {HOT: True}
+    assert alert_state.transitions({HOT}, EVALUATED, {"sub-1"}) == {HOT: True}
+
+
+def test_alert_state_drops_removed_conditions_and_expired_states():
+    clock = FakeClock()
+    alert_state = InMemoryAlertState(cooldown=600, clock=clock)
+    alert_state.record({HOT: True, HUMID: False, ("sub-2", "temp lt 0.0"): True})
+
+    clock.now = 600
+    assert alert_state.transitions(set(), {HUMID}, {"sub-1"}) == {}
+
+    assert len(alert_state) == 1
+
+
+def test_sqlite_alert_state_survives_restarts(tmp_path):
+    path = str(tmp_path / "alerts.db")
+    clock = FakeClock(1000)
+
+    alert_state = SqliteAlertState(path, cooldown=600, clock=clock)
+    alert_state.record({HOT: True})
+    alert_state.close()
+
+    alert_state = SqliteAlertState(path, cooldown=600, clock=clock)
+    assert alert_state.transitions({HOT}, EVALUATED, {"sub-1"}) == {}
+    clock.now = 1600
+    assert alert_state.transitions(set(), EVALUATED, {"sub-1"}) == {HOT: False}
+    assert len(alert_state) == 1
+
+
+@attr.define()
+class FakeAlertStateApi:
+    states: dict[tuple[str, str], dict] = attr.field(factory=dict)
+    searched: list[list[str]] = attr.field(factory=list)
+
+    def post(self, endpoint: str, json=None):
+        self.searched.append(json["subscription_keys"])
+        return {
+            "states": [
+                state
+                for (key, _), state in self.states.items()
+                if key in json["subscription_keys"]
+            ]
+        }
+
+    def put(self, endpoint: str, json=None):
+        for state in json.get("record", []):
+            self.states[state["subscription_key"], state["condition"]] = state
+        for key in json.get("delete", []):
+            del self.states[key["subscription_key"], key["condition"]]
+
+
+def test_api_alert_state_is_shared_between_replicas():
+    api, clock = FakeAlertStateApi(), FakeClock(1000)
+    replica_1 = ApiAlertState(api, cooldown=600, clock=clock)
+    replica_2 = ApiAlertState(api, cooldown=600, clock=clock)
+
+    replica_1.record(replica_1.transitions({HOT}, EVALUATED, {"sub-1"}))
+
+    assert replica_2.transitions({HOT}, EVALUATED, {"sub-1"}) == {}
+    clock.now = 1600
+    assert replica_2.transitions(set(), EVALUATED, {"sub-1"}) == {HOT: False}
+    assert api.searched == [["sub-1"]] * 3
+
+
+def test_format_email_body_lists_cleared_alerts():
+    alert = {"condition": "temp", "op": "gt", "threshold": 25, "actual": 20}
+
+    body = format_email_body([], "London", "GB", cleared=[alert])
+
+    assert "The temp in London, GB is now 20" in body
+    assert "no longer greater than your threshold of 25" in body
@@ -0,0 +1,135 @@
+import asyncio
+
+import httpx
+import pytest
+
+from notifier.api_client import ApiClient, AsyncApiClient, ConnectionSettings
+from notifier.rate_limit import RateLimiter, RetryPolicy
+
+
+def test_api_client_reuses_pooled_client_between_requests():
+    with ApiClient("http://localhost") as client:
+        assert client._client() is client._client()
+
+
+def test_api_client_close_closes_pooled_client():
+    client = ApiClient("http://localhost")
+    http_client = client._client()
+
+    client.close()
+
+    assert http_client.is_closed
+    assert client._client() is not http_client
+
+
+def test_api_client_applies_connection_settings():
+    connection = ConnectionSettings(timeout=1.5)
+
+    with ApiClient("http://localhost", connection=connection) as client:
+        http_client = client._client()
+
+    assert http_client.timeout.read == 1.5
+
+
+def test_async_api_client_reuses_pooled_client_until_closed():
+    async def run():
+        async with AsyncApiClient("http://localhost") as client:
+            http_client = client._client()
+            assert client._client() is http_client
+        return http_client
+
+    assert asyncio.run(run()).is_closed
+
+
+def test_api_client_stream_parses_each_ndjson_line():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b'{"id": 1}\n\n{"id": 2}\n')
+
+    client = ApiClient("http://localhost")
+    client._http_client = httpx.Client(
+        base_url=client.base_url, transport=httpx.MockTransport(handler)
+    )
+
+    with client:
+        assert list(client.stream("/records")) == [{"id": 1}, {"id": 2}]
+
+
+def test_api_client_post_sends_json_and_handles_empty_responses():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/empty":
+            return httpx.Response(204)
+        return httpx.Response(200, content=request.content)
+
+    client = ApiClient("http://localhost")
+    client._http_client = httpx.Client(
+        base_url=client.base_url, transport=httpx.MockTransport(handler)
+    )
+
+    with client:
+        assert client.post("/echo", json={"id": 1}) == {"id": 1}
+        assert client.post("/empty") is None
+
+
+def test_api_client_put_sends_json_with_put():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"method": request.method})
+
+    client = ApiClient("http://localhost")
+    client._http_client = httpx.Client(
+        base_url=client.base_url, transport=httpx.MockTransport(handler)
+    )
+
+    with client:
+        assert client.put("/locations/1", json={"owm_city_id": 1}) == {"method": "PUT"}
+
+
+def test_api_client_retries_throttled_requests_after_retry_after():
+    responses = iter(
+        [
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(503),
+            httpx.Response(200, json={"temp": 20}),
+        ]
+    )
+    client = ApiClient(
+        "http://localhost",
+        rate_limiter=RateLimiter(6000, burst=10),
+        retry=RetryPolicy(backoff=0.001),
+    )
+    client._http_client = httpx.Client(
+        base_url=client.base_url,
+        transport=httpx.MockTransport(lambda request: next(responses)),
+    )
+
+    with client:
+        assert client.get("/weather") == {"temp": 20}
+
+
+def test_api_client_raises_when_out_of_retries():
+    client = ApiClient("http://localhost", retry=RetryPolicy(max_retries=1, backoff=0))
+    client._http_client = httpx.Client(
+        base_url=client.base_url,
+        transport=httpx.MockTransport(lambda request: httpx.Response(429)),
+    )
+
+    with client, pytest.raises(httpx.HTTPStatusError):
+        client.get("/weather")
+
+
+def test_async_api_client_retries_throttled_requests():
+    responses = iter([httpx.Response(429), httpx.Response(200, json={"temp": 20})])
+    limiter = RateLimiter(6000, adaptive=True)
+
+    async def run():
+        client = AsyncApiClient(
+            "http://localhost", rate_limiter=limiter, retry=RetryPolicy(backoff=0)
+        )
+        client._http_client = httpx.AsyncClient(
+            base_url=client.base_url,
+            transport=httpx.MockTransport(lambda request: next(responses)),
+        )
+        async with client:
+            return await client.get("/weather")
+
+    assert asyncio.run(run()) == {"temp": 20}
+    assert limiter.rate < 6000
@@ -0,0 +1,98 @@
+from pathlib import Path
+from typing import Callable
+
+import attr
+import pytest
+
+from notifier.cache import (
+    InMemoryWeatherCache,
+    SqliteWeatherCache,
+    WeatherCacheInterface,
+)
+from notifier.schemas import Location, WeatherConditions
+
+CacheFactory = Callable[..., WeatherCacheInterface]
+
+
+@attr.define()
+class FakeClock:
+    now: float = 0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache_factory(request, tmp_path: Path, clock: FakeClock) -> CacheFactory:
+    def new_cache(**kwargs) -> WeatherCacheInterface:
+        if request.param == "memory":
+            return InMemoryWeatherCache(clock=clock, **kwargs)
+        return SqliteWeatherCache(str(tmp_path / "cache.db"), clock=clock, **kwargs)
+
+    return new_cache
+
+
+@pytest.fixture(scope="session")
+def weather() -> WeatherConditions:
+    return WeatherConditions(temp=10, pressure=1000, humidity=50)
+
+
+london = Location(city="London", country_code="GB")
+paris = Location(city="Paris", country_code="FR")
+berlin = Location(city="Berlin", country_code="DE")
+
+
+def test_cache_returns_stored_weather(
+    cache_factory: CacheFactory, weather: WeatherConditions
+):
+    cache = cache_factory()
+    cache.set(london, weather)
+
+    assert cache.get(london) == weather
+    assert cache.get(paris) is None
+
+
+def test_cache_expires_entries_after_ttl(
+    cache_factory: CacheFactory, clock: FakeClock, weather: WeatherConditions
+):
+    cache = cache_factory(ttl=60)
+    cache.set(london, weather)
+
+    clock.now = 60
+    assert cache.get(london) == weather
+
+    clock.now = 61
+    assert cache.get(london) is None
+
+
+def test_cache_evicts_least_recently_used(
+    cache_factory: CacheFactory, clock: FakeClock, weather: WeatherConditions
+):
+    cache = cache_factory(max_size=2)
+    cache.set(london, weather)
+    clock.now = 1
+    cache.set(paris, weather)
+    clock.now = 2
+    cache.get(london)
+    clock.now = 3
+    cache.set(berlin, weather)
+
+    assert cache.get(london) == weather
+    assert cache.get(paris) is None
+    assert cache.get(berlin) == weather
+
+
+def test_sqlite_cache_persists_between_instances(
+    tmp_path: Path, weather: WeatherConditions
+):
+    path = str(tmp_path / "cache.db")
+    cache = SqliteWeatherCache(path)
+    cache.set(london, weather)
+    cache.close()
+
+    assert SqliteWeatherCache(path).get(london) == weather
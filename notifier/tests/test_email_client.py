@@ -0,0 +1,86 @@
+import smtplib
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from notifier.email_client import Email, EmailClient
+
+
+@pytest.fixture()
+def mock_smtp(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch.object(smtplib, "SMTP")
+
+
+def test_send_email_reuses_connection(mock_smtp: MagicMock):
+    with EmailClient("localhost:1025") as client:
+        client.send_email("a@test.com", "subject", "body")
+        client.send_email("b@test.com", "subject", "body")
+
+    mock_smtp.assert_called_once_with("localhost:1025")
+    assert mock_smtp.return_value.send_message.call_count == 2
+
+
+def test_close_quits_open_connections(mock_smtp: MagicMock):
+    client = EmailClient("localhost:1025")
+    client.send_email("a@test.com", "subject", "body")
+
+    client.close()
+
+    mock_smtp.return_value.quit.assert_called_once()
+
+
+def test_send_email_reconnects_when_server_disconnected(mock_smtp: MagicMock):
+    disconnected, reconnected = MagicMock(), MagicMock()
+    disconnected.send_message.side_effect = smtplib.SMTPServerDisconnected()
+    mock_smtp.side_effect = [disconnected, reconnected]
+
+    with EmailClient("localhost:1025") as client:
+        client.send_email("a@test.com", "subject", "body")
+
+    assert mock_smtp.call_count == 2
+    reconnected.send_message.assert_called_once()
+
+
+def test_send_many_returns_failed_emails(mock_smtp: MagicMock):
+    refused = smtplib.SMTPRecipientsRefused({"bad@test.com": (550, b"No such user")})
+    mock_smtp.return_value.send_message.side_effect = [None, refused, None]
+    emails = [
+        Email(to=to, subject="subject", body="body")
+        for to in ["a@test.com", "bad@test.com", "c@test.com"]
+    ]
+
+    with EmailClient("localhost:1025") as client:
+        failed = client.send_many(emails)
+
+    assert failed == [emails[1]]
+    mock_smtp.assert_called_once()
+
+
+def test_send_many_uses_at_most_pool_size_connections(mock_smtp: MagicMock):
+    emails = [Email(to=f"{i}@test.com", subject="s", body="b") for i in range(20)]
+
+    with EmailClient("localhost:1025", pool_size=3) as client:
+        assert client.send_many(emails) == []
+
+    assert mock_smtp.call_count <= 3
+    assert mock_smtp.return_value.send_message.call_count == 20
+
+
+def test_send_email_sets_message_id(mock_smtp: MagicMock):
+    with EmailClient("localhost:1025") as client:
+        client.send_email("a@test.com", "subject", "body", message_id="<1.abc@test>")
+
+    message = mock_smtp.return_value.send_message.call_args.args[0]
+    assert message["Message-ID"] == "<1.abc@test>"
+
+
+def test_send_email_adds_html_alternative(mock_smtp: MagicMock):
+    with EmailClient("localhost:1025") as client:
+        client.send_email("a@test.com", "subject", "body", html="<p>body</p>")
+
+    message = mock_smtp.return_value.send_message.call_args.args[0]
+    assert message.get_content_type() == "multipart/alternative"
+    text, html = message.iter_parts()
+    assert text.get_content().strip() == "body"
+    assert html.get_content().strip() == "<p>body</p>"
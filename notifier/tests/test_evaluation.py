@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from notifier import services
+from notifier.alert_state import InMemoryAlertState, record_notified
+from notifier.evaluation import AlertEvaluator, CONDITIONS
+from notifier.schemas import Location, Subscription, WeatherConditions
+
+
+@pytest.fixture(scope="module")
+def subscriptions_by_location() -> dict[Location, list[Subscription]]:
+    rng = random.Random(42)
+    subscriptions = [
+        Subscription(
+            email=f"user{i}@test.com",
+            city=rng.choice(["London", "Paris", "Berlin"]),
+            country_code="GB",
+            conditions=[
+                {
+                    "condition": rng.choice(CONDITIONS),
+                    "op": rng.choice(["gt", "ge", "lt", "le", "eq"]),
+                    "threshold": rng.choice([0, 10, 50, 1000]),
+                }
+                for _ in range(rng.randint(0, 4))
+            ],
+        )
+        for i in range(200)
+    ]
+    return services.group_subscriptions_by_location(subscriptions)
+
+
+@pytest.fixture(scope="module")
+def weather(
+    subscriptions_by_location: dict[Location, list[Subscription]]
+) -> dict[Location, WeatherConditions]:
+    readings = [(10, 1000, 50), (-5, 980, 90), (25, 1020, 10)]
+    return {
+        location: WeatherConditions(temp=temp, pressure=pressure, humidity=humidity)
+        for location, (temp, pressure, humidity) in zip(
+            subscriptions_by_location, readings
+        )
+    }
+
+
+def test_evaluate_matches_generate_alerts(
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    weather: dict[Location, WeatherConditions],
+):
+    evaluator = AlertEvaluator.compile(subscriptions_by_location)
+
+    alerts = evaluator.evaluate(weather)
+
+    assert alerts == [
+        services.generate_alerts(sub.conditions, weather[sub.location])
+        for sub in evaluator.subscriptions
+    ]
+
+
+def test_evaluate_without_subscriptions_returns_no_alerts():
+    evaluator = AlertEvaluator.compile({})
+
+    assert evaluator.evaluate({}) == []
+
+
+def test_compile_raises_on_unknown_op(subscriptions_by_location):
+    sub = Subscription(
+        email="user@test.com",
+        city="London",
+        country_code="GB",
+        conditions=[{"condition": "temp", "op": "xx", "threshold": 0}],
+    )
+
+    with pytest.raises(ValueError):
+        AlertEvaluator.compile({sub.location: [sub]})
+
+
+def test_evaluate_changes_notifies_each_alert_once_until_it_clears(
+    subscriptions_by_location: dict[Location, list[Subscription]],
+    weather: dict[Location, WeatherConditions],
+):
+    evaluator = AlertEvaluator.compile(subscriptions_by_location)
+    alert_state = InMemoryAlertState(cooldown=0)
+
+    changes = evaluator.evaluate_changes(weather, alert_state)
+    record_notified(alert_state, changes)
+
+    # Repeated conditions of a subscription share their alert state
+    assert [sub_changes.triggered for sub_changes in changes] == [
+        list({repr(alert): alert for alert in alerts}.values())
+        for alerts in evaluator.evaluate(weather)
+    ]
+    assert not any(evaluator.evaluate_changes(weather, alert_state))
+
+    cold = {
+        location: conditions.copy(update={"temp": -50})
+        for location, conditions in weather.items()
+    }
+    changes = evaluator.evaluate_changes(cold, alert_state)
+    cleared = [alert for sub_changes in changes for alert in sub_changes.cleared]
+    assert cleared
+    assert all(
+        alert["condition"] == "temp" and alert["actual"] == -50 for alert in cleared
+    )
@@ -0,0 +1,114 @@
+from notifier.alert_state import InMemoryAlertState, subscription_key
+from notifier.evaluation import AlertEvaluator
+from notifier import main
+from notifier.main import (
+    create_notifications,
+    evaluate_alerts,
+    evaluate_changed_alerts,
+    get_weather_cache,
+    split_transitions_by_shard,
+)
+from notifier.schemas import Location, Subscription, WeatherConditions
+from notifier.services import group_subscriptions_by_location
+from notifier.settings import Settings
+from notifier.sharding import partition_locations
+
+
+def subscription(email: str, city: str, threshold: float) -> Subscription:
+    return Subscription(
+        email=email,
+        city=city,
+        country_code="GB",
+        conditions=[{"condition": "temp", "op": "gt", "threshold": threshold}],
+    )
+
+
+SUBSCRIPTIONS = [
+    subscription("alice@test.com", "London", 10),
+    subscription("alice@test.com", "Leeds", 10),
+    subscription("alice@test.com", "York", 30),
+    subscription("bob@test.com", "London", 10),
+]
+WEATHER = {
+    Location(city=city, country_code="GB"): WeatherConditions(
+        temp=20, pressure=1000, humidity=50
+    )
+    for city in ("London", "Leeds", "York")
+}
+
+
+def test_evaluate_alerts_sends_one_digest_per_recipient():
+    evaluator = AlertEvaluator.compile(group_subscriptions_by_location(SUBSCRIPTIONS))
+
+    notifications = evaluate_alerts(
+        evaluator, WEATHER, InMemoryAlertState(), digest=True
+    )
+
+    emails = sorted((email for email, _ in notifications), key=lambda email: email.to)
+    assert [email.to for email in emails] == ["alice@test.com", "bob@test.com"]
+    assert emails[0].subject in (
+        "Weather Notification for London, Leeds",
+        "Weather Notification for Leeds, London",
+    )
+    assert "The temp in London, GB is now 20" in emails[0].body
+    assert "The temp in Leeds, GB is now 20" in emails[0].body
+    assert "York" not in emails[0].body
+    assert sorted(len(changes.transitions) for _, changes in notifications) == [1, 2]
+
+
+def test_evaluate_alerts_without_digest_sends_one_email_per_subscription():
+    evaluator = AlertEvaluator.compile(group_subscriptions_by_location(SUBSCRIPTIONS))
+
+    notifications = evaluate_alerts(evaluator, WEATHER, InMemoryAlertState())
+
+    assert sorted(email.to for email, _ in notifications) == [
+        "alice@test.com",
+        "alice@test.com",
+        "bob@test.com",
+    ]
+
+
+def test_digest_lists_subscriptions_of_every_shard():
+    # London and Leeds are owned by different shards
+    shards = partition_locations(group_subscriptions_by_location(SUBSCRIPTIONS), 5)
+    alert_state = InMemoryAlertState()
+    changed = [
+        (shard, sub_changed)
+        for shard, subscriptions_by_location in enumerate(shards)
+        for sub_changed in evaluate_changed_alerts(
+            AlertEvaluator.compile(subscriptions_by_location), WEATHER, alert_state
+        )
+    ]
+
+    notifications = create_notifications(
+        [sub_changed for _, sub_changed in changed], digest=True
+    )
+    owners = {subscription_key(sub): shard for shard, (sub, _) in changed}
+    bob = next(email for email, _ in notifications if email.to == "bob@test.com")
+    transitions = split_transitions_by_shard(notifications, [bob], owners, 5)
+
+    alice = next(email for email, _ in notifications if email.to == "alice@test.com")
+    assert len(notifications) == 2
+    assert "London" in alice.body and "Leeds" in alice.body
+    assert [len(shard_transitions) for shard_transitions in transitions] == [
+        0,
+        0,
+        1,
+        0,
+        1,
+    ]
+
+
+def test_get_weather_cache_connects_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "_weather_cache", None)
+    settings = Settings(
+        subscription_api_url="http://localhost:8000",
+        api_key="key",
+        smtp_host="localhost:1025",
+        weather_cache_path=str(tmp_path / "cache.db"),
+    )
+
+    cache = get_weather_cache(settings)
+
+    assert get_weather_cache(settings) is cache
+    cache.close()
@@ -0,0 +1,59 @@
+import socket
+
+import httpx
+from prometheus_client import REGISTRY
+
+from notifier.api_client import ApiClient
+from notifier.metrics import start_metrics_server
+from notifier.rate_limit import RetryPolicy
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_api_client_records_requests_errors_and_throttling():
+    responses = iter(
+        [httpx.Response(429), httpx.Response(503), httpx.Response(200, json={})]
+    )
+    client = ApiClient("http://metrics.test", retry=RetryPolicy(backoff=0))
+    client._http_client = httpx.Client(
+        base_url=client.base_url,
+        transport=httpx.MockTransport(lambda request: next(responses)),
+    )
+    before = {
+        "requests": sample("notifier_api_request_seconds_count", host="metrics.test"),
+        "throttled": sample("notifier_api_throttled_total", host="metrics.test"),
+        "errors": sample(
+            "notifier_api_errors_total", host="metrics.test", status_code="503"
+        ),
+    }
+
+    with client:
+        client.get("/weather")
+
+    assert (
+        sample("notifier_api_request_seconds_count", host="metrics.test")
+        == before["requests"] + 3
+    )
+    assert (
+        sample("notifier_api_throttled_total", host="metrics.test")
+        == before["throttled"] + 1
+    )
+    assert (
+        sample("notifier_api_errors_total", host="metrics.test", status_code="503")
+        == before["errors"] + 1
+    )
+
+
+def test_metrics_endpoint_serves_the_notifier_metrics():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    start_metrics_server(port, "127.0.0.1")
+    response = httpx.get(f"http://127.0.0.1:{port}/metrics")
+
+    assert response.status_code == 200
+    assert "notifier_cycle_seconds_bucket" in response.text
+    assert "notifier_emails_failed_total" in response.text
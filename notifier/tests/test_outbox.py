@@ -0,0 +1,205 @@
+import smtplib
+from typing import Optional
+
+import attr
+import pytest
+from prometheus_client import REGISTRY
+
+from notifier.email_client import Email
+from notifier.outbox import OutboxSender, SqliteOutbox, idempotency_key
+
+EMAILS = [
+    Email(to=f"user{i}@test.com", subject="subject", body=f"body {i}") for i in range(3)
+]
+
+
+@attr.define()
+class FakeClock:
+    now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@attr.define()
+class RecordingEmailClient:
+    errors: dict[str, OSError] = attr.field(factory=dict)
+    sent: list[tuple[str, Optional[str]]] = attr.field(factory=list)
+
+    def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        message_id: Optional[str] = None,
+        html: Optional[str] = None,
+    ) -> None:
+        if to in self.errors:
+            raise self.errors[to]
+        self.sent.append((to, message_id))
+
+    def send_many(self, emails):
+        raise NotImplementedError
+
+
+@pytest.fixture()
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture()
+def outbox(tmp_path, clock: FakeClock) -> SqliteOutbox:
+    outbox = SqliteOutbox(str(tmp_path / "outbox.db"), lease_seconds=60, clock=clock)
+    yield outbox
+    outbox.close()
+
+
+def keyed(emails: list[Email]) -> list[tuple[str, Email]]:
+    return [
+        (idempotency_key(email, {("sub", "temp gt 1.0"): True}), email)
+        for email in emails
+    ]
+
+
+def test_enqueue_skips_notifications_already_waiting_to_be_sent(outbox: SqliteOutbox):
+    assert outbox.enqueue(keyed(EMAILS)) == 3
+    assert outbox.enqueue(keyed(EMAILS)) == 0
+
+    outbox.mark_sent(outbox.claim(10))
+
+    assert outbox.enqueue(keyed(EMAILS[:1])) == 1
+
+
+def test_claimed_messages_are_claimed_again_once_the_lease_expires(
+    outbox: SqliteOutbox, clock: FakeClock
+):
+    outbox.enqueue(keyed(EMAILS))
+
+    assert [message.email for message in outbox.claim(2)] == EMAILS[:2]
+    assert [message.email for message in outbox.claim(10)] == EMAILS[2:]
+    assert outbox.claim(10) == []
+
+    clock.now += 60
+    assert len(outbox.claim(10)) == 3
+
+
+def test_outbox_survives_restarts(tmp_path, clock: FakeClock):
+    path = str(tmp_path / "outbox.db")
+    outbox = SqliteOutbox(path, clock=clock)
+    outbox.enqueue(keyed(EMAILS))
+    outbox.close()
+
+    outbox = SqliteOutbox(path, clock=clock)
+    assert len(outbox) == 3
+    assert [message.email for message in outbox.claim(10)] == EMAILS
+
+
+def test_sender_sends_claimed_messages_with_stable_message_ids(outbox: SqliteOutbox):
+    outbox.enqueue(keyed(EMAILS))
+    email_client = RecordingEmailClient()
+    sender = OutboxSender(outbox, email_client, concurrency=2)
+
+    assert sender.drain_once() == 3
+    assert sender.drain_once() == 0
+
+    assert sorted(to for to, _ in email_client.sent) == [email.to for email in EMAILS]
+    assert all(
+        message_id.endswith("@weather-notifier>") for _, message_id in email_client.sent
+    )
+    assert len(outbox) == 0
+
+
+def test_sender_retries_transient_failures_with_backoff(
+    outbox: SqliteOutbox, clock: FakeClock
+):
+    outbox.enqueue(keyed(EMAILS[:1]))
+    email_client = RecordingEmailClient(errors={EMAILS[0].to: ConnectionRefusedError()})
+    sender = OutboxSender(outbox, email_client, backoff=10, random=lambda: 1.0)
+
+    sender.drain_once()
+    clock.now += 9
+    assert sender.drain_once() == 0
+
+    del email_client.errors[EMAILS[0].to]
+    clock.now += 1
+    assert sender.drain_once() == 1
+    assert [to for to, _ in email_client.sent] == [EMAILS[0].to]
+    assert len(outbox) == 0
+
+
+def test_sender_gives_up_on_permanent_failures_and_after_max_attempts(
+    outbox: SqliteOutbox, clock: FakeClock
+):
+    outbox.enqueue(keyed(EMAILS[:2]))
+    refused = smtplib.SMTPRecipientsRefused({EMAILS[0].to: (550, b"No such user")})
+    email_client = RecordingEmailClient(
+        errors={EMAILS[0].to: refused, EMAILS[1].to: TimeoutError()}
+    )
+    sender = OutboxSender(outbox, email_client, max_attempts=2, backoff=0)
+
+    assert sender.drain_once() == 2
+    assert sender.drain_once() == 1
+    assert sender.drain_once() == 0
+
+    assert len(outbox) == 0
+    assert email_client.sent == []
+
+
+def test_claim_returns_the_html_alternative(outbox: SqliteOutbox):
+    email = Email(to="a@test.com", subject="subject", body="body", html="<p>body</p>")
+    outbox.enqueue(keyed([email]))
+
+    (message,) = outbox.claim(10)
+
+    assert message.email == email
+
+
+def test_sender_gives_up_on_emails_which_can_never_be_sent(outbox: SqliteOutbox):
+    bad = Email(to="bad@test.com", subject="subject", body="body")
+    outbox.enqueue(keyed([bad, *EMAILS]))
+    email_client = RecordingEmailClient(
+        errors={bad.to: ValueError("newline in header")}
+    )
+    sender = OutboxSender(outbox, email_client)
+
+    assert sender.drain_once() == 4
+    assert sender.drain_once() == 0
+
+    assert sorted(to for to, _ in email_client.sent) == [email.to for email in EMAILS]
+    assert len(outbox) == 0
+
+
+def test_expired_claims_cant_record_the_outcome_of_a_message(
+    outbox: SqliteOutbox, clock: FakeClock
+):
+    outbox.enqueue(keyed(EMAILS[:1]))
+    (expired,) = outbox.claim(10)
+    clock.now += 60
+    (claimed,) = outbox.claim(10)
+
+    assert outbox.mark_sent([expired]) == 0
+    assert not outbox.mark_failed(expired, "error", retry_in=None)
+    assert len(outbox) == 1
+
+    assert outbox.mark_sent([claimed]) == 1
+    assert len(outbox) == 0
+
+
+def test_sender_exports_failures_and_backlog(outbox: SqliteOutbox):
+    outbox.enqueue(keyed(EMAILS))
+    email_client = RecordingEmailClient(errors={EMAILS[0].to: TimeoutError()})
+    sender = OutboxSender(outbox, email_client, backoff=60)
+    retried = REGISTRY.get_sample_value(
+        "notifier_outbox_send_failures_total", {"outcome": "retry"}
+    )
+
+    sender.drain_once()
+
+    assert (
+        REGISTRY.get_sample_value(
+            "notifier_outbox_send_failures_total", {"outcome": "retry"}
+        )
+        == (retried or 0) + 1
+    )
+    sender.drain_once()
+    assert REGISTRY.get_sample_value("notifier_outbox_pending") == 1
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import attr
+import httpx
+import pytest
+
+from notifier.rate_limit import (
+    MAX_RETRY_AFTER,
+    RateLimiter,
+    RetryPolicy,
+    parse_retry_after,
+)
+
+
+@attr.define()
+class FakeClock:
+    now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_rate_limiter_allows_a_burst_then_spaces_requests_at_the_rate():
+    clock = FakeClock()
+    limiter = RateLimiter(60, burst=2, clock=clock, sleep=clock.sleep)
+
+    waits = [limiter.reserve() for _ in range(4)]
+
+    assert waits == [0.0, 0.0, pytest.approx(1.0), pytest.approx(2.0)]
+
+
+def test_rate_limiter_acquire_sleeps_until_a_token_is_available():
+    clock = FakeClock()
+    limiter = RateLimiter(120, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        limiter.acquire()
+
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_rate_limiter_pauses_for_retry_after():
+    clock = FakeClock()
+    limiter = RateLimiter(600, burst=10, clock=clock, sleep=clock.sleep)
+
+    limiter.throttled(retry_after=5)
+
+    assert limiter.reserve() == pytest.approx(5.0)
+
+
+def test_adaptive_rate_limiter_halves_the_rate_and_recovers_while_succeeding():
+    clock = FakeClock()
+    limiter = RateLimiter(
+        60,
+        adaptive=True,
+        min_calls_per_minute=20,
+        recovery_seconds=60,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    limiter.throttled()
+    limiter.throttled()
+    assert limiter.rate == 20
+
+    clock.now += 30
+    limiter.succeeded()
+    assert limiter.rate == pytest.approx(50)
+
+    clock.now += 30
+    limiter.succeeded()
+    assert limiter.rate == 60
+
+
+def test_non_adaptive_rate_limiter_keeps_its_rate_when_throttled():
+    limiter = RateLimiter(60)
+
+    limiter.throttled()
+
+    assert limiter.rate == 60
+
+
+def test_retry_policy_backs_off_exponentially_with_jitter():
+    policy = RetryPolicy(max_retries=3, backoff=1, max_backoff=3, random=lambda: 0.5)
+    response = httpx.Response(503)
+
+    delays = [policy.delay(response, attempt) for attempt in range(4)]
+
+    assert delays == [0.75, 1.5, 2.25, None]
+
+
+def test_retry_policy_honors_retry_after_up_to_max_backoff():
+    policy = RetryPolicy(max_backoff=10)
+
+    assert policy.delay(httpx.Response(429, headers={"Retry-After": "7"}), 0) == 7
+    assert policy.delay(httpx.Response(429, headers={"Retry-After": "60"}), 0) is None
+    assert policy.delay(httpx.Response(404), 0) is None
+
+
+def test_parse_retry_after_accepts_seconds_and_http_dates():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert parse_retry_after("12") == 12
+    assert 28 < parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("inf") is None
+    assert parse_retry_after("1e12") == MAX_RETRY_AFTER
+    assert parse_retry_after(None) is None
+
+
+def test_adaptive_rate_limiter_cuts_the_rate_once_for_requests_throttled_together():
+    clock = FakeClock()
+    limiter = RateLimiter(600, burst=10, adaptive=True, clock=clock, sleep=clock.sleep)
+    sent_at = [limiter.acquire() for _ in range(20)]
+
+    clock.now += 0.5
+    for sent in sent_at:
+        limiter.throttled(sent_at=sent)
+
+    assert limiter.rate == 300
+    assert limiter.reserve() < 5
+
+
+def test_rate_limiter_caps_the_pause_of_a_bogus_retry_after():
+    clock = FakeClock()
+    limiter = RateLimiter(60, clock=clock, sleep=clock.sleep)
+
+    limiter.throttled(retry_after=1e12)
+
+    assert limiter.reserve() == MAX_RETRY_AFTER
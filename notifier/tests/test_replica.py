@@ -0,0 +1,108 @@
+from typing import Optional
+
+import attr
+import pytest
+from pydantic import ValidationError
+
+from notifier.api_client import JsonResponseType
+from notifier.replica import SubscriptionReplica
+
+
+def subscription_data(subscription_uuid: str, email: str = "test@test.com") -> dict:
+    return {
+        "email": email,
+        "city": "London",
+        "country_code": "GB",
+        "conditions": [{"condition": "temp", "op": "gt", "threshold": 0}],
+        "subscription_uuid": subscription_uuid,
+    }
+
+
+@attr.define()
+class ChangesApiClient:
+    responses: list[JsonResponseType]
+    params: list[dict] = attr.field(factory=list)
+
+    def get(self, endpoint: str, params: Optional[dict] = None) -> JsonResponseType:
+        assert endpoint == "/subscriptions/changes"
+        self.params.append(params)
+        return self.responses.pop(0)
+
+
+@pytest.fixture()
+def client() -> ChangesApiClient:
+    return ChangesApiClient(
+        [
+            {
+                "updated": [subscription_data("a"), subscription_data("b")],
+                "deleted": [],
+                "next_token": "2022-05-01T12:00:00",
+            },
+            {
+                "updated": [subscription_data("b", email="new@test.com")],
+                "deleted": ["a", "never-synced"],
+                "next_token": "2022-05-01T12:01:00",
+            },
+        ]
+    )
+
+
+def test_first_sync_fetches_all_subscriptions(client: ChangesApiClient):
+    replica = SubscriptionReplica()
+
+    replica.sync(client)
+
+    assert client.params == [{}]
+    assert [sub.subscription_uuid for sub in replica] == ["a", "b"]
+    assert replica.token == "2022-05-01T12:00:00"
+
+
+def test_first_sync_pages_through_snapshot():
+    client = ChangesApiClient(
+        [
+            {
+                "updated": [subscription_data("a")],
+                "deleted": [],
+                "next_token": "2022-05-01T12:00:00",
+                "next_cursor": 1,
+            },
+            {
+                "updated": [subscription_data("b")],
+                "deleted": [],
+                "next_token": "2022-05-01T12:00:05",
+                "next_cursor": None,
+            },
+        ]
+    )
+    replica = SubscriptionReplica()
+
+    replica.sync(client)
+
+    assert client.params == [{}, {"cursor": 1}]
+    assert [sub.subscription_uuid for sub in replica] == ["a", "b"]
+    assert replica.token == "2022-05-01T12:00:00"
+
+
+def test_sync_patches_replica_with_changes_since_token(client: ChangesApiClient):
+    replica = SubscriptionReplica()
+
+    replica.sync(client)
+    replica.sync(client)
+
+    assert client.params[-1] == {"since": "2022-05-01T12:00:00"}
+    assert [(sub.subscription_uuid, sub.email) for sub in replica] == [
+        ("b", "new@test.com")
+    ]
+    assert replica.token == "2022-05-01T12:01:00"
+
+
+def test_failed_sync_leaves_replica_unchanged(client: ChangesApiClient):
+    replica = SubscriptionReplica()
+    replica.sync(client)
+    client.responses = [{"updated": [{"email": "not-valid"}], "deleted": ["a"]}]
+
+    with pytest.raises(ValidationError):
+        replica.sync(client)
+
+    assert len(replica) == 2
+    assert replica.token == "2022-05-01T12:00:00"
@@ -0,0 +1,85 @@
+import attr
+import pytest
+
+from notifier.schemas import Location
+from notifier.scheduler import CycleScheduler, location_slot
+
+
+@attr.define()
+class FakeTime:
+    now: float = 0.0
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def scheduler_with_durations(
+    fake_time: FakeTime, durations: list[float], **kwargs
+) -> tuple[CycleScheduler, list[tuple[float, float]]]:
+    """Create a scheduler with an interval of 60 whose cycles take `durations` seconds"""
+    runs = []
+
+    def job(tick: float) -> None:
+        runs.append((tick, fake_time.now))
+        fake_time.now += durations[len(runs) - 1]
+
+    scheduler = CycleScheduler(
+        60, job, clock=fake_time.clock, sleep=fake_time.sleep, **kwargs
+    )
+    return scheduler, runs
+
+
+def test_ticks_are_aligned_to_the_interval_and_do_not_drift():
+    fake_time = FakeTime(now=1000.5)
+    scheduler, runs = scheduler_with_durations(fake_time, [10, 59, 0.5])
+
+    scheduler.run(max_cycles=3)
+
+    assert runs == [(1020, 1020), (1080, 1080), (1140, 1140)]
+    assert scheduler.last_lag == 0
+    assert scheduler.last_duration == 0.5
+
+
+def test_missed_ticks_are_coalesced_into_one_immediate_cycle():
+    fake_time = FakeTime(now=0)
+    scheduler, runs = scheduler_with_durations(fake_time, [150, 1, 1])
+
+    scheduler.run(max_cycles=3)
+
+    assert runs == [(60, 60), (180, 210), (240, 240)]
+
+
+def test_missed_ticks_can_be_skipped():
+    fake_time = FakeTime(now=0)
+    scheduler, runs = scheduler_with_durations(fake_time, [150, 1], missed_ticks="skip")
+
+    scheduler.run(max_cycles=2)
+
+    assert runs == [(60, 60), (240, 240)]
+
+
+def test_failed_cycle_does_not_stop_the_scheduler():
+    fake_time = FakeTime(now=0)
+    ticks = []
+
+    def job(tick: float) -> None:
+        ticks.append(tick)
+        raise RuntimeError("Weather API down")
+
+    scheduler = CycleScheduler(60, job, clock=fake_time.clock, sleep=fake_time.sleep)
+    scheduler.run(max_cycles=2)
+
+    assert ticks == [60, 120]
+
+
+@pytest.mark.parametrize("window", [0, 30])
+def test_location_slot_is_stable_and_within_window(window: float):
+    location = Location(city="London", country_code="GB")
+
+    slot = location_slot(location, window)
+
+    assert 0 <= slot <= window
+    assert slot == location_slot(Location(city="london ", country_code="gb"), window)
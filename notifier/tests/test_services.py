@@ -1,11 +1,15 @@
-from typing import Optional, Any
+from typing import Iterator, Optional, Any
+
+import asyncio
 
 import pytest
 import attr
+from pytest_mock import MockerFixture
 
 from notifier.api_client import JsonResponseType, ApiAuth
 from notifier import services
-from notifier.schemas import Subscription
+from notifier.cache import InMemoryWeatherCache
+from notifier.schemas import Location, Subscription
 
 
 @attr.define()
@@ -17,6 +21,17 @@ class StubApiClient:
         return self.data
 
 
+@attr.define()
+class StubAsyncApiClient:
+    data: JsonResponseType
+    auth: ApiAuth = ApiAuth(api_key="123")
+
+    async def get(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> JsonResponseType:
+        return self.data
+
+
 @pytest.fixture(scope="session")
 def subscription_data() -> dict:
     return {
@@ -72,11 +87,51 @@ def weather_data() -> dict[str, Any]:
 
 
 def test_fetch_subscriptions_returns_list_of_subscriptions(subscription_data: dict):
-    client = StubApiClient(data=[subscription_data])
+    client = StubApiClient(
+        data={"subscriptions": [subscription_data], "next_cursor": None}
+    )
 
     subs = services.fetch_subscriptions(client)
 
-    assert subs == [Subscription.parse_obj(subscription_data)]
+    assert list(subs) == [Subscription.parse_obj(subscription_data)]
+
+
+def test_fetch_subscriptions_walks_pages_lazily(subscription_data: dict):
+    pages = {
+        None: {"subscriptions": [subscription_data], "next_cursor": 1},
+        1: {"subscriptions": [subscription_data], "next_cursor": None},
+    }
+    requested_cursors = []
+
+    @attr.define()
+    class PagingApiClient:
+        auth: ApiAuth = ApiAuth(api_key="123")
+
+        def get(self, endpoint: str, params: dict) -> JsonResponseType:
+            requested_cursors.append(params.get("cursor"))
+            return pages[params.get("cursor")]
+
+    subs = services.fetch_subscriptions(PagingApiClient(), page_size=1)
+
+    assert next(subs) == Subscription.parse_obj(subscription_data)
+    assert requested_cursors == [None]
+    assert len(list(subs)) == 1
+    assert requested_cursors == [None, 1]
+
+
+def test_stream_subscriptions_parses_each_record(subscription_data: dict):
+    @attr.define()
+    class StubStreamingApiClient(StubApiClient):
+        def stream(
+            self, endpoint: str, params: Optional[dict] = None
+        ) -> Iterator[dict]:
+            yield from self.data
+
+    client = StubStreamingApiClient(data=[subscription_data, subscription_data])
+
+    subs = services.stream_subscriptions(client)
+
+    assert list(subs) == [Subscription.parse_obj(subscription_data)] * 2
 
 
 def test_fetch_weather_returns_correct_conditions(
@@ -90,3 +145,98 @@ def test_fetch_weather_returns_correct_conditions(
 
     for condition in ["temp", "pressure", "humidity"]:
         assert conditions.dict()[condition] == weather_data["main"][condition]
+
+
+def test_fetch_weather_async_returns_correct_conditions(
+    weather_data: dict, subscription: Subscription
+):
+    client = StubAsyncApiClient(data=weather_data)
+
+    conditions = asyncio.run(
+        services.fetch_weather_async(
+            client, subscription.city, subscription.country_code
+        )
+    )
+
+    for condition in ["temp", "pressure", "humidity"]:
+        assert conditions.dict()[condition] == weather_data["main"][condition]
+
+
+def test_group_subscriptions_by_location_groups_normalized_locations(
+    subscription_data: dict,
+):
+    london = Subscription.parse_obj(subscription_data)
+    london_lowercase = Subscription.parse_obj(
+        {**subscription_data, "city": " london ", "country_code": "gb"}
+    )
+    paris = Subscription.parse_obj(
+        {**subscription_data, "city": "Paris", "country_code": "FR"}
+    )
+
+    grouped = services.group_subscriptions_by_location(
+        [london, paris, london_lowercase]
+    )
+
+    assert grouped == {
+        london.location: [london, london_lowercase],
+        paris.location: [paris],
+    }
+
+
+def test_fetch_cached_weather_only_calls_api_on_cache_miss(
+    weather_data: dict, mocker: MockerFixture
+):
+    client = StubApiClient(data=weather_data)
+    spy = mocker.spy(StubApiClient, "get")
+    cache = InMemoryWeatherCache()
+    location = Location(city="London", country_code="GB")
+
+    first = services.fetch_cached_weather(client, cache, location)
+    second = services.fetch_cached_weather(client, cache, location)
+
+    assert first == second
+    assert spy.call_count == 1
+
+
+@attr.define()
+class RecordingApiClient:
+    responses: dict[str, JsonResponseType]
+    posted: list[tuple[str, Any]] = attr.field(factory=list)
+    auth: ApiAuth = ApiAuth(api_key="123")
+
+    def get(self, endpoint: str, params: Optional[dict] = None) -> JsonResponseType:
+        return self.responses[endpoint]
+
+    def post(self, endpoint: str, json: Any = None) -> Optional[JsonResponseType]:
+        self.posted.append((endpoint, json))
+        return self.responses.get(endpoint)
+
+
+def test_claim_locations_returns_normalized_locations_by_lease_id():
+    client = RecordingApiClient(
+        {
+            "/notification-runs/42/claim": {
+                "leases": [{"lease_id": 7, "city": "london", "country_code": "GB"}]
+            }
+        }
+    )
+
+    leases = services.claim_locations(client, "42", "worker-1", batch_size=10)
+
+    assert leases == {7: Location(city="London", country_code="GB")}
+    assert client.posted == [
+        (
+            "/notification-runs/42/claim",
+            {"worker_id": "worker-1", "batch_size": 10, "lease_seconds": 300},
+        )
+    ]
+
+
+def test_complete_locations_posts_lease_ids():
+    client = RecordingApiClient({})
+
+    services.complete_locations(client, "42", "worker-1", {7: None}.keys())
+
+    assert client.posted == [
+        ("/notification-runs/42/complete", {"worker_id": "worker-1", "lease_ids": [7]})
+    ]
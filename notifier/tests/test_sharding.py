@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from notifier.schemas import Location, Subscription
+from notifier.sharding import ShardPool, partition_locations, shard_of
+
+_initialized_with = None
+
+
+def init_worker(value: str) -> None:
+    global _initialized_with
+    _initialized_with = value
+
+
+def describe_worker(shard: int, offset: int) -> tuple[int, int, str]:
+    return shard + offset, os.getpid(), _initialized_with
+
+
+@pytest.fixture()
+def subscriptions_by_location() -> dict[Location, list[Subscription]]:
+    return {
+        Location(city=f"City {i}", country_code="GB"): [
+            Subscription(
+                email="test@test.com",
+                city=f"City {i}",
+                country_code="GB",
+                conditions=[],
+            )
+        ]
+        for i in range(50)
+    }
+
+
+def test_shard_of_is_stable_and_ignores_spelling():
+    location = Location(city="New York", country_code="us")
+    respelled = Location(city="new  york", country_code="US")
+
+    assert shard_of(location, 4) == shard_of(respelled, 4) == shard_of(location, 4)
+    assert 0 <= shard_of(location, 4) < 4
+
+
+def test_partition_locations_assigns_each_location_to_one_shard(
+    subscriptions_by_location: dict[Location, list[Subscription]]
+):
+    shards = partition_locations(subscriptions_by_location, 3)
+
+    assert len(shards) == 3
+    assert sum(len(shard) for shard in shards) == len(subscriptions_by_location)
+    for i, shard in enumerate(shards):
+        assert shard
+        assert all(shard_of(location, 3) == i for location in shard)
+
+
+def test_shard_pool_runs_each_shard_in_its_own_initialized_process():
+    with ShardPool(2, init_worker, ("ready",)) as pool:
+        first = pool.run(describe_worker, [(10,), (20,)])
+        second = pool.run(describe_worker, [(10,), (20,)])
+
+    assert [result for result, _, _ in first] == [10, 21]
+    assert [initialized for _, _, initialized in first] == ["ready", "ready"]
+    assert len({pid for _, pid, _ in first}) == 2
+    assert [pid for _, pid, _ in first] == [pid for _, pid, _ in second]
@@ -0,0 +1,37 @@
+from notifier.services import DigestSectionDict
+from notifier.templates import render_html_body, render_text_body
+
+
+def test_text_body_lists_triggered_then_cleared_alerts():
+    section: DigestSectionDict = {
+        "city": "London",
+        "country_code": "GB",
+        "alerts": [{"condition": "temp", "op": "gt", "threshold": 20, "actual": 25.5}],
+        "cleared": [{"condition": "wind", "op": "lt", "threshold": 5.0, "actual": 7.0}],
+    }
+
+    body = render_text_body([section])
+
+    assert body == (
+        "\nHello,\n\nYou've received the following weather notifications:\n\n"
+        "\nThe temp in London, GB is now 25.5.\n"
+        "This is greater than your threshold of 20\n"
+        "\n"
+        "\nThe wind in London, GB is now 7.0.\n"
+        "This is no longer less than your threshold of 5.0\n"
+        "\n"
+    )
+
+
+def test_html_body_escapes_the_location():
+    section: DigestSectionDict = {
+        "city": "<Ghent>",
+        "country_code": None,
+        "alerts": [{"condition": "temp", "op": "le", "threshold": 0, "actual": -1}],
+        "cleared": [],
+    }
+
+    body = render_html_body([section])
+
+    assert "<li>The temp in &lt;Ghent&gt; is now -1. " in body
+    assert "less than or equal to your threshold of 0</li>" in body
@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+from notifier import services
+from notifier.schemas import Subscription, WeatherConditions
+from notifier.threshold_index import ThresholdIndex
+
+
+def sort_alerts(alerts: list[dict]) -> list[dict]:
+    return sorted(alerts, key=lambda a: (a["condition"], a["op"], a["threshold"]))
+
+
+@pytest.fixture(scope="module")
+def subscriptions() -> dict[str, Subscription]:
+    rng = random.Random(7)
+    return {
+        f"sub-{i}": Subscription(
+            email=f"user{i}@test.com",
+            city=rng.choice(["London", "Paris"]),
+            country_code="GB",
+            conditions=[
+                {
+                    "condition": rng.choice(["temp", "pressure", "humidity"]),
+                    "op": rng.choice(["gt", "ge", "lt", "le", "eq", "ne"]),
+                    "threshold": rng.choice([0, 10, 50, 1000]),
+                }
+                for _ in range(rng.randint(0, 4))
+            ],
+        )
+        for i in range(300)
+    }
+
+
+@pytest.fixture()
+def index(subscriptions: dict[str, Subscription]) -> ThresholdIndex:
+    index = ThresholdIndex()
+    for key, sub in subscriptions.items():
+        index.insert(key, sub)
+    return index
+
+
+@pytest.mark.parametrize(
+    "weather",
+    [
+        WeatherConditions(temp=10, pressure=1000, humidity=50),
+        WeatherConditions(temp=-3.5, pressure=990, humidity=0),
+    ],
+)
+def test_triggered_matches_generate_alerts(
+    index: ThresholdIndex,
+    subscriptions: dict[str, Subscription],
+    weather: WeatherConditions,
+):
+    london = next(iter(subscriptions.values())).location
+
+    triggered = index.triggered(london, weather)
+
+    expected = {
+        key: services.generate_alerts(sub.conditions, weather)
+        for key, sub in subscriptions.items()
+        if sub.location == london
+    }
+    assert {key: sort_alerts(alerts) for key, alerts in triggered.items()} == {
+        key: sort_alerts(alerts) for key, alerts in expected.items() if alerts
+    }
+
+
+def test_build_matches_inserting_one_by_one(
+    index: ThresholdIndex, subscriptions: dict[str, Subscription]
+):
+    built = ThresholdIndex.build(subscriptions.items())
+    weather = WeatherConditions(temp=10, pressure=1000, humidity=50)
+
+    assert len(built) == len(index)
+    assert built.n_conditions == index.n_conditions
+    for location in {sub.location for sub in subscriptions.values()}:
+        assert {
+            key: sort_alerts(alerts)
+            for key, alerts in built.triggered(location, weather).items()
+        } == {
+            key: sort_alerts(alerts)
+            for key, alerts in index.triggered(location, weather).items()
+        }
+
+
+def test_build_raises_on_repeated_key(subscriptions: dict[str, Subscription]):
+    sub = next(iter(subscriptions.values()))
+
+    with pytest.raises(ValueError):
+        ThresholdIndex.build([("key", sub), ("key", sub)])
+
+
+def test_remove_drops_subscription_from_results(
+    index: ThresholdIndex, subscriptions: dict[str, Subscription]
+):
+    key, sub = next((key, sub) for key, sub in subscriptions.items() if sub.conditions)
+    weather = WeatherConditions(temp=10, pressure=1000, humidity=50)
+
+    index.remove(key)
+
+    assert key not in index
+    assert key not in index.triggered(sub.location, weather)
+    assert index.n_conditions == sum(
+        len(s.conditions) for k, s in subscriptions.items() if k != key
+    )
+
+
+def test_insert_existing_key_replaces_subscription():
+    index = ThresholdIndex()
+    sub = Subscription(
+        email="test@test.com",
+        city="London",
+        country_code="GB",
+        conditions=[
+            {"condition": "temp", "op": "gt", "threshold": 20},
+            {"condition": "humidity", "op": "lt", "threshold": 30},
+        ],
+    )
+    index.insert("key", sub)
+
+    updated = sub.copy(update={"conditions": sub.conditions[:1]})
+    index.insert("key", updated)
+
+    assert index.get("key") == updated
+    assert index.n_conditions == 1
+
+
+def test_remove_missing_key_raises():
+    with pytest.raises(KeyError):
+        ThresholdIndex().remove("missing")
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+import attr
+import pytest
+
+from notifier.api_client import ApiAuth, ApiClient, AsyncApiClient
+from notifier.cache import InMemoryWeatherCache
+from notifier.schemas import CityWeather, Location, WeatherConditions
+from notifier.weather_groups import (
+    CityIds,
+    WeatherRequests,
+    fetch_weather_grouped,
+    fetch_weather_grouped_async,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@attr.define()
+class StubWeatherApi:
+    """A local stand-in for the `/weather` and `/group` endpoints of OpenWeatherMap"""
+
+    cities: list[dict]
+    requests: list[str] = attr.field(factory=list)
+
+    def respond(self, path: str, query: dict[str, list[str]]) -> tuple[int, Any]:
+        self.requests.append(path)
+        if path == "/group":
+            ids = {int(city_id) for city_id in query["id"][0].split(",")}
+            found = [city for city in self.cities if city["id"] in ids]
+            return 200, {"cnt": len(found), "list": found}
+
+        name, country = query["q"][0].split(",")
+        for city in self.cities:
+            if (city["name"].lower(), city["country"]) == (name, country):
+                return 200, city
+        return 404, {"cod": "404", "message": "city not found"}
+
+
+@pytest.fixture()
+def weather_api() -> Iterator[tuple[str, StubWeatherApi]]:
+    stub = StubWeatherApi(json.loads((FIXTURES / "owm_cities.json").read_text()))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, body = stub.respond(url.path, parse_qs(url.query))
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def cities() -> list[dict]:
+    return json.loads((FIXTURES / "owm_cities.json").read_text())
+
+
+def location_of(city: dict) -> Location:
+    return Location(city=city["name"], country_code=city["country"])
+
+
+@attr.define()
+class RecordingApiClient:
+    locations: list[dict] = attr.field(factory=list)
+    puts: list[tuple[str, Any]] = attr.field(factory=list)
+    stored_city_id: Optional[int] = None
+    auth: ApiAuth = ApiAuth(api_key="123")
+
+    def get(self, endpoint: str, params: Optional[dict] = None) -> Any:
+        return self.locations
+
+    def post(self, endpoint: str, json: Any = None) -> Any:
+        raise NotImplementedError
+
+    def put(self, endpoint: str, json: Any = None) -> Any:
+        self.puts.append((endpoint, json))
+        return {**json, "owm_city_id": self.stored_city_id or json["owm_city_id"]}
+
+
+def test_plan_splits_city_ids_into_groups_of_20(cities: list[dict]):
+    city_ids = CityIds({location_of(city): city["id"] for city in cities[:41]})
+    locations = [location_of(city) for city in cities]
+
+    requests = WeatherRequests.plan(locations, city_ids)
+
+    assert [len(group) for group in requests.groups] == [20, 20, 1]
+    assert requests.by_name == locations[41:]
+
+
+def test_fetch_weather_grouped_fetches_20_locations_per_request(
+    weather_api: tuple[str, StubWeatherApi], cities: list[dict]
+):
+    url, stub = weather_api
+    city_ids = CityIds({location_of(city): city["id"] for city in cities[:40]})
+    locations = [location_of(city) for city in cities]
+    cache = InMemoryWeatherCache()
+
+    with ApiClient(url, auth=ApiAuth(api_key="123")) as client:
+        weather = fetch_weather_grouped(client, cache, locations, city_ids)
+        assert stub.requests == ["/group", "/group"] + ["/weather"] * 5
+
+        assert fetch_weather_grouped(client, cache, locations, city_ids) == weather
+        assert len(stub.requests) == 7
+
+    assert weather == {
+        location_of(city): WeatherConditions.parse_obj(city["main"]) for city in cities
+    }
+    assert all(city_ids.get(location_of(city)) == city["id"] for city in cities)
+
+
+def test_fetch_weather_grouped_falls_back_to_name_for_unknown_ids(
+    weather_api: tuple[str, StubWeatherApi], cities: list[dict]
+):
+    url, stub = weather_api
+    london = location_of(cities[0])
+    city_ids = CityIds({london: 1})
+
+    with ApiClient(url, auth=ApiAuth(api_key="123")) as client:
+        weather = fetch_weather_grouped(
+            client, InMemoryWeatherCache(), [london], city_ids
+        )
+
+    assert stub.requests == ["/group", "/weather"]
+    assert weather[london] == WeatherConditions.parse_obj(cities[0]["main"])
+    assert city_ids.get(london) == cities[0]["id"]
+
+
+def test_fetch_weather_grouped_async_fetches_20_locations_per_request(
+    weather_api: tuple[str, StubWeatherApi], cities: list[dict]
+):
+    url, stub = weather_api
+    city_ids = CityIds({location_of(city): city["id"] for city in cities[:40]})
+    locations = [location_of(city) for city in cities]
+
+    async def no_wait(location: Location) -> None:
+        pass
+
+    async def fetch() -> dict[Location, WeatherConditions]:
+        async with AsyncApiClient(url, auth=ApiAuth(api_key="123")) as client:
+            return await fetch_weather_grouped_async(
+                client, InMemoryWeatherCache(), locations, city_ids, no_wait
+            )
+
+    weather = asyncio.run(fetch())
+
+    assert sorted(stub.requests) == ["/group", "/group"] + ["/weather"] * 5
+    assert weather == {
+        location_of(city): WeatherConditions.parse_obj(city["main"]) for city in cities
+    }
+
+
+def test_city_ids_saves_resolved_ids_to_the_subscription_api():
+    client = RecordingApiClient(
+        locations=[
+            {"id": 1, "city": "london", "country_code": "GB", "owm_city_id": 2643743},
+            {"id": 2, "city": "paris", "country_code": "FR", "owm_city_id": None},
+        ]
+    )
+    paris = Location(city="Paris", country_code="FR")
+    city_ids = CityIds.load(client)
+
+    assert city_ids.get(Location(city="London", country_code="GB")) == 2643743
+    assert city_ids.get(paris) is None
+
+    weather = WeatherConditions(temp=20, pressure=1013, humidity=50)
+    city_ids.resolve(
+        paris, CityWeather(city_id=2988507, lat=48.85, lon=2.35, weather=weather)
+    )
+    assert city_ids.save(client) == []
+    assert city_ids.save(client) == []
+
+    assert client.puts == [
+        ("/locations/2", {"owm_city_id": 2988507, "lat": 48.85, "lon": 2.35})
+    ]
+
+
+def test_city_ids_reports_ids_the_subscription_api_did_not_store():
+    client = RecordingApiClient(
+        locations=[
+            {"id": 2, "city": "paris", "country_code": "FR", "owm_city_id": None}
+        ],
+        stored_city_id=1,
+    )
+    paris = Location(city="Paris", country_code="FR")
+    city_ids = CityIds.load(client)
+    weather = WeatherConditions(temp=20, pressure=1013, humidity=50)
+
+    city_ids.resolve(
+        paris, CityWeather(city_id=2988507, lat=48.85, lon=2.35, weather=weather)
+    )
+
+    assert city_ids.save(client) == [paris]